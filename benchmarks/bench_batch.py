@@ -0,0 +1,79 @@
+# bench_batch.py
+#
+# Sweeping a program's starting values: one compile + VM run per value
+# versus one compile_batch() and a single Batch.run over all of them. The
+# per-value runs are timed on the first 500 values and scaled up; their
+# output and variables are checked against the batch lanes.
+# Usage: python benchmarks/bench_batch.py [lanes] [level]   (default 10**4, 2)
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from bench_vm import compile_source
+from batch import compile_batch
+from vm import VM
+
+EXAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples")
+
+def age_calc():
+    with open(os.path.join(EXAMPLES, "ageCalc.layer")) as f:
+        return f.read(), "cvar age = 10", "age", lambda lane: 10 + lane
+
+def collatz():
+    # lanes leave the loop after different numbers of iterations and take
+    # the two branches in different orders
+    source = ("cvar n = 27\n"
+              "cvar steps = 0\n"
+              "loop while n > 1 -> {\n"
+              "    if n % 2 == 0 -> {\n"
+              "        n = n / 2\n"
+              "    }\n"
+              "    if n % 2 == 1 and n > 1 -> {\n"
+              "        n = 3 * n + 1\n"
+              "    }\n"
+              "    steps = steps + 1\n"
+              "}\n"
+              "write(\"steps\", steps)\n")
+    return source, "cvar n = 27", "n", lambda lane: lane + 1
+
+WORKLOADS = {"ageCalc": age_calc, "collatz": collatz}
+CHECKED = 500
+
+def run_one(source, level):
+    vm = VM(compile_source(source, level))
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        vm.run()
+    return out.getvalue(), vm.env
+
+def main(argv):
+    lanes = int(float(argv[0])) if argv else 10 ** 4
+    level = int(argv[1]) if len(argv) > 1 else 2
+    print(f"{'workload':>10} {'lanes':>8} {'per-value s':>12} {'batch s':>8} "
+          f"{'speedup':>8} {'results':>8}")
+    for name, make in WORKLOADS.items():
+        source, decl, var, value = make()
+        checked = min(lanes, CHECKED)
+
+        start = time.perf_counter()
+        single = [run_one(source.replace(decl, f"cvar {var} = {value(lane)}", 1), level)
+                  for lane in range(checked)]
+        single_time = (time.perf_counter() - start) * lanes / checked
+
+        start = time.perf_counter()
+        result = compile_batch(source, [var], level).run({var: [value(lane) for lane in range(lanes)]})
+        batch_time = time.perf_counter() - start
+
+        same = all(out == result.output(lane)
+                   and all(result.env(lane).get(k, v) == v for k, v in env.items())
+                   for lane, (out, env) in enumerate(single))
+        print(f"{name:>10} {lanes:>8,} {single_time:>12.3f} {batch_time:>8.3f} "
+              f"{single_time / batch_time:>7.1f}x {'same' if same else 'DIFF':>8}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,64 @@
+# bench_bytecode_load.py
+#
+# Time to get a large program ready to run: compiling from source versus
+# loading its precompiled .layerc file.
+# Usage: python benchmarks/bench_bytecode_load.py [instructions]   (default 100000)
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+from optim import eliminate_dead_code
+import bytecode
+
+def make_source(n_instrs):
+    # each statement lowers to 6 instructions
+    lines = ["cvar x = 0", "cvar k = 3"]
+    for i in range(n_instrs // 6):
+        lines.append(f"x = x + k * {i % 50}")
+    return "\n".join(lines) + "\n"
+
+def compile_source(source):
+    tree = Parser(source).parse()
+    SemanticAnalyzer(tree).analyze()
+    return eliminate_dead_code(IRGenerator().generate(tree))
+
+def main(argv):
+    n = int(argv[0]) if argv else 100000
+    source = make_source(n)
+
+    t0 = time.perf_counter()
+    ir_list = compile_source(source)
+    t1 = time.perf_counter()
+    program = bytecode.assemble(ir_list)
+    t2 = time.perf_counter()
+
+    fd, path = tempfile.mkstemp(suffix=".layerc")
+    os.close(fd)
+    try:
+        program.dump(path)
+        size = os.path.getsize(path)
+        best = None
+        for _ in range(20):
+            start = time.perf_counter()
+            loaded = bytecode.load(path)
+            elapsed = time.perf_counter() - start
+            loaded.close()
+            best = elapsed if best is None else min(best, elapsed)
+    finally:
+        os.remove(path)
+
+    print(f"instructions      {len(program):>12,}")
+    print(f".layerc size      {size:>12,} bytes")
+    print(f"compile source    {(t1 - t0) * 1e3:>12.2f} ms")
+    print(f"assemble          {(t2 - t1) * 1e3:>12.2f} ms")
+    print(f"load .layerc      {best * 1e3:>12.3f} ms")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
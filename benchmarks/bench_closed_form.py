@@ -0,0 +1,79 @@
+# bench_closed_form.py
+#
+# Counted loops that only accumulate, compiled with and without closed forms
+# (-O2 enables them). The loops without run at n / 1000 iterations so the
+# benchmark finishes; the per-iteration rate shows what n would cost.
+# Usage: python benchmarks/bench_closed_form.py [iterations] [level]   (default 10**8, 2)
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+from optim import PassManager
+from peephole import fuse_superinstructions
+from regalloc import allocate_registers
+from bench_vm import nested
+from vm import VM
+
+def accumulate(n):
+    return ("cvar age = 10\n"
+            "cvar total = 0\n"
+            f"loop i for {n} times -> {{\n"
+            "    age = age + 5\n"
+            "    total = total + i * i - 3 * i\n"
+            "}\n"
+            "write(age, total)\n")
+
+def runtime_count(n):
+    # the count is only known at runtime, so the guards stay in
+    return (f"cvar n = {n}\n"
+            "cvar k = 7\n"
+            "cvar s = 0\n"
+            "loop i for n times -> {\n"
+            "    loop j for k times -> {\n"
+            "        s = s + i * j + 1\n"
+            "    }\n"
+            "}\n"
+            "write(s)\n")
+
+WORKLOADS = {"nested": nested, "accumulate": accumulate, "runtime_count": runtime_count}
+
+def compile_source(source, level, closed_forms):
+    tree = Parser(source).parse()
+    SemanticAnalyzer(tree).analyze()
+    ir_list = PassManager(level).run(IRGenerator(closed_forms=closed_forms).generate(tree))
+    if level >= 2:
+        ir_list = fuse_superinstructions(ir_list)
+    return allocate_registers(ir_list)[0] if level else ir_list
+
+def timed(source, level, closed_forms):
+    """(compile seconds, run seconds, output, instructions executed)"""
+    start = time.perf_counter()
+    vm = VM(compile_source(source, level, closed_forms), jit=False)
+    built = time.perf_counter()
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        vm.run()
+    return built - start, time.perf_counter() - built, out.getvalue(), vm.steps
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 10 ** 8
+    level = int(argv[1]) if len(argv) > 1 else 2
+    small = max(n // 1000, 1)
+    print(f"{'workload':>14} {'iterations':>13} {'compile ms':>11} {'run ms':>8} {'steps':>6}"
+          f"   {'loop (n/1000) ms':>16} {'steps':>10}")
+    for name, make in WORKLOADS.items():
+        build, run, out, steps = timed(make(n), level, True)
+        _, loop_run, _, loop_steps = timed(make(small), level, False)
+        print(f"{name:>14} {n:>13,} {build * 1e3:>11.2f} {run * 1e3:>8.3f} {steps:>6}"
+              f"   {loop_run * 1e3:>16.1f} {loop_steps:>10,}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,57 @@
+# bench_corpus.py
+#
+# Multi-file mode (main.py with several files): wall time to compile and
+# run a generated corpus on 1, 2, 4, ... worker processes, up to the CPU
+# count (or the counts given). Each file does a few milliseconds of work,
+# like a regression corpus.
+# Usage: python benchmarks/bench_corpus.py [files] [jobs,...]   (default 2000)
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from corpus import expand, run_corpus
+
+def program(i):
+    return (f"cvar n = {i % 50 + 50}\n"
+            "cvar total = 0\n"
+            "loop while n > 0 -> {\n"
+            "    if n % 3 == 0 or n % 5 == 0 -> {\n"
+            "        total = total + n\n"
+            "    }\n"
+            "    n = n - 1\n"
+            "}\n"
+            f"loop i for {i % 7 + 3} times -> {{\n"
+            "    write(\"row\", i, total * i)\n"
+            "}\n")
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 2000
+    cpus = os.cpu_count() or 1
+    if len(argv) > 1:
+        counts = [int(x) for x in argv[1].split(",")]
+    else:
+        counts = [1]
+        while counts[-1] * 2 <= cpus:
+            counts.append(counts[-1] * 2)
+    with tempfile.TemporaryDirectory() as root:
+        for i in range(n):
+            with open(os.path.join(root, f"prog{i:05d}.layer"), "w") as f:
+                f.write(program(i))
+        files = expand([root])
+        print(f"{n:,} files, {cpus} CPU(s)")
+        print(f"{'jobs':>5} {'wall s':>8} {'files/s':>9} {'speedup':>8} {'ok':>6}")
+        base = None
+        for jobs in counts:
+            start = time.perf_counter()
+            results = list(run_corpus(files, jobs))
+            wall = time.perf_counter() - start
+            base = base or wall
+            ok = sum(r['status'] == 'ok' for r in results)
+            print(f"{jobs:>5} {wall:>8.2f} {n / wall:>9.0f} {base / wall:>7.2f}x {ok:>6}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
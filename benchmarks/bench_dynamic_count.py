@@ -0,0 +1,42 @@
+# bench_dynamic_count.py
+#
+# Instructions executed by the VM for each example at every -O level.
+# Usage: python benchmarks/bench_dynamic_count.py [files...]   (default examples/*.layer)
+
+import contextlib
+import glob
+import io
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+from optim import PassManager, OPT_LEVELS
+from vm import VM
+
+
+def steps(ir_list):
+    vm = VM(ir_list)
+    with contextlib.redirect_stdout(io.StringIO()):
+        vm.run()
+    return vm.steps
+
+def main(argv):
+    files = argv or sorted(glob.glob(os.path.join(ROOT, "examples", "*.layer")))
+    print(f"{'program':<16}" + "".join(f"{'-O%d' % level:>10}" for level in OPT_LEVELS) + f"{'saved':>8}")
+    for path in files:
+        with open(path) as f:
+            tree = Parser(f.read()).parse()
+        SemanticAnalyzer(tree).analyze()
+        ir_list = IRGenerator().generate(tree)
+        counts = [steps(PassManager(level).run(ir_list)) for level in OPT_LEVELS]
+        saved = 1 - counts[-1] / counts[0]
+        print(f"{os.path.basename(path):<16}" + "".join(f"{c:>10,}" for c in counts)
+              + f"{saved:>8.0%}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
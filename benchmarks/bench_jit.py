@@ -0,0 +1,55 @@
+# bench_jit.py
+#
+# The VM with and without its tracing JIT, against the pyc backend, on the
+# bench_pyc workloads; then the examples, which are too short for any loop
+# to get hot and should run at the same speed either way.
+# Usage: python benchmarks/bench_jit.py [iterations] [level]   (default 10**6, 2)
+
+import glob
+import os
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "layer_compiler"))
+
+from bench_pyc import WORKLOADS, timed_run
+from bench_vm import compile_source
+from pybackend import PyProgram
+from vm import VM
+
+def best_of(make, repeat):
+    """Fastest of `repeat` fresh runs: (seconds, output, engine)."""
+    best = None
+    for _ in range(repeat):
+        engine = make()
+        elapsed, out = timed_run(engine)
+        if best is None or elapsed < best[0]:
+            best = (elapsed, out, engine)
+    return best
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 10 ** 6
+    level = int(argv[1]) if len(argv) > 1 else 2
+    print(f"{'workload':>10} {'iterations':>12} {'vm s':>8} {'jit s':>8} {'pyc s':>8} "
+          f"{'jit/vm':>7} {'traces':>7} {'output':>7}")
+    for name, make in WORKLOADS.items():
+        ir_list = compile_source(make(n), level)
+        vm_time, vm_out, vm = best_of(lambda: VM(ir_list, jit=False), 1)
+        jit_time, jit_out, jit = best_of(lambda: VM(ir_list), 1)
+        py_time, _, _ = best_of(lambda: PyProgram(ir_list), 1)
+        same = (vm_out, vm.env, vm.steps) == (jit_out, jit.env, jit.steps)
+        print(f"{name:>10} {n:>12,} {vm_time:>8.3f} {jit_time:>8.3f} {py_time:>8.3f} "
+              f"{vm_time / jit_time:>6.1f}x {jit.jit.compiled:>7} {'same' if same else 'DIFF':>7}")
+
+    print(f"\n{'example':>16} {'vm us':>8} {'jit us':>8} {'traces':>7}")
+    for path in sorted(glob.glob(os.path.join(ROOT, "examples", "*.layer"))):
+        with open(path) as f:
+            ir_list = compile_source(f.read(), level)
+        vm_time = best_of(lambda: VM(ir_list, jit=False), 200)[0]
+        jit_time, _, jit = best_of(lambda: VM(ir_list), 200)
+        print(f"{os.path.basename(path):>16} {vm_time * 1e6:>8.1f} {jit_time * 1e6:>8.1f} "
+              f"{jit.jit.compiled:>7}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,58 @@
+# bench_lexer.py
+#
+# Lexer throughput on synthetic sources built from the bundled examples.
+# Usage: python benchmarks/bench_lexer.py [size ...]   (e.g. 1K 1M 50M)
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from lexer import Lexer
+
+EXAMPLE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "examples")
+DEFAULT_SIZES = ["1K", "1M", "50M"]
+
+def parse_size(text):
+    units = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    text = text.upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+def corpus():
+    parts = []
+    for name in sorted(os.listdir(EXAMPLE_DIR)):
+        if name.endswith(".layer"):
+            with open(os.path.join(EXAMPLE_DIR, name), encoding="utf-8") as f:
+                parts.append(f.read().rstrip("\n") + "\n")
+    return "".join(parts)
+
+def make_source(nbytes):
+    unit = corpus()
+    reps = nbytes // len(unit) + 1
+    return (unit * reps)[:nbytes].rsplit("\n", 1)[0] + "\n"
+
+def bench(source, repeat):
+    best = None
+    ntok = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        ntok = len(Lexer(source).tokenize())
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return ntok, best
+
+def main(argv):
+    sizes = argv or DEFAULT_SIZES
+    print(f"{'size':>8} {'tokens':>12} {'seconds':>10} {'tokens/s':>14} {'MB/s':>8}")
+    for size in sizes:
+        source = make_source(parse_size(size))
+        repeat = 5 if len(source) < (1 << 22) else 1
+        ntok, secs = bench(source, repeat)
+        mb = len(source.encode("utf-8")) / (1 << 20)
+        print(f"{size:>8} {ntok:>12,} {secs:>10.4f} {ntok / secs:>14,.0f} {mb / secs:>8.2f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,43 @@
+# bench_long_expr.py
+#
+# Front-end and IR generation time for one long arithmetic expression,
+# to check that compile time grows linearly with the number of terms.
+# Usage: python benchmarks/bench_long_expr.py [terms ...]   (e.g. 1000 10000)
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+
+DEFAULT_TERMS = [1000, 10000, 100000]
+OPS = ["+", "*", "-", "+", "/"]
+
+def make_source(terms):
+    parts = ["a"]
+    for i in range(1, terms):
+        parts.append(OPS[i % len(OPS)])
+        parts.append(str(i % 97 + 1))
+    return "cvar a = 1\ncvar b = " + " ".join(parts) + "\n"
+
+def main(argv):
+    sizes = [int(a) for a in argv] or DEFAULT_TERMS
+    print(f"{'terms':>8} {'parse s':>9} {'check s':>9} {'irgen s':>9} {'us/term':>8}")
+    for terms in sizes:
+        source = make_source(terms)
+        t0 = time.perf_counter()
+        tree = Parser(source).parse()
+        t1 = time.perf_counter()
+        SemanticAnalyzer(tree).analyze()
+        t2 = time.perf_counter()
+        IRGenerator().generate(tree)
+        t3 = time.perf_counter()
+        print(f"{terms:>8} {t1 - t0:>9.4f} {t2 - t1:>9.4f} {t3 - t2:>9.4f} "
+              f"{(t3 - t0) / terms * 1e6:>8.2f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,58 @@
+# bench_pyc.py
+#
+# VM versus the Python-source backend (--engine=pyc) on loop-heavy
+# workloads: translation + compile() time, run time, and a check that both
+# engines print the same thing and end with the same variables.
+# Usage: python benchmarks/bench_pyc.py [iterations] [level]   (default 10**6, 2)
+
+import contextlib
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from bench_vm import countdown, nested, compile_source
+from pybackend import PyProgram
+from vm import VM
+
+def arith(n):
+    return ("cvar x = 1\n"
+            "cvar s = 0\n"
+            f"loop i for {n} times -> {{\n"
+            "    x = (x * 31 + i) % 1000003\n"
+            "    if x % 2 == 0 or i % 7 == 3 -> {\n"
+            "        s = s + x / 2\n"
+            "    }\n"
+            "}\n"
+            "write(\"x =\", x, \"s =\", s)\n")
+
+WORKLOADS = {"countdown": countdown, "nested": nested, "arith": arith}
+
+def timed_run(engine):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out):
+        start = time.perf_counter()
+        engine.run()
+        elapsed = time.perf_counter() - start
+    return elapsed, out.getvalue()
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 10 ** 6
+    level = int(argv[1]) if len(argv) > 1 else 2
+    print(f"{'workload':>10} {'iterations':>12} {'vm s':>8} {'pyc s':>8} "
+          f"{'compile ms':>11} {'speedup':>8} {'output':>7}")
+    for name, make in WORKLOADS.items():
+        ir_list = compile_source(make(n), level)
+        vm = VM(ir_list)
+        vm_time, vm_out = timed_run(vm)
+        start = time.perf_counter()
+        program = PyProgram(ir_list)
+        build = time.perf_counter() - start
+        py_time, py_out = timed_run(program)
+        print(f"{name:>10} {n:>12,} {vm_time:>8.3f} {py_time:>8.3f} {build * 1e3:>11.2f} "
+              f"{vm_time / py_time:>7.1f}x {'same' if (vm_out, vm.env) == (py_out, program.env) else 'DIFF':>7}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
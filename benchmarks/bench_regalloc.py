@@ -0,0 +1,56 @@
+# bench_regalloc.py
+#
+# Register file size with and without liveness-based allocation as programs
+# grow: temps grow with program size, allocated registers should not.
+# Usage: python benchmarks/bench_regalloc.py [max_statements]   (default 100000)
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+from optim import eliminate_dead_code
+from regalloc import allocate_registers
+from vm import VM
+
+def make_source(n):
+    lines = ["cvar x = 0", "cvar k = 3"]
+    for i in range(n):
+        if i % 10 == 9:
+            lines.append(f"if x > {i} and k < 5 -> {{\n    x = x - (k + 1) * 2\n}}")
+        else:
+            lines.append(f"x = x + k * {i % 50} - (x % 7)")
+    return "\n".join(lines) + "\n"
+
+def compile_source(source):
+    tree = Parser(source).parse()
+    SemanticAnalyzer(tree).analyze()
+    return eliminate_dead_code(IRGenerator().generate(tree))
+
+def main(argv):
+    top = int(float(argv[0])) if argv else 100000
+    print(f"{'statements':>10} {'temps':>10} {'registers':>10} {'alloc ms':>9} "
+          f"{'run s (temps)':>14} {'run s (regs)':>13}")
+    n = 100
+    while n <= top:
+        ir_list = compile_source(make_source(n))
+        start = time.perf_counter()
+        allocated, n_regs = allocate_registers(ir_list)
+        alloc = time.perf_counter() - start
+        timings = []
+        for program in (ir_list, allocated):
+            vm = VM(program)
+            start = time.perf_counter()
+            vm.run()
+            timings.append(time.perf_counter() - start)
+        n_temps = VM(ir_list).program.n_regs
+        print(f"{n:>10,} {n_temps:>10,} {n_regs:>10} {alloc * 1e3:>9.1f} "
+              f"{timings[0]:>14.3f} {timings[1]:>13.3f}")
+        n *= 10
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,84 @@
+# bench_scheduler.py
+#
+# Many short Layer programs, with a few long ones mixed in, run in one
+# process: one after another in submission order (VM.run each) versus all
+# submitted at once to the asyncio Scheduler, which interleaves them a
+# slice at a time. Reports total throughput and the short programs'
+# turnaround (submission to finish) percentiles: run one after another,
+# a short program queued behind a long one waits for all of it.
+# Usage: python benchmarks/bench_scheduler.py [programs] [quantum]   (default 5000, 10000)
+
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from compilation import Compilation
+from bytecode import assemble
+from scheduler import Scheduler, percentiles
+from sinks import CaptureSink
+from vm import VM
+
+LONG_EVERY = 500        # every 500th program is a long one
+
+SHORT = ("cvar n = 40\n"
+         "cvar total = 0\n"
+         "loop while n > 0 -> {\n"
+         "    total = total + n % 7\n"
+         "    n = n - 1\n"
+         "}\n"
+         "write(\"total\", total)\n")
+
+LONG = ("cvar n = 2000000\n"
+        "loop while n > 0 -> {\n"
+        "    n = n - 1\n"
+        "}\n"
+        "write(\"done\", n)\n")
+
+def programs(n):
+    """(is long, program) pairs; both shapes are compiled once, so compile
+    time stays out of the comparison."""
+    short, long = (assemble(Compilation(source).final_ir) for source in (SHORT, LONG))
+    return [(True, long) if i % LONG_EVERY == LONG_EVERY - 1 else (False, short)
+            for i in range(n)]
+
+def one_by_one(jobs):
+    start = time.perf_counter()
+    short_times, outputs = [], []
+    for is_long, program in jobs:
+        sink = CaptureSink()
+        VM.from_bytecode(program, sink=sink).run()
+        outputs.append(sink.getvalue())
+        if not is_long:
+            short_times.append(time.perf_counter() - start)
+    return time.perf_counter() - start, short_times, outputs
+
+async def scheduled(jobs, quantum):
+    scheduler = Scheduler(quantum=quantum)
+    start = time.perf_counter()
+    submitted = [(is_long, scheduler.submit(program)) for is_long, program in jobs]
+    await scheduler.join()
+    wall = time.perf_counter() - start
+    short_times = [job.finished - job.submitted for is_long, job in submitted if not is_long]
+    return wall, short_times, [job.output for _, job in submitted], scheduler.metrics()
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 5000
+    quantum = int(float(argv[1])) if len(argv) > 1 else 10_000
+    jobs = programs(n)
+    print(f"{n:,} programs ({n // LONG_EVERY} long), quantum {quantum:,}")
+    print(f"{'mode':>11} {'wall s':>7} {'progs/s':>8} {'short p50 ms':>13} {'short p99 ms':>13}")
+    wall, times, expected = one_by_one(jobs)
+    lat = percentiles(times)
+    print(f"{'one by one':>11} {wall:>7.2f} {n / wall:>8.0f} {lat['p50']:>13.1f} {lat['p99']:>13.1f}")
+    wall, times, outputs, metrics = asyncio.run(scheduled(jobs, quantum))
+    lat = percentiles(times)
+    print(f"{'scheduler':>11} {wall:>7.2f} {n / wall:>8.0f} {lat['p50']:>13.1f} {lat['p99']:>13.1f}"
+          f"   {'same' if outputs == expected else 'DIFF'}")
+    print(f"scheduler: {metrics['slices']:,} slices, {metrics['instr_per_s'] / 1e6:.1f}M instr/s, "
+          f"queue p99 {metrics['queue_ms']['p99']} ms")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,46 @@
+# bench_sinks.py
+#
+# Output-heavy programs: run time with each write() handed straight to the
+# stream (buffer_size 0, what print() did) versus the default buffered
+# StdoutSink, and with a CaptureSink. The stream is os.devnull opened line
+# buffered, like stdout on a terminal, so every newline costs a system call
+# unless the sink joins lines first.
+# Usage: python benchmarks/bench_sinks.py [lines] [level]   (default 2*10**5, 2)
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from compilation import Compilation
+from sinks import StdoutSink, CaptureSink, DEFAULT_BUFFER
+
+def table(n):
+    return ("cvar total = 0\n"
+            f"loop i for {n} times -> {{\n"
+            "    total = total + i\n"
+            "    write(\"row\", i, total)\n"
+            "}\n")
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 2 * 10 ** 5
+    level = int(argv[1]) if len(argv) > 1 else 2
+    comp = Compilation(table(n), level)
+    comp.final_ir
+    print(f"{n:,} lines")
+    print(f"{'engine':>7} {'sink':>16} {'s':>8} {'speedup':>8}")
+    with open(os.devnull, "w", buffering=1) as devnull:
+        for engine in ("vm", "pyc"):
+            base = None
+            for label, make in (("unbuffered", lambda: StdoutSink(devnull, 0)),
+                                (f"buffered {DEFAULT_BUFFER // 1024}K", lambda: StdoutSink(devnull)),
+                                ("capture", CaptureSink)):
+                start = time.perf_counter()
+                comp.run(engine, sink=make())
+                elapsed = time.perf_counter() - start
+                base = base or elapsed
+                print(f"{engine:>7} {label:>16} {elapsed:>8.3f} {base / elapsed:>7.2f}x")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,51 @@
+# bench_stream_memory.py
+#
+# Peak Python heap while lexing files of growing size, comparing the
+# materialised token list with the streaming, memory-mapped lexer.
+# Usage: python benchmarks/bench_stream_memory.py [size ...]   (e.g. 1M 10M)
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from lexer import Lexer
+from bench_lexer import make_source, parse_size
+
+DEFAULT_SIZES = ["1M", "10M", "50M"]
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    ntok = fn()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return ntok, elapsed, peak
+
+def lex_list(path):
+    with open(path, encoding="utf-8") as f:
+        return len(Lexer(f.read()).tokenize())
+
+def lex_stream(path):
+    return sum(1 for _ in Lexer.from_path(path).stream())
+
+def main(argv):
+    sizes = argv or DEFAULT_SIZES
+    print(f"{'size':>6} {'mode':>7} {'tokens':>12} {'seconds':>9} {'peak MiB':>9}")
+    for size in sizes:
+        fd, path = tempfile.mkstemp(suffix=".layer")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(make_source(parse_size(size)))
+            for mode, fn in (("list", lex_list), ("stream", lex_stream)):
+                ntok, secs, peak = measure(lambda: fn(path))
+                print(f"{size:>6} {mode:>7} {ntok:>12,} {secs:>9.2f} {peak / (1 << 20):>9.2f}")
+        finally:
+            os.remove(path)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,41 @@
+# bench_token_memory.py
+#
+# Retained heap per token: a list of Token objects (the old representation)
+# versus the struct-of-arrays TokenBuffer returned by Lexer.tokenize().
+# Usage: python benchmarks/bench_token_memory.py [size ...]   (e.g. 1M 10M)
+
+import gc
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from lexer import Lexer
+from bench_lexer import make_source, parse_size
+
+DEFAULT_SIZES = ["100K", "1M", "10M"]
+
+def retained(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+def main(argv):
+    sizes = argv or DEFAULT_SIZES
+    print(f"{'size':>6} {'tokens':>12} {'Token list B/tok':>17} {'TokenBuffer B/tok':>18}")
+    for size in sizes:
+        source = make_source(parse_size(size))
+        buf, buf_bytes = retained(lambda: Lexer(source).tokenize())
+        objs, obj_bytes = retained(lambda: list(buf))
+        n = len(buf)
+        print(f"{size:>6} {n:>12,} {obj_bytes / n:>17.1f} {buf_bytes / n:>18.1f}")
+        del objs, buf
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,62 @@
+# bench_vm.py
+#
+# VM dispatch throughput on countdown.layer- and nested.layer-style loops.
+# Usage: python benchmarks/bench_vm.py [iterations] [levels]   (default 10**7, 1,3)
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+from optim import PassManager
+from peephole import fuse_superinstructions
+from regalloc import allocate_registers
+from vm import VM
+
+def countdown(n):
+    return (f"cvar n = {n}\n"
+            "loop while n > 0 -> {\n"
+            "    n = n - 1\n"
+            "}\n")
+
+def nested(n):
+    inner = 1000
+    return ("cvar count = 0\n"
+            f"loop i for {max(n // inner, 1)} times -> {{\n"
+            f"    loop j for {inner} times -> {{\n"
+            "        count = count + 1\n"
+            "    }\n"
+            "}\n")
+
+WORKLOADS = {"countdown": countdown, "nested": nested}
+
+def compile_source(source, level=1):
+    tree = Parser(source).parse()
+    SemanticAnalyzer(tree).analyze()
+    ir_list = PassManager(level).run(IRGenerator().generate(tree))
+    if level >= 2:
+        ir_list = fuse_superinstructions(ir_list)
+    if level >= 1:
+        ir_list = allocate_registers(ir_list)[0]
+    return ir_list
+
+def main(argv):
+    n = int(float(argv[0])) if argv else 10 ** 7
+    levels = [int(x) for x in argv[1].split(",")] if len(argv) > 1 else [1, 3]
+    print(f"{'workload':>10} {'level':>5} {'iterations':>12} {'instructions':>14} "
+          f"{'seconds':>9} {'M instr/s':>10}")
+    for name, make in WORKLOADS.items():
+        for level in levels:
+            vm = VM(compile_source(make(n), level))
+            start = time.perf_counter()
+            vm.run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:>10} {'-O%d' % level:>5} {n:>12,} {vm.steps:>14,} {elapsed:>9.2f} "
+                  f"{vm.steps / elapsed / 1e6:>10.2f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,98 @@
+# mine_superinstructions.py
+#
+# Find which opcode sequences are worth fusing into superinstructions: run
+# every program in a corpus, record the executed opcode stream and count
+# each straight-line n-gram (one that never crosses a taken jump or a jump
+# target, so a peephole pass could actually fuse it). Sequences are ranked
+# by the dispatches fusing them would save: executions * (length - 1).
+# Usage: python benchmarks/mine_superinstructions.py [-O LEVEL] [-n MAX_LEN] [--top N] [files or dirs...]
+#        (default: -O 2, -n 4, --top 20, examples/)
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import sys
+from collections import Counter, deque
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "layer_compiler"))
+
+from parser import Parser
+from semantic import SemanticAnalyzer
+from codegen import IRGenerator
+from optim import PassManager
+from peephole import fuse_superinstructions
+from regalloc import allocate_registers
+from bytecode import OPCODES, OP
+from vm import VM
+
+# opcode -> position of its jump target in an (op, a, b, c) tuple
+JUMPS = {OP['JUMP']: 1, OP['JUMP_IF_FALSE']: 2, OP['JUMP_IF_TRUE']: 2,
+         OP['JUMP_IF_NOT_LT']: 3, OP['JUMP_IF_NOT_GT']: 3, OP['JUMP_IF_NOT_LE']: 3,
+         OP['JUMP_IF_NOT_GE']: 3, OP['JUMP_IF_NOT_EQ']: 3, OP['JUMP_IF_NOT_NE']: 3}
+
+def compile_file(path, level, fuse):
+    with open(path) as f:
+        tree = Parser(f.read()).parse()
+    SemanticAnalyzer(tree).analyze()
+    ir_list = PassManager(level).run(IRGenerator().generate(tree))
+    if fuse:
+        ir_list = fuse_superinstructions(ir_list)
+    return allocate_registers(ir_list)[0]
+
+def trace(vm, counts, max_len, limit):
+    """Run `vm` through its dispatch table, adding n-grams to `counts`."""
+    code, handlers = vm.code, vm._handlers()
+    leaders = {instr[JUMPS[instr[0]]] for instr in code if instr[0] in JUMPS}
+    window = deque(maxlen=max_len)
+    pc = steps = 0
+    while pc < len(code) and steps < limit:
+        op, a, b, c = code[pc]
+        if pc in leaders:
+            window.clear()
+        window.append(op)
+        for n in range(2, len(window) + 1):
+            counts[tuple(window)[-n:]] += 1
+        steps += 1
+        target = handlers[op](a, b, c)
+        if target is not None:
+            window.clear()
+            pc = target
+        else:
+            pc += 1
+    return steps
+
+def main(argv):
+    argp = argparse.ArgumentParser(
+        description="Rank executed opcode sequences by the dispatches fusing them would save")
+    argp.add_argument('paths', nargs='*', default=[os.path.join(ROOT, "examples")])
+    argp.add_argument('-O', dest='level', type=int, default=2)
+    argp.add_argument('-n', dest='max_len', type=int, default=4)
+    argp.add_argument('--top', type=int, default=20)
+    argp.add_argument('--no-fuse', action='store_true',
+                      help="mine the stream before existing superinstructions are applied")
+    argp.add_argument('--limit', type=int, default=10 ** 7,
+                      help="stop tracing a program after this many instructions")
+    args = argp.parse_args(argv)
+
+    files = []
+    for path in args.paths:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.layer"))) if os.path.isdir(path) else [path])
+
+    counts, total = Counter(), 0
+    for path in files:
+        vm = VM(compile_file(path, args.level, not args.no_fuse))
+        with contextlib.redirect_stdout(io.StringIO()):
+            total += trace(vm, counts, args.max_len, args.limit)
+
+    ranked = sorted(counts.items(), key=lambda kv: kv[1] * (len(kv[0]) - 1), reverse=True)
+    print(f"{len(files)} programs, {total:,} instructions executed")
+    print(f"{'saved':>10} {'share':>6} {'count':>10}  sequence")
+    for seq, n in ranked[:args.top]:
+        saved = n * (len(seq) - 1)
+        print(f"{saved:>10,} {saved / total:>6.1%} {n:>10,}  {' '.join(OPCODES[op] for op in seq)}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
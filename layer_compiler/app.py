@@ -1,23 +1,74 @@
 import streamlit as st
 import os, sys
-from io import StringIO
+import hashlib
+import threading
 import pandas as pd
-from treeviz import visualize_ast
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from lexer import Lexer
-from parser import Parser
-from semantic import SemanticAnalyzer
-from codegen import IRGenerator
-from optim import eliminate_dead_code
-from vm import VM
-from treeviz import visualize_ast
+from optim import OPT_LEVELS
+from compilation import Compilation, PHASE_ERRORS
+from bytecode import assemble
+from sandbox import RunPool
+from treeviz import visualize_ast, DEFAULT_DEPTH, DEFAULT_NODES
+
+PAGE_SIZE  = 200     # rows per page in the token, symbol, AST and IR views
+LAZY_LINES = 2000    # above this, sections start collapsed and compute nothing
+SHOWN_OUTPUT = 20000 # characters of program output shown (the last ones)
 
 example_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "../examples"))
 examples = [f for f in os.listdir(example_dir) if f.endswith(".layer")]
 example_dict = {f: open(os.path.join(example_dir, f), encoding="utf-8").read() for f in examples}
 
+
+# Phase results are cached by source hash and optimisation level, so reruns
+# (every widget click) and other sessions with the same source skip
+# straight to what they display. The Compilation computes each phase on
+# first use and keeps it; the lock stops two sessions computing the same
+# phase at once.
+@st.cache_resource(max_entries=16)
+def compilation(key, level, _code):
+    return Compilation(_code, level), threading.Lock()
+
+def phase(compiled, name):
+    comp, lock = compiled
+    with lock:
+        return getattr(comp, name)
+
+@st.cache_data(max_entries=16)
+def ast_lines(key, level, _compiled):
+    return str(phase(_compiled, 'ast')).splitlines()
+
+@st.cache_resource(max_entries=16)
+def program(key, level, _compiled):
+    return assemble(phase(_compiled, 'final_ir'))
+
+# Programs run in worker processes with instruction and time budgets (see
+# sandbox.py), never in the server process, so a runaway loop cannot tie
+# up a server thread; output streams in while they run.
+@st.cache_resource
+def run_pool():
+    return RunPool()
+
+def show_error(compiled, e):
+    st.error(f"❌ {PHASE_ERRORS.get(compiled[0].phase, 'Error')}: {e}")
+
+def page(label, n, key):
+    """(start, stop) of the rows to show out of `n`, one page at a time."""
+    pages = max(1, -(-n // PAGE_SIZE))
+    if pages == 1:
+        return 0, n
+    number = st.number_input(f"{label} page (of {pages:,})", 1, pages, 1, key=key)
+    start = (number - 1) * PAGE_SIZE
+    stop = min(start + PAGE_SIZE, n)
+    st.caption(f"{label} {start + 1:,}–{stop:,} of {n:,}")
+    return start, stop
+
+def paged_code(label, lines, key):
+    start, stop = page(label, len(lines), key)
+    st.code("\n".join(str(line) for line in lines[start:stop]), language='python')
+
+
 st.title("🧠 Layer Language Compiler")
 st.markdown("A full compiler pipeline with lexer, parser, semantic analysis, IR, VM + Parse Tree")
 
@@ -30,93 +81,133 @@ if mode == "Select example snippet":
 else:
     code = st.text_area("Write your Layer code here:", height=250)
 
+opt_level = st.selectbox("Optimization level:", sorted(OPT_LEVELS), index=2,
+                         format_func=lambda level: f"-O{level}")
+
 if st.button("🔍 Compile and Execute"):
     if not code.strip():
         st.warning("Please provide some Layer code to compile.")
         st.stop()
+    # remembered, so the views below survive the reruns their widgets cause
+    st.session_state.compiled = (hashlib.sha256(code.encode()).hexdigest(), opt_level, code)
+
+if "compiled" in st.session_state:
+    key, level, source = st.session_state.compiled
+    compiled = compilation(key, level, source)
+    comp = compiled[0]
+    expand = source.count("\n") < LAZY_LINES
 
     # 1. Lexical Analysis
     st.subheader("🔹 Lexical Analysis")
     try:
-        tokens = Lexer(code).tokenize()
-        token_values = [t.value for t in tokens if t.type != 'WHITESPACE']
-        st.code(token_values, language='python')
-
-        # Show token table
-        lex_table = pd.DataFrame([{
-            "Type": t.type,
-            "Value": t.value,
-            "Position": f"{t.line}:{t.col}"
-        } for t in tokens if t.type != 'WHITESPACE'])
+        tokens = phase(compiled, 'tokens')
+        # Show token table (one page, built column-wise from the token buffer)
+        start, stop = page("Tokens", len(tokens), "token_page")
+        lex_table = pd.DataFrame({
+            "Type": tokens.type_names(start, stop),
+            "Value": tokens.values(start, stop),
+            "Position": tokens.positions(start, stop)
+        }, index=range(start, stop))
         st.dataframe(lex_table, use_container_width=True)
     except Exception as e:
-        st.error(f"❌ Lexical Error: {e}")
+        show_error(compiled, e)
         st.stop()
 
     # 2. Syntax Analysis (AST)
-    st.subheader("🔹 Syntax Analysis (AST)")
-    try:
-        tree = Parser(code).parse()
-        st.code(str(tree), language='python')
-    except Exception as e:
-        st.error(f"❌ Syntax Error: {e}")
-        st.stop()
+    if st.checkbox("🔹 Syntax Analysis (AST)", value=expand):
+        try:
+            paged_code("AST lines", ast_lines(key, level, compiled), "ast_page")
+        except Exception as e:
+            show_error(compiled, e)
+            st.stop()
 
     # 3. Parse Tree
-    st.subheader("🔹 Parse Tree")
-    try:
-        dot = visualize_ast(tree)
-        st.graphviz_chart(dot.source)
-    except Exception as e:
-        st.error(f"❌ Tree Visualization Error: {e}")
+    if st.checkbox("🔹 Parse Tree", value=expand):
+        try:
+            # bounded drawing: collapsed subtrees can be opened one by one
+            depth = st.slider("Tree depth", 1, 20, DEFAULT_DEPTH)
+            nodes = st.slider("Nodes per subtree", 50, 2000, DEFAULT_NODES, step=50)
+            opened_key = f"opened_{key}"
+            opened = st.session_state.get(opened_key, [])
+            collapsed = {}
+            dot = visualize_ast(phase(compiled, 'ast'), depth, nodes, opened, collapsed)
+            st.graphviz_chart(dot.source)
+            st.multiselect("Expand subtrees:", sorted(set(collapsed) | set(opened)),
+                           key=opened_key,
+                           format_func=lambda path: f"{path}: {collapsed.get(path, 'expanded')}")
+        except Exception as e:
+            st.error(f"❌ Tree Visualization Error: {e}")
 
     # 4. Semantic Analysis
-    st.subheader("🔹 Semantic Analysis")
-    try:
-        analyzer = SemanticAnalyzer(tree)
-        analyzer.analyze()
-        st.success("✅ Semantic analysis passed")
-
-        # Show symbol table
-        st.subheader("📋 Symbol Table")
-        symbols = analyzer.get_symbols().as_list()
-        symbol_df = pd.DataFrame(symbols)
-        st.dataframe(symbol_df, use_container_width=True)
-    except Exception as e:
-        st.error(f"❌ Semantic Error: {e}")
-        st.stop()
+    if st.checkbox("🔹 Semantic Analysis", value=expand):
+        try:
+            table = phase(compiled, 'symbols')
+            st.success("✅ Semantic analysis passed")
+
+            # Show symbol table
+            st.subheader("📋 Symbol Table")
+            start, stop = page("Symbols", len(table.symbols), "symbol_page")
+            symbol_df = pd.DataFrame(table.as_list(start, stop), index=range(start, stop))
+            st.dataframe(symbol_df, use_container_width=True)
+        except Exception as e:
+            show_error(compiled, e)
+            st.stop()
 
     # 5. IR Generation
-    st.subheader("🔹 Intermediate Representation (IR)")
-    try:
-        ir_list = IRGenerator().generate(tree)
-        ir_text = "\n".join(str(instr) for instr in ir_list)
-        st.code(ir_text, language='python')
-    except Exception as e:
-        st.error(f"❌ IR Generation Error: {e}")
-        st.stop()
-
-    # 6. Dead Code Elimination
-    st.subheader("🔹 Optimized IR (Dead Code Elimination)")
-    try:
-        opt_ir = eliminate_dead_code(ir_list)
-        opt_text = "\n".join(str(instr) for instr in opt_ir)
-        st.code(opt_text, language='python')
-    except Exception as e:
-        st.error(f"❌ Optimization Error: {e}")
-        st.stop()
+    if st.checkbox("🔹 Intermediate Representation (IR)", value=expand):
+        try:
+            paged_code("IR instructions", phase(compiled, 'ir'), "ir_page")
+        except Exception as e:
+            show_error(compiled, e)
+            st.stop()
+
+    # 6. Optimization passes
+    if st.checkbox(f"🔹 Optimized IR (-O{level})", value=expand):
+        try:
+            paged_code("Optimized instructions", phase(compiled, 'fused_ir'), "opt_page")
+            if comp.passes.stats:
+                st.dataframe(pd.DataFrame(comp.passes.stats))
+            if level:
+                phase(compiled, 'final_ir')
+                st.caption(f"Register allocation: {comp.n_regs} registers")
+        except Exception as e:
+            show_error(compiled, e)
+            st.stop()
 
     # 7. VM Execution
-    st.subheader("🔹 VM Execution Output")
-    try:
-        output = StringIO()
-        sys.stdout = output
-        VM(opt_ir).run()
-        sys.stdout = sys.__stdout__
-        st.code(output.getvalue(), language='text')
-    except Exception as e:
-        sys.stdout = sys.__stdout__
-        st.error(f"❌ VM Execution Error: {e}")
+    if st.checkbox("🔹 VM Execution Output", value=expand):
+        try:
+            assembled = program(key, level, compiled)
+            left, right = st.columns(2)
+            again = left.button("▶️ Run again")
+            cancel = right.button("⏹️ Cancel")
+            # the Run outlives reruns: a rerun picks up its output so far
+            run_key, run = st.session_state.get("run", (None, None))
+            if run is None or run_key != (key, level) or (again and run.done):
+                if run is not None:
+                    run.cancel()        # frees its worker if it is still going
+                run = run_pool().submit(assembled)
+                st.session_state.run = ((key, level), run)
+            if cancel:
+                run.cancel()
+            shown = st.empty()
+            shown.code(run.output[-SHOWN_OUTPUT:], language='text')
+            # chunks() also wakes up while the program is silent: each
+            # st.* call is where Streamlit applies a rerun, such as the one
+            # a Cancel click starts
+            for _ in run.chunks():
+                shown.code(run.output[-SHOWN_OUTPUT:], language='text')
+            shown.code(run.output[-SHOWN_OUTPUT:], language='text')
+            if run.status == 'error':
+                st.error(f"❌ VM Execution Error: {run.error}")
+            elif run.status in ('budget', 'timeout'):
+                st.warning(f"⏱️ Stopped: {run.error}")
+            elif run.status == 'cancelled':
+                st.info("⏹️ Run cancelled")
+            else:
+                st.caption(f"{run.steps:,} instructions")
+        except Exception as e:
+            show_error(compiled, e)
 
 st.markdown("---")
 st.caption("Created by Ananya & Ajay | Compiler Design Project 2025")
@@ -0,0 +1,390 @@
+# batch.py
+#
+# One compiled program run over many starting environments ("lanes") at
+# once, with every value held as a NumPy array of one element per lane.
+#
+# compile_batch(source, inputs) compiles once. The first declaration of
+# each input variable takes its value from the lane (LOAD_INPUT) instead of
+# its initializer, so in ageCalc.layer `cvar age = 10` becomes a parameter
+# and the optimizer cannot fold it away. Batch.run(bindings) then executes
+# the optimized IR:
+#
+#   * lanes at the same instruction run it together. A branch that goes
+#     both ways splits them into groups (index arrays of their lanes, the
+#     masks); the group furthest behind runs first and groups merge again
+#     when one reaches the instruction another is waiting at, so lanes
+#     that take the same path through a loop stay in lockstep
+#   * every lane gets exactly the VM's result. Arrays are int64/float64/
+#     bool when all lanes hold that type and object arrays otherwise, and
+#     an operation NumPy could get wrong (int64 overflow, big ints mixed
+#     with floats, division by zero, '^', strings) is done lane by lane in
+#     Python instead
+#   * a lane whose instruction raises stops there with that error; the
+#     others carry on
+#   * write() output is captured per lane, exactly as the VM would print it
+
+import operator
+
+import numpy as np
+
+from compilation import Compilation
+from ir import (
+    LoadConst, LoadVar, LoadInput, StoreVar, CallWrite, PrintNewline,
+    Add, Sub, Mul, Div, Mod, Pow, FloorDiv, Lt, Gt, Le, Ge, Eq, Ne, Not, IsInt, Move,
+    Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch,
+    IncVar, DecVar, AddVarImm, StoreConst, LoadVarPair, COMPARE_OPS
+)
+
+PYTHON = {
+    Add: operator.add, Sub: operator.sub, Mul: operator.mul,
+    Div: operator.truediv, Mod: operator.mod, Pow: operator.pow,
+    FloorDiv: operator.floordiv,
+    Lt: operator.lt, Gt: operator.gt, Le: operator.le,
+    Ge: operator.ge, Eq: operator.eq, Ne: operator.ne,
+}
+NUMPY = {
+    Add: np.add, Sub: np.subtract, Mul: np.multiply, Div: np.true_divide,
+    Mod: np.remainder, FloorDiv: np.floor_divide,
+    Lt: np.less, Gt: np.greater, Le: np.less_equal,
+    Ge: np.greater_equal, Eq: np.equal, Ne: np.not_equal,
+}
+ARITH = (Add, Sub, Mul, Div, Mod, FloorDiv)
+
+# |int64 operand| below which NumPy matches Python ints (no overflow and, for
+# '/', exact conversion to float); comparisons of two int arrays are always
+# exact, and an int mixed with a float must be below 2**53
+INT_LIMIT = {Add: 2 ** 62, Sub: 2 ** 62, Mul: 2 ** 31, Div: 2 ** 53,
+             Mod: 2 ** 62, FloorDiv: 2 ** 62}
+FLOAT_EXACT = 2 ** 53
+
+# arrays are compacted to the lanes still running once fewer than half are
+COMPACT_MIN = 64
+
+
+def compile_batch(source, inputs, level=2):
+    """Compile Layer source once for Batch.run; `inputs` names the variables
+    each lane supplies."""
+    comp = Compilation(source, level, inputs=inputs)
+    comp.ir                         # generating IR finds the undeclared inputs
+    if comp.unused_inputs:
+        raise ValueError(f"Input '{sorted(comp.unused_inputs)[0]}' is never declared")
+    return Batch(comp.final_ir, inputs)
+
+
+class Batch:
+    """
+    A compiled program to run over tables of inputs. run() takes either
+    {name: sequence of values} or a sequence of {name: value} rows, one per
+    lane, and returns a BatchResult.
+    """
+    def __init__(self, ir_list, inputs):
+        self.instructions = ir_list
+        self.inputs       = list(inputs)
+        self.code         = [instr for instr in ir_list if not isinstance(instr, Label)]
+        targets, n = {}, 0
+        for instr in ir_list:
+            if isinstance(instr, Label):
+                targets[instr.name] = n
+            else:
+                n += 1
+        self.targets  = [targets.get(getattr(instr, 'label', None)) for instr in self.code]
+        self.names    = list(dict.fromkeys(
+            name for instr in self.code if not isinstance(instr, LoadInput)
+            for name in (getattr(instr, 'name', None), getattr(instr, 'name2', None)) if name))
+
+    def _columns(self, bindings):
+        """{input: array} from either form of bindings, checked."""
+        if isinstance(bindings, dict):
+            columns = {name: list(values) for name, values in bindings.items()}
+        else:
+            rows = list(bindings)
+            for row in rows:
+                missing = set(self.inputs) - set(row)
+                if missing:
+                    raise ValueError(f"A row has no value for input '{sorted(missing)[0]}'")
+            columns = {name: [row[name] for row in rows] for name in self.inputs}
+        for name in columns:
+            if name not in self.inputs:
+                raise ValueError(f"'{name}' is not an input of this batch")
+        for name in self.inputs:
+            if name not in columns:
+                raise ValueError(f"No values for input '{name}'")
+        if not columns:
+            raise ValueError("A batch needs at least one input")
+        sizes = {len(values) for values in columns.values()}
+        if len(sizes) > 1:
+            raise ValueError("Input columns differ in length")
+        return {name: _column([v.item() if isinstance(v, np.generic) else v for v in values])
+                for name, values in columns.items()}
+
+    def run(self, bindings):
+        inputs  = self._columns(bindings)
+        n       = len(next(iter(inputs.values())))
+        code    = self.code
+        jumps   = self.targets
+        end     = len(code)
+        env     = {name: _full(None, n) for name in self.names}
+        final   = dict(env)             # values of lanes dropped by compaction
+        regs    = {}
+        outputs = [[] for _ in range(n)]
+        errors  = [None] * n
+        consts  = {}                    # pc -> constant array over all positions
+        pcs     = np.zeros(n, dtype=np.int64)
+        # arrays hold one position per lane still in the batch: ids maps
+        # positions to lanes, w is their number
+        ids     = every = np.arange(n)
+        w       = n
+
+        def const(value, k):
+            if k < w:
+                return _full(value, k)
+            if p not in consts:
+                consts[p] = _full(value, w)
+            return consts[p]
+
+        while True:
+            p = int(pcs.min()) if w else end
+            if p >= end:
+                break
+            live = pcs < end
+            if w >= COMPACT_MIN and 2 * live.sum() < w:
+                # most lanes are done: save them and shrink every array to the rest
+                for name, values in env.items():
+                    final[name] = _scatter(final[name], ids[~live], values[~live], n)
+                env    = {name: values[live] for name, values in env.items()}
+                regs   = {temp: values[live] for temp, values in regs.items()}
+                inputs = {name: values[live] for name, values in inputs.items()}
+                ids, pcs = ids[live], pcs[live]
+                w      = len(ids)
+                every  = np.arange(w)
+                consts.clear()
+            here  = pcs == p
+            idx   = None if here.all() else np.flatnonzero(here)
+            stop  = int(pcs[~here].min()) if idx is not None else end
+            while p < stop:
+                instr = code[p]
+                cls   = type(instr)
+                k     = w if idx is None else len(idx)
+                get   = (lambda a: a) if idx is None else (lambda a: a[idx])
+                failed = {}             # position in the group -> exception
+
+                if cls is LoadConst:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx, const(instr.value, k), w)
+                elif cls is LoadVar:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx, get(env[instr.name]), w)
+                elif cls is StoreVar:
+                    env[instr.name] = _scatter(env[instr.name], idx, get(regs[instr.source]), w)
+                elif cls in PYTHON:
+                    value = _binary(cls, get(regs[instr.left if cls is not Pow else instr.base]),
+                                    get(regs[instr.right if cls is not Pow else instr.exp]), failed)
+                elif cls is CompareAndBranch:
+                    value = _binary(COMPARE_OPS[instr.op], get(regs[instr.left]),
+                                    get(regs[instr.right]), failed)
+                elif cls is Jump:
+                    p = jumps[p]
+                    continue
+                elif cls in (JumpIfFalse, JumpIfTrue):
+                    value = get(regs[instr.cond])
+                elif cls is IncVar or cls is DecVar:
+                    value = _binary(Add if cls is IncVar else Sub, get(env[instr.name]),
+                                    const(instr.value, k), failed)
+                elif cls is AddVarImm:
+                    value = _binary(Add, get(env[instr.name]), const(instr.value, k), failed)
+                elif cls is StoreConst:
+                    env[instr.name] = _scatter(env[instr.name], idx, const(instr.value, k), w)
+                elif cls is LoadVarPair:
+                    regs[instr.target]  = _scatter(regs.get(instr.target), idx, get(env[instr.name]), w)
+                    regs[instr.target2] = _scatter(regs.get(instr.target2), idx, get(env[instr.name2]), w)
+                elif cls is Move:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx, get(regs[instr.source]), w)
+                elif cls is Not:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx,
+                                                  ~_truth(get(regs[instr.source])), w)
+                elif cls is IsInt:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx,
+                                                  _is_int(get(regs[instr.source])), w)
+                elif cls is LoadInput:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx, get(inputs[instr.name]), w)
+                elif cls is CallWrite:
+                    lanes = every if idx is None else idx
+                    for pos, (lane, v) in enumerate(zip(ids[lanes].tolist(),
+                                                        get(regs[instr.arg]).tolist())):
+                        try:
+                            # str() can raise too (ints past the digit limit)
+                            outputs[lane].append(f"{v} ")
+                        except Exception as e:
+                            failed[pos] = e
+                elif cls is PrintNewline:
+                    for lane in ids[every if idx is None else idx].tolist():
+                        outputs[lane].append("\n")
+                else:
+                    raise NotImplementedError(f"Batch execution not implemented for {instr!r}")
+
+                # lanes that raised stop here; the rest of the group goes on
+                if failed:
+                    lanes = every if idx is None else idx
+                    for pos, exc in failed.items():
+                        errors[ids[lanes[pos]]] = exc
+                        pcs[lanes[pos]] = end
+                    keep  = np.ones(k, dtype=bool)
+                    keep[list(failed)] = False
+                    idx   = lanes[keep]
+                    if cls is not CallWrite:    # the one that fails without a value
+                        value = _typed(value[keep])
+                    if not len(idx):
+                        break
+
+                # writes that depend on `value` wait until failed lanes are gone
+                if cls in PYTHON or cls is AddVarImm:
+                    regs[instr.target] = _scatter(regs.get(instr.target), idx, value, w)
+                elif cls is IncVar or cls is DecVar:
+                    env[instr.name] = _scatter(env[instr.name], idx, value, w)
+                elif cls in (JumpIfFalse, JumpIfTrue, CompareAndBranch):
+                    taken = _truth(value)
+                    if cls is not JumpIfTrue:
+                        taken = ~taken
+                    if taken.all():
+                        p = jumps[p]
+                        continue
+                    if taken.any():
+                        lanes = every if idx is None else idx
+                        pcs[lanes[taken]]  = jumps[p]
+                        pcs[lanes[~taken]] = p + 1
+                        break
+                p += 1
+            else:
+                if idx is None:
+                    pcs[:] = p
+                else:
+                    pcs[idx] = p
+        for name, values in env.items():
+            final[name] = _scatter(final[name], None if w == n else ids, values, n)
+        return BatchResult(n, final, outputs, errors)
+
+
+class BatchResult:
+    """
+    Per-lane results of Batch.run: env(i), output(i) (what lane i printed)
+    and error(i) (the exception that stopped it, or None); column(name) is a
+    variable's final value in every lane as one array.
+    """
+    def __init__(self, n, env, outputs, errors):
+        self.n       = n
+        self.columns = env
+        self.outputs = ["".join(parts) for parts in outputs]
+        self.errors  = errors
+
+    def __len__(self):
+        return self.n
+
+    def env(self, lane):
+        return {name: _python(values[lane]) for name, values in self.columns.items()}
+
+    def output(self, lane):
+        return self.outputs[lane]
+
+    def error(self, lane):
+        return self.errors[lane]
+
+    def column(self, name):
+        return self.columns[name]
+
+
+# ---- lane arrays ---------------------------------------------------------------
+
+def _python(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+def _typed(arr):
+    """An object array as int64/float64/bool when every lane holds that type."""
+    if arr.dtype != object or not len(arr):
+        return arr
+    kinds = set(map(type, arr))
+    if kinds == {int}:
+        try:
+            return arr.astype(np.int64)
+        except OverflowError:
+            return arr
+    if kinds == {float}:
+        return arr.astype(np.float64)
+    if kinds == {bool}:
+        return arr.astype(bool)
+    return arr
+
+def _column(values):
+    arr = np.empty(len(values), dtype=object)
+    arr[:] = values
+    return _typed(arr)
+
+def _full(value, k):
+    """`value` in each of k lanes."""
+    if type(value) is bool:
+        return np.full(k, value, dtype=bool)
+    if type(value) is float:
+        return np.full(k, value, dtype=np.float64)
+    if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+        return np.full(k, value, dtype=np.int64)
+    arr = np.empty(k, dtype=object)
+    arr.fill(value)
+    return arr
+
+def _scatter(old, idx, values, n):
+    """`old` with the lanes in `idx` (all of them if None) replaced by
+    `values`. Arrays are never changed in place, since registers share them."""
+    if idx is None:
+        return values
+    if old is None:
+        old = _full(None, n)
+    if old.dtype == values.dtype:
+        out = old.copy()
+        out[idx] = values
+        return out
+    out = old.astype(object)
+    out[idx] = values.astype(object)
+    return _typed(out)
+
+def _truth(arr):
+    """bool(value) per lane."""
+    if arr.dtype == bool:
+        return arr
+    if arr.dtype != object:
+        return arr != 0
+    return np.array([bool(v) for v in arr], dtype=bool)
+
+def _is_int(arr):
+    if arr.dtype != object:
+        return np.full(len(arr), arr.dtype == np.int64)
+    return np.array([type(v) is int for v in arr], dtype=bool)
+
+def _exact(cls, a, b):
+    """Would NumPy give Python's result for these int64/float64/bool arrays?"""
+    ints = [x for x in (a, b) if x.dtype == np.int64 and len(x)]
+    if not ints:
+        return True
+    if a.dtype == np.float64 or b.dtype == np.float64:
+        limit = FLOAT_EXACT
+    else:
+        limit = INT_LIMIT.get(cls)
+    return limit is None or all(-limit < x.min() and x.max() < limit for x in ints)
+
+def _binary(cls, a, b, failed):
+    """a <op> b per lane; lanes that raise go into `failed`."""
+    if cls in NUMPY and a.dtype != object and b.dtype != object:
+        if cls in ARITH:
+            # numpy's bool + bool is `or`; Python's is int addition
+            a = a.astype(np.int64) if a.dtype == bool else a
+            b = b.astype(np.int64) if b.dtype == bool else b
+        if _exact(cls, a, b):
+            try:
+                with np.errstate(all='raise'):
+                    return NUMPY[cls](a, b)
+            except FloatingPointError:
+                pass
+    fn, out = PYTHON[cls], []
+    for pos, (x, y) in enumerate(zip(a.tolist(), b.tolist())):
+        try:
+            out.append(fn(x, y))
+        except Exception as e:
+            failed[pos] = e
+            out.append(None)
+    return _column(out)
@@ -0,0 +1,305 @@
+# bytecode.py
+#
+# Compact binary form of optimized IR (.layerc files).
+#
+# Every instruction is four little-endian int32 words: opcode, a, b, c.
+# Temps are numbered registers, variables are numbered slots, constants are
+# indices into a deduplicated pool and jump targets are instruction indices
+# (labels are gone). A COMPARE_AND_BRANCH instruction becomes a single
+# JUMP_IF_NOT_<op> opcode. A file is
+#
+#   header   magic, version, counts and section offsets (HEADER below)
+#   code     n_instrs * 16 bytes
+#   consts   tagged constant pool entries
+#   names    variable names, in slot order
+#
+# Loading maps the file and views the code section in place; only the small
+# constant pool and name table are decoded.
+
+import mmap
+import struct
+import sys
+from array import array
+
+from ir import (
+    LoadConst, LoadVar, Add, Sub, Mul, Div, Mod, Pow, FloorDiv, IsInt,
+    StoreVar, CallWrite, PrintNewline,
+    Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch,
+    Lt, Gt, Le, Ge, Eq, Ne, Not, Move,
+    IncVar, DecVar, AddVarImm, StoreConst, LoadVarPair,
+    uses, defs
+)
+
+MAGIC   = b'LYRC'
+VERSION = 3                               # 2: superinstruction opcodes, 3: FLOOR_DIV, IS_INT
+HEADER  = struct.Struct('<4sHHIIIIIII')   # magic, version, flags, n_instrs, n_regs,
+                                          # n_vars, n_consts, code/consts/names offsets
+WIDTH   = 4                               # int32 words per instruction
+PAIR_REG_LIMIT = 1 << 15                  # registers addressable by LOAD_VAR_PAIR
+
+OPCODES = (
+    'NOP',
+    'LOAD_CONST',       # a=const  b=reg
+    'LOAD_VAR',         # a=var    b=reg
+    'STORE_VAR',        # a=reg    b=var
+    'ADD', 'SUB', 'MUL', 'DIV', 'MOD', 'POW',     # a=reg b=reg c=reg
+    'CALL_WRITE',       # a=reg
+    'PRINT_NEWLINE',
+    'JUMP',             # a=target
+    'JUMP_IF_FALSE',    # a=reg b=target
+    # compare-and-branch: jump to c unless (reg a) <op> (reg b)
+    'JUMP_IF_NOT_LT', 'JUMP_IF_NOT_GT', 'JUMP_IF_NOT_LE',
+    'JUMP_IF_NOT_GE', 'JUMP_IF_NOT_EQ', 'JUMP_IF_NOT_NE',
+    'LT', 'GT', 'LE', 'GE', 'EQ', 'NE',          # a=reg b=reg c=reg
+    'NOT',              # a=reg    b=reg
+    'MOVE',             # a=reg    b=reg
+    'JUMP_IF_TRUE',     # a=reg b=target
+    # superinstructions (peephole.py)
+    'INC_VAR',          # a=var    b=const
+    'DEC_VAR',          # a=var    b=const
+    'ADD_VAR_IMM',      # a=var    b=const  c=reg
+    'STORE_CONST',      # a=const  b=var
+    'LOAD_VAR_PAIR',    # a=var    b=var    c=reg | reg2 << 16
+    # closed-form loops (closedform.py)
+    'FLOOR_DIV',        # a=reg b=reg c=reg
+    'IS_INT',           # a=reg    b=reg
+)
+OP = {name: code for code, name in enumerate(OPCODES)}
+
+ARITH = {Add: OP['ADD'], Sub: OP['SUB'], Mul: OP['MUL'],
+         Div: OP['DIV'], Mod: OP['MOD'], Pow: OP['POW'], FloorDiv: OP['FLOOR_DIV'],
+         Lt: OP['LT'], Gt: OP['GT'], Le: OP['LE'],
+         Ge: OP['GE'], Eq: OP['EQ'], Ne: OP['NE']}
+COMPARE = {'<': OP['JUMP_IF_NOT_LT'], '>': OP['JUMP_IF_NOT_GT'],
+           '<=': OP['JUMP_IF_NOT_LE'], '>=': OP['JUMP_IF_NOT_GE'],
+           '==': OP['JUMP_IF_NOT_EQ'], '!=': OP['JUMP_IF_NOT_NE']}
+
+
+class Bytecode:
+    """
+    An assembled program: flat int32 `code` (WIDTH words per instruction),
+    constant pool, variable names and register count.
+    """
+    def __init__(self, code, consts, var_names, n_regs, backing=None):
+        self.code      = code           # array('i') or memoryview of int32
+        self.consts    = consts
+        self.var_names = var_names
+        self.n_regs    = n_regs
+        self._backing  = backing        # mmap kept open while code is in use
+
+    def __len__(self):
+        return len(self.code) // WIDTH
+
+    def close(self):
+        if self._backing is not None:
+            self.code.release()
+            self._backing.close()
+            self._backing = None
+
+    def disassemble(self):
+        lines = []
+        code = self.code
+        for i in range(0, len(code), WIDTH):
+            op, a, b, c = code[i:i + WIDTH]
+            lines.append(f"{i // WIDTH:6d}  {OPCODES[op]:<16} {a} {b} {c}")
+        return "\n".join(lines)
+
+    # ---- serialisation ------------------------------------------------------
+
+    def to_bytes(self):
+        code = array('i', self.code)
+        if sys.byteorder != 'little':
+            code.byteswap()
+        pool  = b''.join(_encode_const(v) for v in self.consts)
+        names = b''.join(_encode_str(n) for n in self.var_names)
+        code_off   = HEADER.size
+        consts_off = code_off + len(code) * 4
+        names_off  = consts_off + len(pool)
+        header = HEADER.pack(MAGIC, VERSION, 0, len(self), self.n_regs,
+                             len(self.var_names), len(self.consts),
+                             code_off, consts_off, names_off)
+        return header + code.tobytes() + pool + names
+
+    def dump(self, path):
+        with open(path, 'wb') as f:
+            f.write(self.to_bytes())
+
+
+def load(path):
+    """Map a .layerc file and return its Bytecode; the code is not copied."""
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        (magic, version, _, n_instrs, n_regs, n_vars, n_consts,
+         code_off, consts_off, names_off) = HEADER.unpack_from(buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a Layer bytecode file")
+        if not 1 <= version <= VERSION:
+            raise ValueError(f"{path}: bytecode version {version}, expected {VERSION}")
+        consts, pos = [], consts_off
+        for _ in range(n_consts):
+            value, pos = _decode_const(buf, pos)
+            consts.append(value)
+        names, pos = [], names_off
+        for _ in range(n_vars):
+            name, pos = _decode_str(buf, pos)
+            names.append(name)
+        raw = memoryview(buf)[code_off:code_off + n_instrs * WIDTH * 4]
+        if sys.byteorder == 'little':
+            code = raw.cast('i')
+        else:
+            code = array('i', raw.tobytes())
+            code.byteswap()
+            raw.release()
+            buf.close()
+            buf = None
+    except Exception:
+        if buf is not None:
+            buf.close()
+        raise
+    return Bytecode(code, consts, names, n_regs, backing=buf)
+
+
+def assemble(ir_list):
+    """Lower optimized IR to Bytecode: number registers, variables and
+    constants, strip labels and resolve jumps to instruction indices."""
+    regs, var_slots, consts, const_index = {}, {}, [], {}
+
+    def reg(name):
+        if name not in regs:
+            regs[name] = len(regs)
+        return regs[name]
+
+    def var(name):
+        if name not in var_slots:
+            var_slots[name] = len(var_slots)
+        return var_slots[name]
+
+    def const(value):
+        # 0.0 == -0.0 (and 1 == True), so pool by type and repr
+        key = (type(value), repr(value))
+        if key not in const_index:
+            const_index[key] = len(consts)
+            consts.append(value)
+        return const_index[key]
+
+    # LOAD_VAR_PAIR packs two registers into one word; split pairs back into
+    # two LOAD_VARs when register numbers could overflow it
+    temps = {t for instr in ir_list for t in uses(instr) + defs(instr)}
+    if len(temps) > PAIR_REG_LIMIT:
+        ir_list = [x for instr in ir_list for x in
+                   ((LoadVar(instr.name, instr.target), LoadVar(instr.name2, instr.target2))
+                    if isinstance(instr, LoadVarPair) else (instr,))]
+
+    # labels resolve to the index of the next real instruction
+    targets, n = {}, 0
+    for instr in ir_list:
+        if isinstance(instr, Label):
+            targets[instr.name] = n
+        else:
+            n += 1
+
+    code = array('i')
+    for instr in ir_list:
+        if isinstance(instr, Label):
+            continue
+        if isinstance(instr, LoadConst):
+            words = (OP['LOAD_CONST'], const(instr.value), reg(instr.target), 0)
+        elif isinstance(instr, LoadVar):
+            words = (OP['LOAD_VAR'], var(instr.name), reg(instr.target), 0)
+        elif isinstance(instr, StoreVar):
+            words = (OP['STORE_VAR'], reg(instr.source), var(instr.name), 0)
+        elif isinstance(instr, Pow):
+            words = (OP['POW'], reg(instr.base), reg(instr.exp), reg(instr.target))
+        elif type(instr) in ARITH:
+            words = (ARITH[type(instr)], reg(instr.left), reg(instr.right), reg(instr.target))
+        elif isinstance(instr, CallWrite):
+            words = (OP['CALL_WRITE'], reg(instr.arg), 0, 0)
+        elif isinstance(instr, PrintNewline):
+            words = (OP['PRINT_NEWLINE'], 0, 0, 0)
+        elif isinstance(instr, Jump):
+            words = (OP['JUMP'], targets[instr.label], 0, 0)
+        elif isinstance(instr, JumpIfFalse):
+            words = (OP['JUMP_IF_FALSE'], reg(instr.cond), targets[instr.label], 0)
+        elif isinstance(instr, JumpIfTrue):
+            words = (OP['JUMP_IF_TRUE'], reg(instr.cond), targets[instr.label], 0)
+        elif isinstance(instr, CompareAndBranch):
+            words = (COMPARE[instr.op], reg(instr.left), reg(instr.right), targets[instr.label])
+        elif isinstance(instr, Not):
+            words = (OP['NOT'], reg(instr.source), reg(instr.target), 0)
+        elif isinstance(instr, Move):
+            words = (OP['MOVE'], reg(instr.source), reg(instr.target), 0)
+        elif isinstance(instr, IsInt):
+            words = (OP['IS_INT'], reg(instr.source), reg(instr.target), 0)
+        elif isinstance(instr, IncVar):
+            words = (OP['INC_VAR'], var(instr.name), const(instr.value), 0)
+        elif isinstance(instr, DecVar):
+            words = (OP['DEC_VAR'], var(instr.name), const(instr.value), 0)
+        elif isinstance(instr, AddVarImm):
+            words = (OP['ADD_VAR_IMM'], var(instr.name), const(instr.value), reg(instr.target))
+        elif isinstance(instr, StoreConst):
+            words = (OP['STORE_CONST'], const(instr.value), var(instr.name), 0)
+        elif isinstance(instr, LoadVarPair):
+            words = (OP['LOAD_VAR_PAIR'], var(instr.name), var(instr.name2),
+                     reg(instr.target) | reg(instr.target2) << 16)
+        else:
+            raise NotImplementedError(f"No bytecode for {instr!r}")
+        code.extend(words)
+
+    names = [None] * len(var_slots)
+    for name, slot in var_slots.items():
+        names[slot] = name
+    return Bytecode(code, consts, names, len(regs))
+
+
+# ---- constant pool encoding ---------------------------------------------------
+
+_I64 = struct.Struct('<q')
+_F64 = struct.Struct('<d')
+_U32 = struct.Struct('<I')
+
+def _encode_str(text):
+    data = text.encode('utf-8')
+    return _U32.pack(len(data)) + data
+
+def _decode_str(buf, pos):
+    (n,) = _U32.unpack_from(buf, pos)
+    pos += 4
+    return str(buf[pos:pos + n], 'utf-8'), pos + n
+
+def _encode_const(value):
+    if value is None:
+        return b'N'
+    if isinstance(value, bool):
+        return b'T' if value else b'F'
+    if isinstance(value, int):
+        if -(1 << 63) <= value < (1 << 63):
+            return b'I' + _I64.pack(value)
+        data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+        return b'L' + _U32.pack(len(data)) + data
+    if isinstance(value, float):
+        return b'D' + _F64.pack(value)
+    if isinstance(value, str):
+        return b'S' + _encode_str(value)
+    raise TypeError(f"Cannot encode constant {value!r}")
+
+def _decode_const(buf, pos):
+    tag = buf[pos:pos + 1]
+    pos += 1
+    if tag == b'N':
+        return None, pos
+    if tag == b'T':
+        return True, pos
+    if tag == b'F':
+        return False, pos
+    if tag == b'I':
+        return _I64.unpack_from(buf, pos)[0], pos + 8
+    if tag == b'L':
+        (n,) = _U32.unpack_from(buf, pos)
+        pos += 4
+        return int.from_bytes(buf[pos:pos + n], 'little', signed=True), pos + n
+    if tag == b'D':
+        return _F64.unpack_from(buf, pos)[0], pos + 8
+    if tag == b'S':
+        return _decode_str(buf, pos)
+    raise ValueError(f"Bad constant tag {tag!r} at offset {pos - 1}")
@@ -0,0 +1,217 @@
+# cache.py
+
+import ast
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+try:
+    import fcntl
+except ImportError:         # not on Windows: stats updates become best-effort
+    fcntl = None
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+CACHE_FORMAT      = 1
+
+# Everything compilation.py imports from this directory, directly or not,
+# decides what a source compiles to. Those files are hashed into every key,
+# so editing any compiler pass invalidates the cache; the list is found by
+# following imports, so new passes cannot be left out of it.
+ROOT_MODULE = 'compilation.py'
+
+def compiler_modules():
+    """File names of ROOT_MODULE and the local modules it imports, sorted."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    seen, todo = set(), [ROOT_MODULE]
+    while todo:
+        name = todo.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        with open(os.path.join(here, name), 'rb') as f:
+            tree = ast.parse(f.read(), name)
+        for node in ast.walk(tree):
+            if isinstance(node, ast.ImportFrom) and node.level == 0 and node.module:
+                imported = [node.module]
+            elif isinstance(node, ast.Import):
+                imported = [alias.name for alias in node.names]
+            else:
+                continue
+            for module in imported:
+                path = module.split('.')[0] + '.py'
+                if os.path.isfile(os.path.join(here, path)):
+                    todo.append(path)
+    return sorted(seen)
+
+_fingerprint = None
+
+def compiler_version():
+    """Content hash of the compiler modules (computed once per process)."""
+    global _fingerprint
+    if _fingerprint is None:
+        h = hashlib.sha256(f"layer-cache-{CACHE_FORMAT}".encode())
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in compiler_modules():
+            with open(os.path.join(here, name), 'rb') as f:
+                h.update(name.encode() + b'\0' + f.read())
+        _fingerprint = h.hexdigest()
+    return _fingerprint
+
+def default_cache_dir():
+    return os.environ.get('LAYER_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'layer-compiler')
+
+class CompileCache:
+    """
+    Content-addressed store of optimized IR.
+
+    Entries live in `<root>/objects/<key[:2]>/<key>.ir` and are written to a
+    temporary file first and then renamed into place, so concurrent writers
+    never expose a partial entry. Hits refresh the entry's mtime; when the
+    store grows past `max_bytes` the least recently used entries are
+    evicted. Hit/miss/store/eviction counters persist in `stats.json`.
+    """
+    def __init__(self, root=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.root      = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        self.objects   = os.path.join(self.root, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+
+    # ---- keys ---------------------------------------------------------------
+
+    def key(self, source, settings=None):
+        """Key for `source` (str or bytes) compiled with `settings` (a dict)."""
+        h = hashlib.sha256()
+        h.update(compiler_version().encode())
+        h.update(json.dumps(settings or {}, sort_keys=True).encode())
+        h.update(b'\0')
+        h.update(source.encode('utf-8') if isinstance(source, str) else source)
+        return h.hexdigest()
+
+    def key_for_file(self, path, settings=None, chunk=1 << 20):
+        """Same as key(), hashing the file in chunks instead of loading it."""
+        h = hashlib.sha256()
+        h.update(compiler_version().encode())
+        h.update(json.dumps(settings or {}, sort_keys=True).encode())
+        h.update(b'\0')
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk), b''):
+                h.update(block)
+        return h.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.objects, key[:2], key + '.ir')
+
+    # ---- lookup / store -----------------------------------------------------
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                ir_list = pickle.load(f)
+        except FileNotFoundError:
+            self._bump('misses')
+            return None
+        except Exception:
+            # truncated or stale entry: drop it and recompile
+            self._remove(path)
+            self._bump('misses')
+            return None
+        try:
+            os.utime(path)          # mark as recently used
+        except OSError:
+            pass
+        self._bump('hits')
+        return ir_list
+
+    def put(self, key, ir_list):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(ir_list, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)   # atomic: readers see old or new, never half
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self._bump('stores')
+        self.evict()
+
+    def evict(self):
+        """Remove least recently used entries until under max_bytes."""
+        entries, total = [], 0
+        for dirpath, _, files in os.walk(self.objects):
+            for name in files:
+                if not name.endswith('.ir'):
+                    continue
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue        # removed by a concurrent evictor
+                entries.append((st.st_mtime, st.st_size, path))
+                total += st.st_size
+        if total <= self.max_bytes:
+            return 0
+        entries.sort()
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if self._remove(path):
+                evicted += 1
+            total -= size
+        self._bump('evictions', evicted)
+        return evicted
+
+    def clear(self):
+        for dirpath, _, files in os.walk(self.objects):
+            for name in files:
+                self._remove(os.path.join(dirpath, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+            return True
+        except OSError:
+            return False
+
+    # ---- stats --------------------------------------------------------------
+
+    def stats(self):
+        stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+        try:
+            with open(os.path.join(self.root, 'stats.json')) as f:
+                stats.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+        entries = size = 0
+        for dirpath, _, files in os.walk(self.objects):
+            for name in files:
+                if name.endswith('.ir'):
+                    entries += 1
+                    size += os.path.getsize(os.path.join(dirpath, name))
+        stats.update(entries=entries, bytes=size, max_bytes=self.max_bytes)
+        return stats
+
+    def _bump(self, counter, n=1):
+        if not n:
+            return
+        path = os.path.join(self.root, 'stats.json')
+        with open(os.path.join(self.root, 'stats.lock'), 'a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                with open(path) as f:
+                    stats = json.load(f)
+            except (OSError, ValueError):
+                stats = {}
+            stats[counter] = stats.get(counter, 0) + n
+            fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(stats, f)
+            os.replace(tmp, path)
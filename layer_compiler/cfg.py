@@ -0,0 +1,169 @@
+# cfg.py
+#
+# Control-flow graph and liveness over linear IR.
+
+from ir import Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch, uses, defs
+
+BRANCHES = (JumpIfFalse, JumpIfTrue, CompareAndBranch)
+
+class BasicBlock:
+    def __init__(self, index, start, end):
+        self.index = index
+        self.start = start      # first instruction (inclusive)
+        self.end   = end        # last instruction + 1
+        self.succs = []         # successor BasicBlocks
+        self.preds = []         # predecessor BasicBlocks
+
+    def __repr__(self):
+        return (f"BasicBlock({self.index}, [{self.start}:{self.end}], "
+                f"succs={[b.index for b in self.succs]})")
+
+
+def build_cfg(ir_list):
+    """Split IR into basic blocks (in program order) and link them."""
+    leaders = {0} if ir_list else set()
+    for i, instr in enumerate(ir_list):
+        if isinstance(instr, Label):
+            leaders.add(i)
+        elif isinstance(instr, (Jump,) + BRANCHES) and i + 1 < len(ir_list):
+            leaders.add(i + 1)
+
+    starts = sorted(leaders)
+    blocks = [BasicBlock(n, s, e) for n, (s, e)
+              in enumerate(zip(starts, starts[1:] + [len(ir_list)]))]
+    block_of_label = {
+        ir_list[b.start].name: b for b in blocks if isinstance(ir_list[b.start], Label)
+    }
+
+    for n, block in enumerate(blocks):
+        last = ir_list[block.end - 1]
+        after = blocks[n + 1] if n + 1 < len(blocks) else None
+        if isinstance(last, Jump):
+            targets = [block_of_label[last.label]]
+        elif isinstance(last, BRANCHES):
+            targets = [block_of_label[last.label]] + ([after] if after else [])
+        else:
+            targets = [after] if after else []
+        for succ in targets:
+            if succ not in block.succs:
+                block.succs.append(succ)
+                succ.preds.append(block)
+    return blocks
+
+
+def liveness(ir_list, blocks):
+    """Temps live on entry to / exit from each block: (live_in, live_out)."""
+    gen, kill = [], []
+    for block in blocks:
+        g, k = set(), set()
+        for instr in ir_list[block.start:block.end]:
+            g.update(t for t in uses(instr) if t not in k)
+            k.update(defs(instr))
+        gen.append(g)
+        kill.append(k)
+
+    live_in  = [set() for _ in blocks]
+    live_out = [set() for _ in blocks]
+    changed = True
+    while changed:
+        changed = False
+        for block in reversed(blocks):
+            n = block.index
+            out = set()
+            for succ in block.succs:
+                out |= live_in[succ.index]
+            new_in = gen[n] | (out - kill[n])
+            if out != live_out[n] or new_in != live_in[n]:
+                live_out[n], live_in[n] = out, new_in
+                changed = True
+    return live_in, live_out
+
+
+def reverse_postorder(blocks):
+    """Blocks reachable from the entry, in reverse postorder."""
+    if not blocks:
+        return []
+    order, seen = [], {0}
+    stack = [(blocks[0], iter(blocks[0].succs))]
+    while stack:
+        block, succs = stack[-1]
+        for succ in succs:
+            if succ.index not in seen:
+                seen.add(succ.index)
+                stack.append((succ, iter(succ.succs)))
+                break
+        else:
+            stack.pop()
+            order.append(block)
+    order.reverse()
+    return order
+
+
+def dominators(blocks):
+    """
+    Immediate dominator index of each block (Cooper, Harvey & Kennedy).
+    The entry is its own idom; unreachable blocks get None.
+    """
+    rpo  = reverse_postorder(blocks)
+    rank = {b.index: r for r, b in enumerate(rpo)}
+    idom = [None] * len(blocks)
+    if not rpo:
+        return idom
+    idom[0] = 0
+
+    def intersect(a, b):
+        while a != b:
+            while rank[a] > rank[b]:
+                a = idom[a]
+            while rank[b] > rank[a]:
+                b = idom[b]
+        return a
+
+    changed = True
+    while changed:
+        changed = False
+        for block in rpo[1:]:
+            new = None
+            for pred in block.preds:
+                if idom[pred.index] is None:
+                    continue
+                new = pred.index if new is None else intersect(pred.index, new)
+            if idom[block.index] != new:
+                idom[block.index] = new
+                changed = True
+    return idom
+
+
+def dominates(idom, a, b):
+    """True if block a dominates block b (indices; idom from dominators())."""
+    while b is not None:
+        if a == b:
+            return True
+        if idom[b] == b:
+            return False
+        b = idom[b]
+    return False
+
+
+def natural_loops(blocks, idom=None):
+    """
+    {header index: set of block indices} for every natural loop, i.e. every
+    edge whose target dominates its source; back edges sharing a header are
+    merged into one loop.
+    """
+    if idom is None:
+        idom = dominators(blocks)
+    loops = {}
+    for block in blocks:
+        for succ in block.succs:
+            if not dominates(idom, succ.index, block.index):
+                continue
+            body = loops.setdefault(succ.index, {succ.index})
+            work = [block.index]
+            while work:
+                n = work.pop()
+                if n in body:
+                    continue
+                body.add(n)
+                work.extend(p.index for p in blocks[n].preds if idom[p.index] is not None)
+    return loops
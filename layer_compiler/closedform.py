@@ -0,0 +1,303 @@
+# closedform.py
+#
+# Closed forms for counted loops that only accumulate.
+#
+# `loop i for N times -> {...}` qualifies when every statement of its body is
+#
+#   x = x + e   (or x = e + x, x = x - e)    an accumulation
+#   x = e                                    a plain assignment
+#   loop j for M times -> {...}              a nested loop that qualifies,
+#                                            M not depending on the loop
+#
+# where e is a polynomial of degree <= MAX_DEGREE in the loop variable:
+# int literals, variables the loop never assigns and the loop variable,
+# combined with +, -, *, unary minus and ^ with a literal exponent. Each
+# accumulation then adds sum(e(i) for i < N), which Faulhaber's formulas give
+# as a polynomial in N, and a plain assignment leaves x = e(N - 1). A nested
+# loop is summed first and its per-iteration effect fed to the outer loop,
+# so nested.layer's two loops become one multiplication.
+#
+# Everything stays in int arithmetic, so the result is exactly what the loop
+# would compute (with floats the rounding would differ). The closed form is
+# guarded at runtime: N, every nested M and every variable read must be ints
+# (not bools) and M must be >= 0, otherwise the loop runs as written. See
+# IRGenerator._gen_closed_form for the code around it.
+
+from layer_ast import (
+    Assignment, LoopFor, Expr, Literal, Name, UnaryOp, BinOp, postorder
+)
+from rules import BINARY_PRECEDENCE
+
+MAX_DEGREE = 3
+
+
+class TempRef(Expr):
+    """An IR temp used as an expression leaf; `temp` is set during codegen."""
+    def __init__(self, temp=None):
+        self.temp = temp
+
+    def _parts(self, mode):
+        return [f"TempRef({self.temp})" if mode == 'repr' else f"%{self.temp}"]
+
+
+class FloorDivExpr(BinOp):
+    """left // right, exact for the ints the guards allow. Only closed forms
+    build it (the language has no such operator), so its precedence lives
+    here rather than in rules.py; codegen lowers it to the FloorDiv IR op."""
+    precedence = BINARY_PRECEDENCE['*']
+
+    def __init__(self, left, right):
+        super().__init__('//', left, right)
+
+
+class ClosedForm:
+    """
+    The straight-line replacement of a loop:
+    counts    [(TempRef, count Expr, least allowed value)] for nested loops
+    updates   [(variable, Expr)] to store, in terms of the values before the loop
+    guards    variables that must hold ints: all those the body reads, even
+              where folding dropped them (x * 0 is 0.0 for a float x)
+    """
+    def __init__(self, counts, updates, reads):
+        self.counts  = counts
+        self.updates = updates
+        self.guards  = sorted(reads | {node.name for _, expr in updates
+                                       for node in postorder(expr) if isinstance(node, Name)})
+
+
+def closed_form(loop, count):
+    """ClosedForm for LoopFor `loop` whose count is TempRef `count`, or None."""
+    try:
+        assigned = _assigned([loop])
+        counts   = []
+        effects  = _effects(loop.block.statements, loop.var, assigned, counts)
+    except RecursionError:
+        return None
+    if effects is None:
+        return None
+    updates = []
+    for name, (kind, poly) in sorted(effects.items()):
+        if kind == 'acc':
+            updates.append((name, _add(Name(name), _summed(poly, count))))
+        else:
+            updates.append((name, _at(poly, _sub(count, Literal(1)))))
+    updates.append((loop.var, count))
+    reads = {node.name for stmt in _statements(loop.block.statements)
+             if isinstance(stmt, Assignment)
+             for node in postorder(stmt.expr) if isinstance(node, Name)}
+    return ClosedForm(counts, updates, reads - assigned)
+
+
+def _statements(stmts):
+    """A statement list and the bodies of the loops in it, flattened."""
+    stack = list(stmts)
+    while stack:
+        stmt = stack.pop()
+        yield stmt
+        if isinstance(stmt, LoopFor):
+            stack.extend(stmt.block.statements)
+
+def _assigned(stmts):
+    """Every variable a statement list assigns, loop variables included."""
+    return ({stmt.name for stmt in _statements(stmts) if isinstance(stmt, Assignment)}
+            | {stmt.var for stmt in _statements(stmts) if isinstance(stmt, LoopFor)})
+
+
+def _effects(stmts, var, assigned, counts, outer=()):
+    """
+    What one iteration of a body does, as {variable: (kind, polynomial in
+    `var`)}: kind 'acc' adds the polynomial, 'set' stores it. None if the
+    body does not qualify. The `outer` loop variables are coefficients.
+    """
+    effects = {}
+
+    def merge(name, kind, poly):
+        if name == var:
+            return False
+        old = effects.get(name)
+        if old is None:
+            effects[name] = (kind, poly)
+            return True
+        if old[0] == kind == 'acc':
+            effects[name] = (kind, _padd(old[1], poly))
+            return True
+        return False
+
+    for stmt in stmts:
+        if isinstance(stmt, Assignment):
+            terms  = _terms(stmt.expr)
+            selves = [sign for sign, t in terms if isinstance(t, Name) and t.name == stmt.name]
+            if selves == [1]:
+                delta = {}
+                for sign, t in terms:
+                    if isinstance(t, Name) and t.name == stmt.name:
+                        continue
+                    p = _poly(t, var, assigned, outer)
+                    if p is None:
+                        return None
+                    delta = _padd(delta, p if sign > 0 else _pneg(p))
+                kind, poly = 'acc', delta
+            elif not selves:
+                kind, poly = 'set', _poly(stmt.expr, var, assigned, outer)
+            else:
+                return None
+            if poly is None or not merge(stmt.name, kind, poly):
+                return None
+
+        elif isinstance(stmt, LoopFor):
+            # the count is evaluated once, before the outer loop
+            if any(isinstance(n, Name) and n.name in assigned for n in postorder(stmt.count)):
+                return None
+            inner = _effects(stmt.block.statements, stmt.var, assigned, counts, outer + (var,))
+            if inner is None:
+                return None
+            ref = TempRef()
+            sets = any(kind == 'set' for kind, _ in inner.values())
+            counts.append((ref, stmt.count, 1 if sets else 0))
+            for name, (kind, poly) in inner.items():
+                if kind == 'acc':
+                    p = _poly(_summed(poly, ref), var, assigned, outer)
+                else:
+                    p = _poly(_at(poly, _sub(ref, Literal(1))), var, assigned, outer)
+                if p is None or not merge(name, kind, p):
+                    return None
+            if not merge(stmt.var, 'set', {0: ref}):
+                return None
+
+        else:
+            return None
+    return effects
+
+
+def _terms(expr):
+    """Top-level +/- terms of an expression as [(sign, Expr)]."""
+    out, stack = [], [(1, expr)]
+    while stack:
+        sign, node = stack.pop()
+        if isinstance(node, BinOp) and node.op in ('+', '-'):
+            stack.append((sign if node.op == '+' else -sign, node.right))
+            stack.append((sign, node.left))
+        else:
+            out.append((sign, node))
+    return out
+
+
+# ---- polynomials: {degree: coefficient Expr} ----------------------------------
+
+def _poly(expr, var, assigned, outer=()):
+    """`expr` as a polynomial in `var`, or None if it is not one (see module
+    notes). Variables in `outer` count as invariant."""
+    if isinstance(expr, Literal):
+        return {0: expr} if type(expr.value) is int else None
+    if isinstance(expr, TempRef):
+        return {0: expr}
+    if isinstance(expr, Name):
+        if expr.name == var:
+            return {1: Literal(1)}
+        return None if expr.name in assigned and expr.name not in outer else {0: expr}
+    if isinstance(expr, UnaryOp):
+        p = _poly(expr.operand, var, assigned, outer) if expr.op == '-' else None
+        return None if p is None else _pneg(p)
+    if not isinstance(expr, BinOp):
+        return None
+    if expr.op == '^':
+        if not (isinstance(expr.right, Literal) and type(expr.right.value) is int
+                and 0 <= expr.right.value <= MAX_DEGREE):
+            return None
+        base = _poly(expr.left, var, assigned, outer)
+        out  = None if base is None else {0: Literal(1)}
+        for _ in range(expr.right.value):
+            out = None if out is None else _pmul(out, base)
+        return out
+    if expr.op not in ('+', '-', '*', '//'):
+        return None
+    a = _poly(expr.left, var, assigned, outer)
+    b = _poly(expr.right, var, assigned, outer)
+    if a is None or b is None:
+        return None
+    if expr.op == '+':
+        return _padd(a, b)
+    if expr.op == '-':
+        return _padd(a, _pneg(b))
+    if expr.op == '*':
+        return _pmul(a, b)
+    if set(a) | set(b) == {0}:         # '//' only between invariants
+        return {0: FloorDivExpr(a[0], b[0])}
+    return None
+
+def _padd(a, b):
+    out = dict(a)
+    for k, c in b.items():
+        out[k] = _add(out[k], c) if k in out else c
+    return out
+
+def _pneg(a):
+    return {k: _neg(c) for k, c in a.items()}
+
+def _pmul(a, b):
+    out = {}
+    for i, x in a.items():
+        for j, y in b.items():
+            if i + j > MAX_DEGREE:
+                return None
+            term   = _mul(x, y)
+            out[i + j] = _add(out[i + j], term) if i + j in out else term
+    return out
+
+def _summed(poly, n):
+    """sum(poly(i) for i in range(n)) as an Expr, for n >= 0."""
+    n1 = _sub(n, Literal(1))
+    s1 = FloorDivExpr(_mul(n, n1), Literal(2))
+    sums = {0: n, 1: s1,
+            2: FloorDivExpr(_mul(_mul(n, n1), _sub(_mul(Literal(2), n), Literal(1))), Literal(6)),
+            3: _mul(s1, s1)}
+    out = Literal(0)
+    for k, c in sorted(poly.items()):
+        out = _add(out, _mul(c, sums[k]))
+    return out
+
+def _at(poly, x):
+    """poly(x) as an Expr."""
+    out = Literal(0)
+    for k, c in sorted(poly.items()):
+        term = c
+        for _ in range(k):
+            term = _mul(term, x)
+        out = _add(out, term)
+    return out
+
+# Expr builders that fold int literals, so simple loops give simple code
+
+def _lit(e):
+    return isinstance(e, Literal) and type(e.value) is int
+
+def _add(a, b):
+    if _lit(a) and _lit(b):
+        return Literal(a.value + b.value)
+    if _lit(a) and a.value == 0:
+        return b
+    if _lit(b) and b.value == 0:
+        return a
+    return BinOp('+', a, b)
+
+def _sub(a, b):
+    if _lit(a) and _lit(b):
+        return Literal(a.value - b.value)
+    if _lit(b) and b.value == 0:
+        return a
+    return BinOp('-', a, b)
+
+def _mul(a, b):
+    if _lit(a) and _lit(b):
+        return Literal(a.value * b.value)
+    for x, y in ((a, b), (b, a)):
+        if _lit(x) and x.value == 1:
+            return y
+        if _lit(x) and x.value == 0:
+            return Literal(0)
+    return BinOp('*', a, b)
+
+def _neg(a):
+    if _lit(a):
+        return Literal(-a.value)
+    return UnaryOp('-', a)
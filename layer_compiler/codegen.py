@@ -3,20 +3,37 @@
 from layer_ast import (
     Program, VarDecl, Assignment,
     WriteStmt, LoopFor, LoopWhile, IfStmt,
-    Expr
+    Expr, Literal, UnaryOp, BinOp
 )
+from closedform import closed_form, TempRef
 from ir import (
-    LoadConst, LoadVar, Add, Sub, Mul, Div, Pow,
+    LoadConst, LoadVar, LoadInput, Add, Sub, Mul, Div, Mod, Pow, FloorDiv, IsInt,
     StoreVar, CallWrite, PrintNewline,
-    Label, Jump, JumpIfFalse,
+    Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch,
+    Not, Move, COMPARE_OPS, NEGATED,
     TempGenerator, LabelGenerator
 )
 
+ARITH_OPS = {'+': Add, '-': Sub, '*': Mul, '/': Div, '%': Mod, '^': Pow,
+             '//': FloorDiv}     # '//' only comes from closedform.py
+
+# work items for the explicit-stack walk in _gen_expr
+_VISIT, _EMIT, _SHORT_RIGHT, _SHORT_END = range(4)
+
 class IRGenerator:
-    def __init__(self):
+    """
+    AST -> IR. With closed_forms=True, counted loops that only accumulate
+    get a guarded straight-line version in front of them (closedform.py).
+    The first declaration of each name in `inputs` takes its value from a
+    LOAD_INPUT instead of its initializer (batch programs, see batch.py).
+    """
+    def __init__(self, closed_forms=False, inputs=()):
         self.temp_gen  = TempGenerator()
         self.label_gen = LabelGenerator()
         self.instructions = []
+        self.closed_forms = closed_forms
+        self.closed_loops = 0       # loops given a closed form
+        self.inputs       = set(inputs)     # input declarations not seen yet
 
     def generate(self, tree: Program):
         self.instructions = []
@@ -26,7 +43,12 @@ class IRGenerator:
 
     def _gen_stmt(self, stmt):
         if isinstance(stmt, VarDecl):
-            if stmt.expr is not None:
+            if stmt.name in self.inputs:
+                self.inputs.discard(stmt.name)
+                tmp = self.temp_gen.new_temp()
+                self.instructions.append(LoadInput(stmt.name, tmp))
+                self.instructions.append(StoreVar(tmp, stmt.name))
+            elif stmt.expr is not None:
                 src = self._gen_expr(stmt.expr)
                 self.instructions.append(StoreVar(src, stmt.name))
             else:
@@ -56,13 +78,17 @@ class IRGenerator:
             # count
             cnt_tmp = self._gen_expr(stmt.count)
 
+            plan = closed_form(stmt, TempRef(cnt_tmp)) if self.closed_forms else None
+            if plan is not None:
+                self._gen_closed_form(plan, cnt_tmp, end_lbl)
+
             # loop start
             self.instructions.append(Label(start_lbl))
 
             # test i < count
             i_tmp = self.temp_gen.new_temp()
             self.instructions.append(LoadVar(stmt.var, i_tmp))
-            self.instructions.append(JumpIfFalse(f"{i_tmp} < {cnt_tmp}", end_lbl))
+            self.instructions.append(CompareAndBranch('<', i_tmp, cnt_tmp, end_lbl))
 
             # body
             for inner in stmt.block.statements:
@@ -86,8 +112,7 @@ class IRGenerator:
             end_lbl   = self.label_gen.new_label("WHILE_END_")
 
             self.instructions.append(Label(start_lbl))
-            cond_tmp = self._gen_expr(stmt.condition)
-            self.instructions.append(JumpIfFalse(cond_tmp, end_lbl))
+            self._gen_branch(stmt.condition, end_lbl)
 
             for inner in stmt.block.statements:
                 self._gen_stmt(inner)
@@ -97,8 +122,7 @@ class IRGenerator:
 
         elif isinstance(stmt, IfStmt):
             end_lbl  = self.label_gen.new_label("IF_END_")
-            cond_tmp = self._gen_expr(stmt.condition)
-            self.instructions.append(JumpIfFalse(cond_tmp, end_lbl))
+            self._gen_branch(stmt.condition, end_lbl)
 
             for inner in stmt.block.statements:
                 self._gen_stmt(inner)
@@ -108,30 +132,158 @@ class IRGenerator:
         else:
             raise NotImplementedError(f"IR gen not implemented for {stmt}")
 
-    def _gen_expr(self, expr: Expr):
-        v = expr.value.strip()
-        # string literal
-        if v.startswith('"') and v.endswith('"'):
+    def _gen_closed_form(self, plan, cnt_tmp, end_lbl):
+        """
+        Fast path in front of a loop: if the count, the nested counts and
+        every variable involved are ints, store the loop's final values and
+        jump past it; otherwise fall into the loop as written.
+        """
+        slow_lbl = self.label_gen.new_label("FOR_SLOW_")
+        emit = self.instructions.append
+
+        def guard_int(temp):
+            ok = self.temp_gen.new_temp()
+            emit(IsInt(temp, ok))
+            emit(JumpIfFalse(ok, slow_lbl))
+
+        def const(value):
             tmp = self.temp_gen.new_temp()
-            self.instructions.append(LoadConst(v[1:-1], tmp))
+            emit(LoadConst(value, tmp))
             return tmp
-        # numeric literal
-        if v.replace('.', '', 1).lstrip('-').isdigit():
+
+        guard_int(cnt_tmp)
+        # a loop that runs no times leaves everything as it is
+        emit(CompareAndBranch('>', cnt_tmp, const(0), end_lbl))
+        for ref, count, least in plan.counts:
+            ref.temp = self._gen_expr(count)
+            guard_int(ref.temp)
+            emit(CompareAndBranch('>=', ref.temp, const(least), slow_lbl))
+        for name in plan.guards:
             tmp = self.temp_gen.new_temp()
-            num = float(v) if '.' in v else int(v)
-            self.instructions.append(LoadConst(num, tmp))
-            return tmp
-        # binary ops (^, then */, then +-)
-        for sym, Instr in [('^', Pow), ('*', Mul), ('/', Div),
-                           ('+', Add), ('-', Sub)]:
-            if sym in v and not v.startswith(sym):
-                left_s, right_s = v.split(sym, 1)
-                left  = self._gen_expr(Expr(left_s.strip()))
-                right = self._gen_expr(Expr(right_s.strip()))
-                tmp   = self.temp_gen.new_temp()
-                self.instructions.append(Instr(left, right, tmp))
-                return tmp
-        # var reference
-        tmp = self.temp_gen.new_temp()
-        self.instructions.append(LoadVar(v, tmp))
-        return tmp
+            emit(LoadVar(name, tmp))
+            guard_int(tmp)
+        for name, expr in plan.updates:
+            emit(StoreVar(self._gen_expr(expr), name))
+        emit(Jump(end_lbl))
+        emit(Label(slow_lbl))
+        self.closed_loops += 1
+
+    # ---- conditions: lowered straight to branches --------------------------
+
+    def _gen_branch(self, expr: Expr, false_lbl):
+        """Fall through when `expr` is true, jump to false_lbl otherwise."""
+        if isinstance(expr, BinOp) and expr.op in COMPARE_OPS:
+            left  = self._gen_expr(expr.left)
+            right = self._gen_expr(expr.right)
+            self.instructions.append(CompareAndBranch(expr.op, left, right, false_lbl))
+        elif isinstance(expr, BinOp) and expr.op == 'and':
+            for operand in _chain(expr, 'and'):
+                self._gen_branch(operand, false_lbl)
+        elif isinstance(expr, BinOp) and expr.op == 'or':
+            true_lbl = self.label_gen.new_label("OR_TRUE_")
+            *firsts, last = _chain(expr, 'or')
+            for operand in firsts:
+                self._gen_branch_true(operand, true_lbl)
+            self._gen_branch(last, false_lbl)
+            self.instructions.append(Label(true_lbl))
+        elif isinstance(expr, UnaryOp) and expr.op == 'not':
+            self._gen_branch_true(expr.operand, false_lbl)
+        else:
+            self.instructions.append(JumpIfFalse(self._gen_expr(expr), false_lbl))
+
+    def _gen_branch_true(self, expr: Expr, true_lbl):
+        """Jump to true_lbl when `expr` is true, fall through otherwise."""
+        if isinstance(expr, BinOp) and expr.op in COMPARE_OPS:
+            left  = self._gen_expr(expr.left)
+            right = self._gen_expr(expr.right)
+            self.instructions.append(CompareAndBranch(NEGATED[expr.op], left, right, true_lbl))
+        elif isinstance(expr, BinOp) and expr.op == 'or':
+            for operand in _chain(expr, 'or'):
+                self._gen_branch_true(operand, true_lbl)
+        elif isinstance(expr, BinOp) and expr.op == 'and':
+            false_lbl = self.label_gen.new_label("AND_FALSE_")
+            *firsts, last = _chain(expr, 'and')
+            for operand in firsts:
+                self._gen_branch(operand, false_lbl)
+            self._gen_branch_true(last, true_lbl)
+            self.instructions.append(Label(false_lbl))
+        elif isinstance(expr, UnaryOp) and expr.op == 'not':
+            self._gen_branch(expr.operand, true_lbl)
+        else:
+            self.instructions.append(JumpIfTrue(self._gen_expr(expr), true_lbl))
+
+    # ---- values -------------------------------------------------------------
+
+    def _gen_expr(self, expr: Expr):
+        # Explicit-stack walk (no recursion). Most nodes are emitted after
+        # their operands; 'and'/'or' emit a branch between their operands so
+        # the right one is only evaluated when needed, and merge both values
+        # into one temp with MOVE.
+        temps = []
+        stack = [(_VISIT, expr)]
+        while stack:
+            action, node, *extra = stack.pop()
+
+            if action == _VISIT:
+                if isinstance(node, BinOp) and node.op in ('and', 'or'):
+                    stack.append((_SHORT_RIGHT, node))
+                    stack.append((_VISIT, node.left))
+                elif node.children():
+                    stack.append((_EMIT, node))
+                    for child in reversed(node.children()):
+                        stack.append((_VISIT, child))
+                elif isinstance(node, TempRef):
+                    temps.append(node.temp)
+                else:
+                    tmp = self.temp_gen.new_temp()
+                    if isinstance(node, Literal):
+                        self.instructions.append(LoadConst(node.value, tmp))
+                    else:
+                        self.instructions.append(LoadVar(node.name, tmp))
+                    temps.append(tmp)
+
+            elif action == _SHORT_RIGHT:
+                res = self.temp_gen.new_temp()
+                end = self.label_gen.new_label("SC_END_")
+                self.instructions.append(Move(temps.pop(), res))
+                jump = JumpIfFalse if node.op == 'and' else JumpIfTrue
+                self.instructions.append(jump(res, end))
+                stack.append((_SHORT_END, node, res, end))
+                stack.append((_VISIT, node.right))
+
+            elif action == _SHORT_END:
+                res, end = extra
+                self.instructions.append(Move(temps.pop(), res))
+                self.instructions.append(Label(end))
+                temps.append(res)
+
+            else:
+                tmp = self.temp_gen.new_temp()
+                if isinstance(node, BinOp):
+                    right = temps.pop()
+                    left  = temps.pop()
+                    ops = ARITH_OPS if node.op in ARITH_OPS else COMPARE_OPS
+                    self.instructions.append(ops[node.op](left, right, tmp))
+                elif node.op == 'not':
+                    self.instructions.append(Not(temps.pop(), tmp))
+                else:   # unary minus
+                    operand = temps.pop()
+                    self.instructions.append(LoadConst(0, tmp))
+                    neg = self.temp_gen.new_temp()
+                    self.instructions.append(Sub(tmp, operand, neg))
+                    tmp = neg
+                temps.append(tmp)
+        return temps.pop()
+
+
+def _chain(expr, op):
+    """Operands of a run of the same operator, left to right: (a and b) and c -> [a, b, c]."""
+    out, stack = [], [expr]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, BinOp) and node.op == op:
+            stack.append(node.right)
+            stack.append(node.left)
+        else:
+            out.append(node)
+    return out
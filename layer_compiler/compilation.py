@@ -0,0 +1,134 @@
+# compilation.py
+#
+# The whole pipeline for one source as a library object. Each phase's
+# result is a property computed on first use and then kept, so a front end
+# asks only for what it shows and nothing is done twice:
+#
+#   tokens        TokenBuffer (only built if asked for)
+#   ast           Program; parsed from `tokens` when they exist, otherwise
+#                 straight from the lexer's token stream
+#   symbols       global SymbolTable, after semantic analysis
+#   ir            IRGenerator output
+#   optimized_ir  after the PassManager
+#   fused_ir      after superinstruction fusion (-O2 and up)
+#   final_ir      after register allocation: what run() executes
+#
+# Reading a later property computes the earlier ones it needs. `phase` names
+# the phase being computed, so after an exception it says which one failed
+# (PHASE_ERRORS gives main.py's heading for it).
+
+from functools import cached_property
+
+from lexer     import Lexer
+from parser    import Parser
+from semantic  import SemanticAnalyzer
+from codegen   import IRGenerator
+from optim     import PassManager
+from peephole  import fuse_superinstructions
+from regalloc  import allocate_registers
+from vm        import VM
+from pybackend import PyProgram
+
+PHASE_ERRORS = {
+    'read': "Cannot open file", 'lex': "Lexical Error", 'parse': "Syntax Error",
+    'semantic': "Semantic Error", 'irgen': "IR Generation Error",
+    'optimize': "Optimization Error", 'superinstructions': "Optimization Error",
+    'regalloc': "Optimization Error", 'load': "VM Error", 'run': "VM Error",
+}
+
+# (timing name, property) for each compile phase after lexing, in order
+PHASES = [('parse', 'ast'), ('semantic', 'symbols'), ('irgen', 'ir'),
+          ('optimize', 'optimized_ir'), ('superinstructions', 'fused_ir'),
+          ('regalloc', 'final_ir')]
+
+
+class Compilation:
+    """
+    `source` is Layer source text or a Lexer (e.g. Lexer.from_path for a
+    streamed file). `passes` is a PassManager, or one is made for `level`.
+    `inputs` is passed on to IRGenerator (see batch.py).
+    """
+    def __init__(self, source, level=2, passes=None, inputs=()):
+        self.lexer  = source if isinstance(source, Lexer) else Lexer(source)
+        self.passes = passes or PassManager(level)
+        self.level  = self.passes.level
+        self.inputs = inputs
+        self.phase  = None
+        self.n_regs = None
+        self.closed_loops  = 0
+        self.unused_inputs = set()      # inputs IRGenerator never saw declared
+
+    @classmethod
+    def from_path(cls, path, **kwargs):
+        """Compilation of a file, lexed from a memory map."""
+        return cls(Lexer.from_path(path), **kwargs)
+
+    @cached_property
+    def tokens(self):
+        self.phase = 'lex'
+        return self.lexer.tokenize()
+
+    @cached_property
+    def ast(self):
+        self.phase = 'parse'
+        # share the token buffer if one was built, else lex as we parse
+        source = self.tokens if 'tokens' in self.__dict__ else self.lexer
+        return Parser(source).parse()
+
+    @cached_property
+    def symbols(self):
+        ast = self.ast
+        self.phase = 'semantic'
+        analyzer = SemanticAnalyzer(ast)
+        analyzer.analyze()
+        return analyzer.get_symbols()
+
+    @cached_property
+    def ir(self):
+        self.symbols                    # semantic errors stop compilation here
+        self.phase = 'irgen'
+        irgen = IRGenerator(closed_forms=self.level >= 2, inputs=self.inputs)
+        ir_list = irgen.generate(self.ast)
+        self.closed_loops = irgen.closed_loops
+        self.unused_inputs = irgen.inputs
+        return ir_list
+
+    @cached_property
+    def optimized_ir(self):
+        ir_list = self.ir
+        self.phase = 'optimize'
+        return self.passes.run(ir_list)
+
+    @cached_property
+    def fused_ir(self):
+        ir_list = self.optimized_ir
+        if self.level < 2:
+            return ir_list
+        self.phase = 'superinstructions'
+        return fuse_superinstructions(ir_list)
+
+    @cached_property
+    def final_ir(self):
+        ir_list = self.fused_ir
+        if not self.level:
+            return ir_list
+        self.phase = 'regalloc'
+        ir_list, self.n_regs = allocate_registers(ir_list)
+        return ir_list
+
+    def load(self, engine='vm', jit=True, sink=None, max_steps=None):
+        """A VM or PyProgram (engine 'pyc') for final_ir, not yet run. Its
+        output goes to `sink` (see sinks.py; default: buffered stdout);
+        max_steps limits the VM only."""
+        ir_list = self.final_ir
+        self.phase = 'load'
+        if engine == 'pyc':
+            return PyProgram(ir_list, sink=sink)
+        return VM(ir_list, jit=jit, sink=sink, max_steps=max_steps)
+
+    def run(self, engine='vm', jit=True, sink=None, max_steps=None):
+        """Compile as far as needed and run; returns the finished VM or PyProgram."""
+        program = self.load(engine, jit, sink, max_steps)
+        self.phase = 'run'
+        program.run()
+        return program
@@ -0,0 +1,132 @@
+# corpus.py
+#
+# Compile and run many .layer files at once: main.py switches to this when
+# given several files, a directory or a glob. Each file goes through
+# run_file() in a worker process of a ProcessPoolExecutor; nothing is
+# printed while it runs, its output is captured and every phase is timed.
+# A per-file timeout is enforced inside the worker with SIGALRM (where the
+# platform has it), so a runaway program costs one file, not the worker.
+# Results come back in file order, and summary() turns them into the JSON
+# document written by --summary.
+
+import glob
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from compilation import Compilation, PHASES, PHASE_ERRORS
+from sinks       import CaptureSink
+from vm          import VM
+
+EXTENSIONS = ('.layer', '.layerc')
+
+
+class FileTimeout(BaseException):
+    """Raised by the SIGALRM handler. Not an Exception, so that the
+    compiler's own `except Exception` fallbacks cannot swallow it."""
+
+
+def expand(paths):
+    """Files named by `paths` (files, directories searched recursively for
+    .layer/.layerc files, and globs), sorted and without duplicates."""
+    files = set()
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files.update(os.path.join(root, name) for name in names
+                             if name.endswith(EXTENSIONS))
+        elif any(c in path for c in '*?['):
+            files.update(p for p in glob.glob(path, recursive=True) if os.path.isfile(p))
+        else:
+            files.add(path)
+    return sorted(files)
+
+
+def run_file(path, level=2, engine='vm', jit=True, timeout=None, max_steps=None):
+    """
+    Compile and run one file without printing anything. Returns a dict:
+    file, status ('ok', 'error' or 'timeout'), phase and error (for
+    failures), output (everything the program printed) and timings_ms.
+    """
+    result  = {'file': path, 'status': 'ok', 'phase': None, 'error': None}
+    timings = {}
+    out     = CaptureSink()
+    phase   = 'read'
+
+    def timed(name, fn, *args):
+        nonlocal phase
+        phase = name
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            timings[name] = round((time.perf_counter() - start) * 1e3, 3)
+
+    alarm = timeout and hasattr(signal, 'setitimer')
+    running = True
+    if alarm:
+        def expired(signum, frame):
+            if running:
+                raise FileTimeout(f"timed out after {timeout:g}s")
+        previous = signal.signal(signal.SIGALRM, expired)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        if path.endswith('.layerc'):
+            program = timed('load', VM.load, path, jit, out, max_steps)
+        else:
+            with open(path, 'r') as f:
+                code = f.read()
+            comp = Compilation(code, level)
+            for name, prop in PHASES:
+                timed(name, getattr, comp, prop)
+            program = timed('load', comp.load, engine, jit, out, max_steps)
+        timed('run', program.run)
+        running = False
+    except FileTimeout as e:
+        result.update(status='timeout', phase=phase, error=str(e))
+    except Exception as e:
+        result.update(status='error', phase=phase, error=f"{PHASE_ERRORS[phase]}: {e}")
+    finally:
+        running = False
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    result['output']     = out.getvalue()
+    result['timings_ms'] = timings
+    return result
+
+
+def _run_file(job):
+    path, options = job
+    return run_file(path, **options)
+
+
+def run_corpus(files, jobs=None, **options):
+    """run_file() over `files` on `jobs` worker processes (default: one per
+    CPU); yields results in file order as they become available."""
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(files) < 2:
+        for path in files:
+            yield run_file(path, **options)
+        return
+    # a few chunks per worker: few round trips, but still balanced when
+    # some files are much slower than others
+    chunk = max(1, len(files) // (jobs * 8))
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        yield from pool.map(_run_file, [(path, options) for path in files], chunksize=chunk)
+
+
+def summary(results, jobs, wall_seconds, options):
+    """The --summary JSON document."""
+    counts = {'ok': 0, 'error': 0, 'timeout': 0}
+    for r in results:
+        counts[r['status']] += 1
+    return {
+        'files':        len(results),
+        'counts':       counts,
+        'jobs':         jobs,
+        'options':      options,
+        'wall_seconds': round(wall_seconds, 3),
+        'results':      results,
+    }
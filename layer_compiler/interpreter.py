@@ -1,18 +1,32 @@
 # interpreter.py
 
-from ast import (
+import operator
+from sinks import StdoutSink
+from layer_ast import (
     Program, VarDecl, Assignment,
     WriteStmt, LoopFor, LoopWhile,
-    IfStmt, Block, Expr
+    IfStmt, Block, Expr, Literal, Name, UnaryOp, BinOp
 )
 
+BINARY = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul,
+    '/': operator.truediv, '%': operator.mod, '^': operator.pow,
+    '<': operator.lt, '>': operator.gt, '<=': operator.le, '>=': operator.ge,
+    '==': operator.eq, '!=': operator.ne,
+}
+UNARY = {'-': operator.neg, 'not': operator.not_}
+
 class Interpreter:
-    def __init__(self, tree: Program):
+    def __init__(self, tree: Program, sink=None):
         self.tree = tree
         self.env  = {}   # name → value
+        self.sink = sink if sink is not None else StdoutSink()
 
     def run(self):
-        self._exec_block(self.tree.statements)
+        try:
+            self._exec_block(self.tree.statements)
+        finally:
+            self.sink.flush()
 
     def _exec_block(self, stmts):
         for stmt in stmts:
@@ -29,7 +43,7 @@ class Interpreter:
 
         elif isinstance(stmt, WriteStmt):
             vals = [self._eval_expr(arg) for arg in stmt.args]
-            print(*vals)
+            self.sink.write(" ".join(map(str, vals)) + "\n")
 
         elif isinstance(stmt, LoopFor):
             count = int(self._eval_expr(stmt.count))
@@ -49,9 +63,35 @@ class Interpreter:
             raise RuntimeError(f"Unhandled statement: {stmt}")
 
     def _eval_expr(self, expr: Expr):
-        s = expr.value.replace('true','True').replace('false','False')
-        s = s.replace('^','**')
+        # explicit stack, so deep expressions do not recurse; a (step, node)
+        # entry runs once the operands before it are on `vals`
+        vals, todo = [], [expr]
         try:
-            return eval(s, {}, self.env)
+            while todo:
+                node = todo.pop()
+                if isinstance(node, tuple):
+                    step, node = node
+                    if step == 'logic':
+                        # `and`/`or` short-circuit: the left value is the
+                        # result unless it leaves the right one to decide
+                        if bool(vals[-1]) == (node.op == 'and'):
+                            vals.pop()
+                            todo.append(node.right)
+                    elif isinstance(node, UnaryOp):
+                        vals.append(UNARY[node.op](vals.pop()))
+                    else:
+                        right = vals.pop()
+                        vals.append(BINARY[node.op](vals.pop(), right))
+                elif isinstance(node, Literal):
+                    vals.append(node.value)
+                elif isinstance(node, Name):
+                    vals.append(self.env[node.name])
+                elif isinstance(node, UnaryOp):
+                    todo += [('apply', node), node.operand]
+                elif node.op in ('and', 'or'):
+                    todo += [('logic', node), node.left]
+                else:
+                    todo += [('apply', node), node.right, node.left]
         except Exception as e:
-            raise RuntimeError(f"Error evaluating '{expr.value}': {e}")
+            raise RuntimeError(f"Error evaluating '{expr}': {e}")
+        return vals.pop()
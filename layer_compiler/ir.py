@@ -2,7 +2,9 @@
 
 class Instruction:
     """Base class for all IR instructions."""
-    pass
+    operands = ()           # names of the fields that read temps
+    outputs  = ('target',)  # names of the fields that write temps
+    target   = None         # temp written, if any
 
 class LoadConst(Instruction):
     def __init__(self, value, target):
@@ -18,43 +20,73 @@ class LoadVar(Instruction):
     def __repr__(self):
         return f"LOAD_VAR {self.name} -> {self.target}"
 
+class LoadInput(Instruction):
+    """A per-lane starting value of a variable; only in batch programs (batch.py)."""
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+    def __repr__(self):
+        return f"LOAD_INPUT {self.name} -> {self.target}"
+
 class Add(Instruction):
+    operands = ('left', 'right')
     def __init__(self, left, right, target):
         self.left = left; self.right = right; self.target = target
     def __repr__(self):
         return f"ADD {self.left}, {self.right} -> {self.target}"
 
 class Sub(Instruction):
+    operands = ('left', 'right')
     def __init__(self, left, right, target):
         self.left = left; self.right = right; self.target = target
     def __repr__(self):
         return f"SUB {self.left}, {self.right} -> {self.target}"
 
 class Mul(Instruction):
+    operands = ('left', 'right')
     def __init__(self, left, right, target):
         self.left = left; self.right = right; self.target = target
     def __repr__(self):
         return f"MUL {self.left}, {self.right} -> {self.target}"
 
 class Div(Instruction):
+    operands = ('left', 'right')
     def __init__(self, left, right, target):
         self.left = left; self.right = right; self.target = target
     def __repr__(self):
         return f"DIV {self.left}, {self.right} -> {self.target}"
 
+class Mod(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"MOD {self.left}, {self.right} -> {self.target}"
+
+class FloorDiv(Instruction):
+    """Integer division; only emitted for closed-form loops (see closedform.py)."""
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"FLOOR_DIV {self.left}, {self.right} -> {self.target}"
+
 class Pow(Instruction):
+    operands = ('base', 'exp')
     def __init__(self, base, exp, target):
         self.base = base; self.exp = exp; self.target = target
     def __repr__(self):
         return f"POW {self.base}, {self.exp} -> {self.target}"
 
 class StoreVar(Instruction):
+    operands = ('source',)
     def __init__(self, source, name):
         self.source = source; self.name = name
     def __repr__(self):
         return f"STORE_VAR {self.source} -> {self.name}"
 
 class CallWrite(Instruction):
+    operands = ('arg',)
     def __init__(self, arg):
         self.arg = arg
     def __repr__(self):
@@ -78,12 +110,144 @@ class Jump(Instruction):
         return f"JUMP {self.label}"
 
 class JumpIfFalse(Instruction):
+    operands = ('cond',)
     def __init__(self, cond, label):
         self.cond  = cond
         self.label = label
     def __repr__(self):
         return f"JUMP_IF_FALSE {self.cond} -> {self.label}"
 
+class JumpIfTrue(Instruction):
+    operands = ('cond',)
+    def __init__(self, cond, label):
+        self.cond  = cond
+        self.label = label
+    def __repr__(self):
+        return f"JUMP_IF_TRUE {self.cond} -> {self.label}"
+
+class CompareAndBranch(Instruction):
+    """Fused compare + JUMP_IF_FALSE: jump to label unless `left op right`."""
+    operands = ('left', 'right')
+    def __init__(self, op, left, right, label):
+        self.op = op; self.left = left; self.right = right; self.label = label
+    def __repr__(self):
+        return f"COMPARE_AND_BRANCH {self.left} {self.op} {self.right} else -> {self.label}"
+
+# ---- comparisons and boolean logic ----------------------------------------------
+
+class Lt(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"LT {self.left}, {self.right} -> {self.target}"
+
+class Gt(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"GT {self.left}, {self.right} -> {self.target}"
+
+class Le(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"LE {self.left}, {self.right} -> {self.target}"
+
+class Ge(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"GE {self.left}, {self.right} -> {self.target}"
+
+class Eq(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"EQ {self.left}, {self.right} -> {self.target}"
+
+class Ne(Instruction):
+    operands = ('left', 'right')
+    def __init__(self, left, right, target):
+        self.left = left; self.right = right; self.target = target
+    def __repr__(self):
+        return f"NE {self.left}, {self.right} -> {self.target}"
+
+class Not(Instruction):
+    operands = ('source',)
+    def __init__(self, source, target):
+        self.source = source; self.target = target
+    def __repr__(self):
+        return f"NOT {self.source} -> {self.target}"
+
+class Move(Instruction):
+    """Copy a temp; used where short-circuit and/or merge two values."""
+    operands = ('source',)
+    def __init__(self, source, target):
+        self.source = source; self.target = target
+    def __repr__(self):
+        return f"MOVE {self.source} -> {self.target}"
+
+class IsInt(Instruction):
+    """True if the temp holds an int (not a bool or float): closed-form guards."""
+    operands = ('source',)
+    def __init__(self, source, target):
+        self.source = source; self.target = target
+    def __repr__(self):
+        return f"IS_INT {self.source} -> {self.target}"
+
+# ---- superinstructions (see peephole.py) ---------------------------------------
+
+class IncVar(Instruction):
+    """name = name + value, without going through temps."""
+    def __init__(self, name, value):
+        self.name = name; self.value = value
+    def __repr__(self):
+        return f"INC_VAR {self.name} += {self.value!r}"
+
+class DecVar(Instruction):
+    """name = name - value, without going through temps."""
+    def __init__(self, name, value):
+        self.name = name; self.value = value
+    def __repr__(self):
+        return f"DEC_VAR {self.name} -= {self.value!r}"
+
+class AddVarImm(Instruction):
+    def __init__(self, name, value, target):
+        self.name = name; self.value = value; self.target = target
+    def __repr__(self):
+        return f"ADD_VAR_IMM {self.name} + {self.value!r} -> {self.target}"
+
+class StoreConst(Instruction):
+    def __init__(self, value, name):
+        self.value = value; self.name = name
+    def __repr__(self):
+        return f"STORE_CONST {self.value!r} -> {self.name}"
+
+class LoadVarPair(Instruction):
+    """Two LOAD_VARs in one instruction."""
+    outputs = ('target', 'target2')
+    def __init__(self, name, target, name2, target2):
+        self.name = name; self.target = target
+        self.name2 = name2; self.target2 = target2
+    def __repr__(self):
+        return f"LOAD_VAR_PAIR {self.name} -> {self.target}, {self.name2} -> {self.target2}"
+
+COMPARE_OPS = {'<': Lt, '>': Gt, '<=': Le, '>=': Ge, '==': Eq, '!=': Ne}
+NEGATED     = {'<': '>=', '>': '<=', '<=': '>', '>=': '<', '==': '!=', '!=': '=='}
+
+def uses(instr):
+    """Temps read by an instruction."""
+    return [getattr(instr, f) for f in instr.operands]
+
+def defs(instr):
+    """Temps written by an instruction."""
+    return [t for t in (getattr(instr, f) for f in instr.outputs) if t]
+
 class TempGenerator:
     """Generates fresh temporary names (_t0, _t1, ...)."""
     def __init__(self):
@@ -0,0 +1,340 @@
+# jit.py
+#
+# Tracing JIT for the VM's hot loops.
+#
+# VM.run counts how often each backward JUMP is taken, per target. When a
+# loop header reaches HOT_LOOP, the next iteration is run here one handler
+# call at a time while the executed instructions are recorded: a linear
+# trace from the header back to it, following whichever way each branch
+# went. The trace is turned into a Python function that keeps registers and
+# variables in locals and loops over the trace:
+#
+#   * each branch becomes a guard; going the other way is a side exit that
+#     writes the locals back and returns the pc the interpreter resumes at
+#   * a side exit taken HOT_EXIT times gets a bridge: the path from it back
+#     to the header is recorded the same way and compiled into the function
+#     under the guard, so a branch that flips every few iterations (an `if`
+#     in the loop body) stays in compiled code
+#   * arithmetic and comparison operands must have been int or float while
+#     recording. Values that flow into the trace are guarded on those exact
+#     types: once on entry if the trace never writes them, at the top of
+#     every iteration otherwise. With both operand types known to be int,
+#     `not (a < b)` is emitted as `a >= b`
+#
+# Recording is abandoned (and the loop left to the interpreter) when it
+# meets another loop's back edge, leaves the loop, grows past MAX_TRACE or
+# sees a non-numeric operand; a loop that aborts MAX_ABORTS times is never
+# recorded again. A trace whose entry guards keep failing is dropped and
+# recorded afresh. Every call returns the number of VM instructions the
+# trace stood for, so VM.steps is the same with or without the JIT.
+
+from bytecode import OP
+
+HOT_LOOP         = 500      # back edges taken before a loop is traced
+HOT_EXIT         = 50       # side exits taken before a bridge is recorded
+MAX_TRACE        = 500      # instructions per trace or bridge
+MAX_BRIDGES      = 16       # per loop
+MAX_ABORTS       = 3
+MAX_GUARD_FAILS  = 8        # consecutive failed entries before re-recording
+INDENT           = '    '
+
+BINARY = {'ADD': '+', 'SUB': '-', 'MUL': '*', 'DIV': '/', 'MOD': '%', 'POW': '**', 'FLOOR_DIV': '//',
+          'LT': '<', 'GT': '>', 'LE': '<=', 'GE': '>=', 'EQ': '==', 'NE': '!='}
+COMPARE_BRANCH = {'JUMP_IF_NOT_LT': '<', 'JUMP_IF_NOT_GT': '>', 'JUMP_IF_NOT_LE': '<=',
+                  'JUMP_IF_NOT_GE': '>=', 'JUMP_IF_NOT_EQ': '==', 'JUMP_IF_NOT_NE': '!='}
+# negation of a comparison between two ints
+FLIP = {'<': '>=', '>': '<=', '<=': '>', '>=': '<', '==': '!=', '!=': '=='}
+
+NAMES     = {code: name for name, code in OP.items()}
+IMMEDIATE = {OP['INC_VAR'], OP['DEC_VAR'], OP['ADD_VAR_IMM']}     # const in b
+NUMERIC   = {OP[name] for name in list(BINARY) + list(COMPARE_BRANCH)} | IMMEDIATE
+NUMBER_TYPES = (int, float)
+
+def operands(op, a, b, c):
+    """(reads, writes) of an instruction as ('r', register) / ('v', variable) pairs."""
+    name = NAMES[op]
+    if name in BINARY:
+        return [('r', a), ('r', b)], [('r', c)]
+    if name in COMPARE_BRANCH:
+        return [('r', a), ('r', b)], []
+    if name == 'LOAD_VAR':
+        return [('v', a)], [('r', b)]
+    if name == 'STORE_VAR':
+        return [('r', a)], [('v', b)]
+    if name in ('NOT', 'MOVE', 'IS_INT'):
+        return [('r', a)], [('r', b)]
+    if name in ('CALL_WRITE', 'JUMP_IF_FALSE', 'JUMP_IF_TRUE'):
+        return [('r', a)], []
+    if name == 'LOAD_CONST':
+        return [], [('r', b)]
+    if name in ('INC_VAR', 'DEC_VAR'):
+        return [('v', a)], [('v', a)]
+    if name == 'ADD_VAR_IMM':
+        return [('v', a)], [('r', c)]
+    if name == 'STORE_CONST':
+        return [], [('v', b)]
+    if name == 'LOAD_VAR_PAIR':
+        return [('v', a), ('v', b)], [('r', c & 0xFFFF), ('r', c >> 16)]
+    return [], []
+
+
+class TraceAbort(Exception):
+    """The recorded path cannot be compiled as part of a loop trace."""
+
+
+class TraceJIT:
+    """
+    Trace recorder and cache for one VM. `counters[pc]` is bumped by
+    VM.run for every backward jump to pc; enter() is called once it
+    reaches HOT_LOOP and returns (pc to resume at, instructions executed).
+    A trace hands back to the VM at the top of an iteration once it has
+    run more than `limit` instructions, so the VM's step budget and
+    resume() slices hold inside traces.
+    """
+    def __init__(self, vm):
+        self.vm       = vm
+        self.counters = [0] * len(vm.code)
+        self.traces   = {}          # header pc -> Trace
+        self.aborts   = {}          # header pc -> aborted recordings
+        self.handlers = None        # built on the first recording
+        self.compiled = 0           # traces and bridges compiled so far
+
+    def enter(self, header, latch, limit):
+        trace = self.traces.get(header)
+        if trace is None:
+            return self.start(header, latch)
+        pc, steps, guard = trace.fn(self.vm.regs, self.vm.vars, limit)
+        if guard is None:
+            # type guard: on entry (steps == 0) or at the top of an iteration
+            if steps:
+                trace.fails = 0
+            else:
+                trace.fails += 1
+                if trace.fails > MAX_GUARD_FAILS:
+                    del self.traces[header]
+                    self.counters[header] = 0
+            return pc, steps
+        trace.fails = 0
+        trace.exits[guard] += 1
+        if trace.exits[guard] == HOT_EXIT and len(trace.bridges) < MAX_BRIDGES:
+            try:
+                path, pc, n = self.record(pc, header, latch)
+            except TraceAbort as abort:
+                return abort.args[1], steps + abort.args[2]
+            try:
+                trace.attach(guard, path)
+                self.compiled += 1
+            except TraceAbort:
+                pass
+            return pc, steps + n
+        return pc, steps
+
+    def start(self, header, latch):
+        try:
+            path, pc, n = self.record(header, header, latch)
+        except TraceAbort as abort:
+            self.aborts[header] = count = self.aborts.get(header, 0) + 1
+            # never again, or only after another HOT_LOOP back edges
+            self.counters[header] = -(1 << 62) if count >= MAX_ABORTS else 0
+            return abort.args[1], abort.args[2]
+        self.traces[header] = Trace(header, path, self.vm.consts, self.vm.sink.write,
+                                    self.vm.max_steps is not None or self.vm.sliced)
+        self.compiled += 1
+        return pc, n
+
+    def record(self, pc, header, latch):
+        """
+        Execute from `pc` through the handlers until control is back at
+        `header`: (path, header, instructions executed). TraceAbort carries
+        (reason, pc to resume at, instructions executed).
+        """
+        if self.handlers is None:
+            self.handlers = self.vm._handlers()
+        code, handlers = self.vm.code, self.handlers
+        regs, env      = self.vm.regs, self.vm.vars
+        path           = []
+        while True:
+            op, a, b, c = code[pc]
+            reads, _ = operands(op, a, b, c)
+            types = [type(regs[i] if kind == 'r' else env[i]) for kind, i in reads]
+            if op in NUMERIC:
+                if op in IMMEDIATE:
+                    types.append(type(self.vm.consts[b]))
+                if not all(t in NUMBER_TYPES for t in types):
+                    raise TraceAbort(f"non-numeric operand at {pc}", pc, len(path))
+            target = handlers[op](a, b, c)
+            path.append((pc, op, a, b, c, target, types))
+            backward = target is not None and target <= pc
+            pc = target if target is not None else pc + 1
+            if pc == header:
+                return path, pc, len(path)
+            if backward:
+                raise TraceAbort(f"inner loop at {pc}", pc, len(path))
+            if not header <= pc <= latch:
+                raise TraceAbort(f"left the loop at {pc}", pc, len(path))
+            if len(path) >= MAX_TRACE:
+                raise TraceAbort("trace too long", pc, len(path))
+
+
+class Node:
+    """A recorded path and the bridges hanging off its guards (by path index)."""
+    def __init__(self, path):
+        self.path    = path
+        self.bridges = {}
+
+
+class Trace:
+    """
+    A loop's trace tree compiled to `fn(regs, env, limit) -> (pc, steps, guard)`;
+    `guard` numbers the side exit taken, or is None when a type guard failed.
+    """
+    def __init__(self, header, path, consts, write, limited=False):
+        self.header  = header
+        self.root    = Node(path)
+        self.consts  = consts
+        self.write   = write
+        self.limited = limited          # check `limit` every iteration
+        self.bridges = []
+        self.fails   = 0
+        self.compile()
+
+    def attach(self, guard, path):
+        node, k = self.guards[guard]
+        node.bridges[k] = Node(path)
+        guards = self.guards
+        try:
+            self.compile()
+        except TraceAbort:
+            # a slot read with another type than on the rest of the tree
+            del node.bridges[k]
+            self.guards = guards
+            raise
+        self.bridges.append(path)
+
+    def compile(self):
+        self.guards = []            # side exit number -> (node, path index)
+        self.source = self.emit()
+        self.exits  = [0] * len(self.guards)
+        namespace = {}
+        exec(compile(self.source, f'<trace@{self.header}>', 'exec'), namespace)
+        self.fn = namespace['trace']
+        self.fn.__defaults__ = (self.write, self.consts)
+
+    def scan(self, node, seen, first, written, used_consts):
+        """Collect the type each slot is first read with (before any write
+        on that path), every slot written and the constants used."""
+        seen = set(seen)
+        for k, (pc, op, a, b, c, target, types) in enumerate(node.path):
+            reads, writes = operands(op, a, b, c)
+            for slot, t in zip(reads, types):
+                if slot not in seen:
+                    if first.setdefault(slot, t) is not t:
+                        raise TraceAbort(f"{slot} seen as {first[slot]} and {t}")
+            seen.update(writes)
+            written.update(writes)
+            if op in IMMEDIATE:
+                used_consts.add(b)
+            elif NAMES[op] in ('LOAD_CONST', 'STORE_CONST'):
+                used_consts.add(a)
+            if k in node.bridges:
+                self.scan(node.bridges[k], seen, first, written, used_consts)
+
+    def emit(self):
+        first, written, used_consts = {}, set(), set()
+        self.scan(self.root, (), first, written, used_consts)
+
+        local = lambda slot: f"{slot[0]}{slot[1]}"
+        home  = lambda slot: f"{'regs' if slot[0] == 'r' else 'env'}[{slot[1]}]"
+        guard = lambda slots: " or ".join(f"type({local(s)}) is not {first[s].__name__}"
+                                          for s in sorted(slots))
+        typed   = {s for s, t in first.items() if t in NUMBER_TYPES}
+        variant = typed & written       # re-checked every iteration
+        store   = "; ".join(f"{home(s)} = {local(s)}" for s in sorted(written)) or "pass"
+
+        lines = ["def trace(regs, env, limit, _write, K):"]
+        lines += [f"{INDENT}{local(s)} = {home(s)}" for s in sorted(set(first) | written)]
+        lines += [f"{INDENT}k{i} = K[{i}]" for i in sorted(used_consts)]
+        if typed - variant:
+            lines.append(f"{INDENT}if {guard(typed - variant)}: return {self.header}, 0, None")
+        lines.append(f"{INDENT}n = 0")
+        lines.append(f"{INDENT}try:")
+        lines.append(f"{INDENT * 2}while True:")
+        if self.limited:
+            # back to the VM, which pauses or raises once its budget is used up
+            lines.append(f"{INDENT * 3}if n > limit: return {self.header}, n, None")
+        if variant:
+            lines.append(f"{INDENT * 3}if {guard(variant)}: return {self.header}, n, None")
+        self.body(self.root, 3, 0, lines)
+        lines.append(f"{INDENT}finally:")
+        lines.append(f"{INDENT * 2}{store}")
+        return "\n".join(lines) + "\n"
+
+    def body(self, node, depth, base, lines):
+        """Lines for `node`'s path, `base` instructions into the iteration."""
+        pad = INDENT * depth
+        for k, (pc, op, a, b, c, target, types) in enumerate(node.path):
+            name = NAMES[op]
+            if name in COMPARE_BRANCH or name in ('JUMP_IF_FALSE', 'JUMP_IF_TRUE'):
+                cond, resume = self.branch(name, a, b, c, target, pc, types)
+                if k in node.bridges:
+                    lines.append(f"{pad}if {cond}:")
+                    self.body(node.bridges[k], depth + 1, base + k + 1, lines)
+                else:
+                    lines.append(f"{pad}if {cond}: return {resume}, n + {base + k + 1}, "
+                                 f"{len(self.guards)}")
+                    self.guards.append((node, k))
+            else:
+                lines += [pad + line for line in self.statement(name, a, b, c)]
+        lines.append(f"{pad}n += {base + len(node.path)}")
+        if node is not self.root:
+            lines.append(f"{pad}continue")
+
+    @staticmethod
+    def branch(name, a, b, c, target, pc, types):
+        """(condition under which the branch goes the other way than
+        recorded, pc it then goes to)."""
+        jumped = target is not None
+        if name in ('JUMP_IF_FALSE', 'JUMP_IF_TRUE'):
+            if_true = (name == 'JUMP_IF_TRUE') != jumped
+            return (f"r{a}" if if_true else f"not r{a}"), (pc + 1 if jumped else b)
+        cmp = COMPARE_BRANCH[name]
+        if jumped:          # recorded `not (a cmp b)`: leave when it holds
+            return f"r{a} {cmp} r{b}", pc + 1
+        if types == [int, int]:
+            return f"r{a} {FLIP[cmp]} r{b}", c
+        return f"not (r{a} {cmp} r{b})", c
+
+    @staticmethod
+    def statement(name, a, b, c):
+        """Python lines for one traced non-branch instruction."""
+        if name == 'LOAD_CONST':
+            return [f"r{b} = k{a}"]
+        if name == 'LOAD_VAR':
+            return [f"r{b} = v{a}"]
+        if name == 'STORE_VAR':
+            return [f"v{b} = r{a}"]
+        if name in BINARY:
+            return [f"r{c} = r{a} {BINARY[name]} r{b}"]
+        if name == 'NOT':
+            return [f"r{b} = not r{a}"]
+        if name == 'MOVE':
+            return [f"r{b} = r{a}"]
+        if name == 'IS_INT':
+            return [f"r{b} = type(r{a}) is int"]
+        if name == 'CALL_WRITE':
+            return [f"_write(f'{{r{a}}} ')"]
+        if name == 'PRINT_NEWLINE':
+            return ["_write('\\n')"]
+        if name == 'INC_VAR':
+            return [f"v{a} = v{a} + k{b}"]
+        if name == 'DEC_VAR':
+            return [f"v{a} = v{a} - k{b}"]
+        if name == 'ADD_VAR_IMM':
+            return [f"r{c} = v{a} + k{b}"]
+        if name == 'STORE_CONST':
+            return [f"v{b} = k{a}"]
+        if name == 'LOAD_VAR_PAIR':
+            return [f"r{c & 0xFFFF} = v{a}", f"r{c >> 16} = v{b}"]
+        if name in ('JUMP', 'NOP'):
+            return []
+        raise NotImplementedError(f"No trace translation for {name}")
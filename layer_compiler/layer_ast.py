@@ -1,5 +1,7 @@
 # ast.py
 
+from rules import BINARY_PRECEDENCE, RIGHT_ASSOC, UNARY_PRECEDENCE
+
 class Node:
     pass
 
@@ -17,7 +19,7 @@ class VarDecl(Node):
         self.expr = expr      # Expr or None
 
     def __repr__(self):
-        return f"VarDecl({self.kind}, {self.name}, {self.expr})"
+        return f"VarDecl({self.kind}, {self.name}, {self.expr!r})"
 
 class Assignment(Node):
     def __init__(self, name, expr):
@@ -25,7 +27,7 @@ class Assignment(Node):
         self.expr = expr      # Expr
 
     def __repr__(self):
-        return f"Assign({self.name}, {self.expr})"
+        return f"Assign({self.name}, {self.expr!r})"
 
 class WriteStmt(Node):
     def __init__(self, args, is_fwrite=False):
@@ -43,7 +45,7 @@ class LoopFor(Node):
         self.block = block          # Block
 
     def __repr__(self):
-        return f"LoopFor({self.var}, {self.count}, {self.block})"
+        return f"LoopFor({self.var}, {self.count!r}, {self.block})"
 
 class LoopWhile(Node):
     def __init__(self, condition, block):
@@ -51,7 +53,7 @@ class LoopWhile(Node):
         self.block     = block      # Block
 
     def __repr__(self):
-        return f"LoopWhile({self.condition}, {self.block})"
+        return f"LoopWhile({self.condition!r}, {self.block})"
 
 class IfStmt(Node):
     def __init__(self, condition, block):
@@ -59,7 +61,7 @@ class IfStmt(Node):
         self.block     = block      # Block
 
     def __repr__(self):
-        return f"If({self.condition}, {self.block})"
+        return f"If({self.condition!r}, {self.block})"
 
 class Block(Node):
     def __init__(self, statements):
@@ -68,12 +70,108 @@ class Block(Node):
     def __repr__(self):
         return f"Block({self.statements})"
 
+# ---- Expressions -----------------------------------------------------------
+#
+# Expression trees can be arbitrarily deep (a 10,000-term sum is a
+# 10,000-level left spine), so nothing below recurses: printing and the
+# compiler phases walk them with an explicit stack.
+
 class Expr(Node):
-    def __init__(self, value):
-        self.value = value          # string of the raw expression
+    """Base class for expression nodes."""
+    precedence = float('inf')
+
+    def children(self):
+        return ()
 
     def __repr__(self):
-        return f"Expr({self.value})"     
-    
-    
-                    
\ No newline at end of file
+        return ''.join(_render(self, 'repr'))
+
+    def __str__(self):
+        return ''.join(_render(self, 'str'))
+
+class Literal(Expr):
+    def __init__(self, value):
+        self.value = value          # int, float, str or bool
+
+    def _parts(self, mode):
+        if mode == 'repr':
+            return [f"Literal({self.value!r})"]
+        if isinstance(self.value, bool):
+            return ['true' if self.value else 'false']
+        if isinstance(self.value, str):
+            return [f'"{self.value}"']
+        return [str(self.value)]
+
+class Name(Expr):
+    def __init__(self, name):
+        self.name = name            # variable name
+
+    def _parts(self, mode):
+        return [f"Name({self.name})" if mode == 'repr' else self.name]
+
+class UnaryOp(Expr):
+    def __init__(self, op, operand):
+        self.op      = op           # 'not' or '-'
+        self.operand = operand      # Expr
+
+    @property
+    def precedence(self):
+        return UNARY_PRECEDENCE[self.op]
+
+    def children(self):
+        return (self.operand,)
+
+    def _parts(self, mode):
+        if mode == 'repr':
+            return [f"UnaryOp({self.op}, ", self.operand, ")"]
+        sep = ' ' if self.op == 'not' else ''
+        return [self.op + sep] + _wrap(self.operand, self.operand.precedence < self.precedence)
+
+class BinOp(Expr):
+    def __init__(self, op, left, right):
+        self.op    = op             # operator symbol, e.g. '+', '<=', 'and'
+        self.left  = left           # Expr
+        self.right = right          # Expr
+
+    @property
+    def precedence(self):
+        return BINARY_PRECEDENCE[self.op]
+
+    def children(self):
+        return (self.left, self.right)
+
+    def _parts(self, mode):
+        if mode == 'repr':
+            return [f"BinOp({self.op}, ", self.left, ", ", self.right, ")"]
+        prec  = self.precedence
+        right = self.op in RIGHT_ASSOC
+        lp, rp = self.left.precedence, self.right.precedence
+        return (_wrap(self.left, lp < prec or (right and lp == prec))
+                + [f" {self.op} "]
+                + _wrap(self.right, rp < prec or (not right and rp == prec)))
+
+def _wrap(node, parens):
+    return ['(', node, ')'] if parens else [node]
+
+def _render(node, mode):
+    out, stack = [], [node]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Expr):
+            stack.extend(reversed(item._parts(mode)))
+        else:
+            out.append(item)
+    return out
+
+def postorder(expr):
+    """Yield the nodes of an expression tree children-first."""
+    stack = [(expr, False)]
+    while stack:
+        node, expanded = stack.pop()
+        kids = node.children()
+        if expanded or not kids:
+            yield node
+            continue
+        stack.append((node, True))
+        for child in reversed(kids):
+            stack.append((child, False))
@@ -1,51 +1,136 @@
 # lexer.py
 
+import mmap
+import os
 import re
-from token_defs import Token
+from token_defs import Token, TokenBuffer
 from rules import TOKEN_REGEX
 
+# All rules folded into one alternation of named groups. Alternatives are
+# tried left to right, so the first rule that matches wins, exactly as when
+# the rules were tried one by one. Compiled once per process.
+MASTER_REGEX = re.compile(
+    '|'.join(f'(?P<{tok_type}>{pattern})' for tok_type, pattern in TOKEN_REGEX)
+)
+# Same rules over raw bytes, used to scan memory-mapped files in place.
+MASTER_REGEX_BYTES = re.compile(MASTER_REGEX.pattern.encode('utf-8'))
+
+BYTES_LIKE = (bytes, bytearray, memoryview, mmap.mmap)
+
 class Lexer:
-    def __init__(self, source: str):
+    """
+    Turns Layer source into tokens.
+
+    `source` may be a str, a bytes-like object (e.g. an mmap), or a text
+    stream. `tokenize()` returns the whole token stream as a compact
+    TokenBuffer; `stream()` yields the same tokens lazily as Token objects,
+    so only one token needs to be alive at a time.
+    """
+    def __init__(self, source):
         self.source       = source
+        self.path         = None
         self.pos          = 0
         self.line         = 1
         self.col          = 0
-        self.tokens       = []
+        self.tokens       = None
         self.indent_stack = [0]
 
+    @classmethod
+    def from_path(cls, path):
+        """Lexer that streams a file through a read-only memory map."""
+        lexer = cls(None)
+        lexer.path = path
+        return lexer
+
     def tokenize(self):
-        while self.pos < len(self.source):
-            match = None
-            for tok_type, pattern in TOKEN_REGEX:
-                regex = re.compile(pattern)
-                match = regex.match(self.source, self.pos)
-                if not match:
-                    continue
-                text = match.group(0)
-                self.pos += len(text)
-
-                if tok_type == 'WHITESPACE':
-                    self.col += len(text)
-                elif tok_type == 'COMMENT':
-                    # skip comment
-                    pass
-                elif tok_type == 'NEWLINE':
-                    self.tokens.append(Token('NEWLINE', '\\n', self.line, self.col))
-                    self.line += 1
-                    self.col   = 0
-                elif tok_type == 'INDENT':
-                    self.tokens.append(Token('INDENT', text, self.line, self.col))
-                    self.col += len(text)
-                else:
-                    self.tokens.append(Token(tok_type, text, self.line, self.col))
-                    self.col += len(text)
-                break
+        # The buffer slices token values out of the source on demand, so it
+        # needs the whole source in memory.
+        if self.path is not None:
+            with open(self.path, 'rb') as f:
+                self.source, self.path = f.read(), None
+        elif not isinstance(self.source, (str,) + BYTES_LIKE):
+            self.source = ''.join(self.source)
+
+        source = self.source
+        regex  = MASTER_REGEX if isinstance(source, str) else MASTER_REGEX_BYTES
+        self.tokens = TokenBuffer(source)
+        append = self.tokens.append
+        for tok_type, start, end, line, col in self._scan(source, regex):
+            append(tok_type, start, end, line, col)
+        append('EOF', self.pos, self.pos, self.line, self.col)
+        return self.tokens
 
+    def stream(self):
+        source = self.source
+        if self.path is not None:
+            yield from self._scan_file(self.path)
+        elif isinstance(source, str):
+            yield from self._tokens(source, MASTER_REGEX)
+        elif isinstance(source, BYTES_LIKE):
+            yield from self._tokens(source, MASTER_REGEX_BYTES)
+        else:
+            # text stream: no token spans a line break except NEWLINE itself,
+            # so scanning line by line yields the same tokens
+            for text in source:
+                yield from self._tokens(text, MASTER_REGEX)
+        yield Token('EOF', '', self.line, self.col)
+
+    def _scan_file(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                yield from self._tokens(buf, MASTER_REGEX_BYTES)
+
+    def _tokens(self, text, regex):
+        binary = regex is MASTER_REGEX_BYTES
+        for tok_type, start, end, line, col in self._scan(text, regex):
+            if tok_type == 'NEWLINE':
+                value = '\\n'
+            elif binary:
+                value = str(text[start:end], 'utf-8')
+            else:
+                value = text[start:end]
+            yield Token(tok_type, value, line, col)
+
+    def _scan(self, text, regex):
+        """
+        Yield (type, start, end, line, col) for every kept token in `text`.
+        Columns count characters for str input and bytes for bytes input.
+        """
+        end      = len(text)
+        match_at = regex.match
+        base     = self.pos
+        pos, line, col = 0, self.line, self.col
+
+        while pos < end:
+            match = match_at(text, pos)
             if not match:
+                self.pos = base + pos
+                self.line, self.col = line, col
+                bad = text[pos:pos + 1]
+                if regex is MASTER_REGEX_BYTES:
+                    bad = str(bad, 'utf-8', 'replace')
                 raise SyntaxError(
-                    f"Unexpected character {self.source[self.pos]!r} at "
-                    f"line {self.line}, col {self.col}"
+                    f"Unexpected character {bad!r} at "
+                    f"line {line}, col {col}"
                 )
+            tok_type = match.lastgroup
+            nxt      = match.end()
 
-        self.tokens.append(Token('EOF', '', self.line, self.col))
-        return self.tokens
+            if tok_type == 'WHITESPACE':
+                col += nxt - pos
+            elif tok_type == 'COMMENT':
+                # skip comment
+                pass
+            elif tok_type == 'NEWLINE':
+                yield tok_type, pos, nxt, line, col
+                line += 1
+                col   = 0
+            else:
+                yield tok_type, pos, nxt, line, col
+                col += nxt - pos
+            pos = nxt
+
+        self.pos = base + pos
+        self.line, self.col = line, col
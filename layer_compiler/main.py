@@ -6,25 +6,147 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 import argparse
+import json
+import time
 from lexer       import Lexer
-from parser      import Parser
-from semantic    import SemanticAnalyzer
-from codegen     import IRGenerator
-from optim       import eliminate_dead_code
+from optim       import PassManager, OPT_LEVELS
+from compilation import Compilation, PHASE_ERRORS
 from vm          import VM
+from pybackend   import PyProgram
+from sinks       import StdoutSink, FileSink
+from cache       import CompileCache, DEFAULT_MAX_BYTES
+from bytecode    import assemble
+from corpus      import expand, run_corpus, summary
+
+def pipeline_settings(passes):
+    """Part of every cache key: every compiler setting that shapes the
+    program that is run."""
+    return dict(passes.settings(),
+                closed_forms=passes.level >= 2,
+                superinstructions=passes.level >= 2,
+                regalloc='linear-scan' if passes.level else None)
 
 def main():
     argp = argparse.ArgumentParser(
         description="Layer compiler: shows each phase and executes Layer code"
     )
     argp.add_argument(
-        'file', nargs='?',
-        help="Path to a .layer file (omit to read from stdin)"
+        'file', nargs='*',
+        help="Path to a .layer file, or a precompiled .layerc file to run "
+             "directly (omit to read from stdin). Several files, directories "
+             "or globs compile and run them all in parallel, printing one "
+             "status line per file"
+    )
+    argp.add_argument(
+        '--stream', action='store_true',
+        help="Lex lazily from a memory-mapped file (or stdin) without "
+             "loading the whole source; skips the token listing"
+    )
+    argp.add_argument(
+        '--cache', action='store_true',
+        help="Reuse optimized IR from the on-disk compile cache when the "
+             "source is unchanged (skips straight to execution on a hit)"
+    )
+    argp.add_argument(
+        '--cache-dir', metavar='DIR',
+        help="Compile cache directory (implies --cache; default "
+             "$LAYER_CACHE_DIR or ~/.cache/layer-compiler)"
+    )
+    argp.add_argument(
+        '--cache-size', type=float, metavar='MB',
+        default=DEFAULT_MAX_BYTES / (1024 * 1024),
+        help="Compile cache size cap in MB; least recently used entries "
+             "are evicted past it (default: %(default)g)"
+    )
+    argp.add_argument(
+        '--cache-stats', action='store_true',
+        help="Print compile cache hit/miss statistics after the run"
+    )
+    argp.add_argument(
+        '--emit-bytecode', metavar='OUT.layerc',
+        help="Also write the optimized program as binary bytecode"
+    )
+    argp.add_argument(
+        '-O', dest='opt_level', type=int, choices=sorted(OPT_LEVELS), default=2,
+        help="Optimisation level: 0 none, 1 dead-code elimination, 2 one round "
+             "of constant propagation, value numbering, loop-invariant code "
+             "motion and DCE, 3 the same repeated to a fixed point "
+             "(default: %(default)s)"
+    )
+    argp.add_argument(
+        '--engine', choices=['vm', 'pyc'], default='vm',
+        help="Run on the bytecode VM, or translate the optimized IR to Python "
+             "source and run it as native CPython bytecode (pyc). .layerc "
+             "files always run on the VM (default: %(default)s)"
+    )
+    argp.add_argument(
+        '--no-jit', dest='jit', action='store_false',
+        help="Keep the VM from tracing hot loops and compiling them to Python"
+    )
+    argp.add_argument(
+        '-q', '--quiet', action='store_true',
+        help="Only run the program: print its output (and errors) but none "
+             "of the token, AST and IR listings"
+    )
+    argp.add_argument(
+        '-o', '--output', metavar='FILE',
+        help="Write the program's output to FILE instead of stdout"
+    )
+    argp.add_argument(
+        '--max-steps', type=int, metavar='N',
+        help="Stop the VM with an error after N instructions (not with "
+             "--engine=pyc, which does not count them)"
+    )
+    argp.add_argument(
+        '--verify-ir', action='store_true',
+        help="Check the IR after every optimisation pass (for debugging passes)"
+    )
+    argp.add_argument(
+        '-j', '--jobs', type=int, metavar='N',
+        help="Worker processes for several files (default: one per CPU)"
+    )
+    argp.add_argument(
+        '--timeout', type=float, metavar='SEC',
+        help="With several files, stop any file that takes longer than this"
+    )
+    argp.add_argument(
+        '--summary', metavar='OUT.json',
+        help="With several files, write per-file status, output and phase "
+             "timings as JSON ('-' for stdout)"
     )
     args = argp.parse_args()
+    if args.max_steps is not None and args.engine == 'pyc':
+        argp.error("--max-steps needs the VM; --engine=pyc cannot count instructions")
+    passes = PassManager(args.opt_level, verify=args.verify_ir)
+
+    # Several files: compile and run them all on a process pool
+    if (len(args.file) > 1 or args.jobs or args.summary
+            or any(os.path.isdir(f) or any(c in f for c in '*?[') for f in args.file)):
+        sys.exit(main_corpus(args))
+    args.file = args.file[0] if args.file else None
+
+    # 0) Precompiled bytecode runs as-is
+    if args.file and args.file.endswith('.layerc'):
+        if not args.quiet:
+            print("🖥️ VM Execution:")
+        try:
+            with output_sink(args) as sink:
+                VM.load(args.file, args.jit, sink, args.max_steps).run()
+        except Exception as e:
+            print("❌ VM Error:", e)
+            sys.exit(1)
+        return
 
     # 1) Read source
-    if args.file:
+    if args.stream:
+        if args.file:
+            if not os.path.isfile(args.file):
+                print(f"❌ Cannot open file {args.file}: no such file")
+                sys.exit(1)
+            code = Lexer.from_path(args.file)
+        else:
+            code = Lexer(sys.stdin)
+    elif args.file:
         try:
             with open(args.file, 'r') as f:
                 code = f.read()
@@ -32,59 +154,164 @@ def main():
             print(f"❌ Cannot open file {args.file}: {e}")
             sys.exit(1)
     else:
-        print("Enter Layer code, end with Ctrl+D (or Ctrl+Z then Enter on Windows):")
+        if not args.quiet:
+            print("Enter Layer code, end with Ctrl+D (or Ctrl+Z then Enter on Windows):")
         code = sys.stdin.read()
 
-    # 2) Lexical Analysis
-    print("\n🔍 Lexical Analysis:")
+    # 2) Compile, or fetch the optimized IR from the cache
+    cache = key = None
+    if args.cache or args.cache_dir or args.cache_stats:
+        cache = CompileCache(args.cache_dir, int(args.cache_size * 1024 * 1024))
+        if not args.stream:
+            key = cache.key(code, pipeline_settings(passes))
+        elif args.file:
+            key = cache.key_for_file(args.file, pipeline_settings(passes))
+
+    opt_ir = cache.get(key) if key else None
+    if opt_ir is not None:
+        if not args.quiet:
+            print(f"\n♻️ Compile cache hit ({key[:12]}): skipping to execution")
+    else:
+        comp = Compilation(code, passes=passes)
+        if args.quiet:
+            try:
+                opt_ir = comp.final_ir
+            except Exception as e:
+                print(f"❌ {PHASE_ERRORS[comp.phase]}:", e)
+                sys.exit(1)
+        else:
+            opt_ir = compile_phases(comp, args.stream)
+        if key:
+            cache.put(key, opt_ir)
+
+    if args.emit_bytecode:
+        try:
+            program = assemble(opt_ir)
+            program.dump(args.emit_bytecode)
+        except Exception as e:
+            print("❌ Bytecode Error:", e)
+            sys.exit(1)
+        if not args.quiet:
+            print(f"\n💾 Wrote {len(program)} instructions to {args.emit_bytecode}")
+
+    # 6) Execution
+    if args.quiet:
+        pass
+    elif args.engine == 'pyc':
+        print("\n🐍 Python Execution (--engine=pyc):")
+    else:
+        print("\n🖥️ VM Execution:")
     try:
-        tokens = Lexer(code).tokenize()
-        print([t.value for t in tokens if t.type != 'WHITESPACE'])
+        with output_sink(args) as sink:
+            if args.engine == 'pyc':
+                PyProgram(opt_ir, sink=sink).run()
+            else:
+                VM(opt_ir, jit=args.jit, sink=sink, max_steps=args.max_steps).run()
     except Exception as e:
-        print("❌ Lexical Error:", e)
+        print("❌ VM Error:" if args.engine == 'vm' else "❌ Runtime Error:", e)
         sys.exit(1)
+    finally:
+        if args.cache_stats and cache:
+            print("\n📊 Compile cache:", cache.stats())
+
+def output_sink(args):
+    """Where the program's write() output goes: --output FILE or stdout."""
+    return FileSink(args.output) if args.output else StdoutSink()
+
+def main_corpus(args):
+    """Run every file named on the command line; returns the exit status."""
+    files = expand(args.file)
+    if not files:
+        print("❌ No .layer or .layerc files found")
+        return 1
+    options = dict(level=args.opt_level, engine=args.engine, jit=args.jit,
+                   timeout=args.timeout, max_steps=args.max_steps)
+    jobs    = args.jobs or os.cpu_count() or 1
+    to_json = args.summary == '-'
+    results = []
+    start   = time.perf_counter()
+    for r in run_corpus(files, jobs, **options):
+        results.append(r)
+        if to_json:
+            continue
+        ms = sum(r['timings_ms'].values())
+        if r['status'] == 'ok':
+            print(f"✅ {r['file']} ({ms:.1f} ms)")
+        elif r['status'] == 'timeout':
+            print(f"⏱️ {r['file']}: {r['error']} in {r['phase']}")
+        else:
+            print(f"❌ {r['file']}: {r['error']}")
+    doc = summary(results, jobs, time.perf_counter() - start, options)
+    if to_json:
+        json.dump(doc, sys.stdout, indent=2)
+        print()
+    else:
+        counts = doc['counts']
+        print(f"\n📊 {doc['files']} files: {counts['ok']} ok, {counts['error']} failed, "
+              f"{counts['timeout']} timed out in {doc['wall_seconds']:.2f}s on {jobs} worker(s)")
+        if args.summary:
+            with open(args.summary, 'w') as f:
+                json.dump(doc, f, indent=2)
+            print(f"💾 Wrote summary to {args.summary}")
+    return 0 if doc['counts']['ok'] == doc['files'] else 1
+
+def compile_phases(comp, stream=False):
+    """Compute and print every phase of Compilation `comp` up to the IR that
+    is run, which is returned."""
+    def phase(name):
+        try:
+            return getattr(comp, name)
+        except Exception as e:
+            print(f"❌ {PHASE_ERRORS[comp.phase]}:", e)
+            sys.exit(1)
+
+    passes = comp.passes
+    # 2) Lexical Analysis
+    print("\n🔍 Lexical Analysis:")
+    if stream:
+        print("(streaming: tokens are consumed directly by the parser)")
+    else:
+        print(phase('tokens').values())
 
     # 3) Syntax Analysis
     print("\n📦 Syntax Analysis:")
-    try:
-        tree = Parser(code).parse()
-        print(tree)
-    except Exception as e:
-        print("❌ Syntax Error:", e)
-        sys.exit(1)
+    print(phase('ast'))
 
     # 4) Semantic Analysis
     print("\n✅ Semantic Analysis:")
-    try:
-        SemanticAnalyzer(tree).analyze()
-        print("Semantic analysis passed")
-    except Exception as e:
-        print("❌ Semantic Error:", e)
-        sys.exit(1)
+    phase('symbols')
+    print("Semantic analysis passed")
 
     # 5) Intermediate Representation
     print("\n🛠️ Intermediate Representation:")
-    try:
-        ir_list = IRGenerator().generate(tree)
-        for instr in ir_list:
-            print(instr)
-    except Exception as e:
-        print("❌ IR Generation Error:", e)
-        sys.exit(1)
+    for instr in phase('ir'):
+        print(instr)
+    if comp.closed_loops:
+        print(f"(closed forms for {comp.closed_loops} counted loop(s))")
 
-    # 5.1) Dead‑Code Elimination
-    print("\n🛠️ Optimized IR (dead code eliminated):")
-    opt_ir = eliminate_dead_code(ir_list)
+    # 5.1) Optimisation passes
+    print(f"\n🛠️ Optimized IR (-O{passes.level}: {', '.join(passes.passes) or 'no passes'}):")
+    opt_ir = phase('optimized_ir')
     for instr in opt_ir:
         print(instr)
+    if passes.stats:
+        print("\n⏱️ Pass timings:")
+        print(passes.report())
+    if not passes.level:
+        return opt_ir
 
-    # 6) VM Execution
-    print("\n🖥️ VM Execution:")
-    try:
-        VM(opt_ir).run()
-    except Exception as e:
-        print("❌ VM Error:", e)
-        sys.exit(1)
+    # 5.2) Superinstruction Fusion
+    fused = phase('fused_ir')
+    if passes.level >= 2:
+        print(f"\n🧩 Superinstructions ({len(opt_ir)} -> {len(fused)} instructions):")
+        for instr in fused:
+            print(instr)
+
+    # 5.3) Register Allocation
+    n_temps = len({instr.target for instr in fused if instr.target})
+    final = phase('final_ir')
+    print(f"\n🗂️ Register Allocation: {n_temps} temps -> {comp.n_regs} registers")
+    return final
 
 if __name__ == '__main__':
     main()
@@ -1,70 +1,533 @@
-import re
+import copy
+import operator
+import time
+from collections import Counter
+
 from ir import (
-    LoadConst, LoadVar, Add, Sub, Mul, Div, Pow,
+    LoadConst, LoadVar, StoreVar, CallWrite, PrintNewline,
+    Add, Sub, Mul, Div, Mod, Pow, FloorDiv, Lt, Gt, Le, Ge, Eq, Ne, Not, IsInt, Move,
+    Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch,
+    IncVar, DecVar, StoreConst,
+    uses
+)
+from cfg import build_cfg, dominators, liveness, natural_loops, BRANCHES
+
+# Instructions kept regardless of whether anything reads their result
+SIDE_EFFECTS = (
     StoreVar, CallWrite, PrintNewline,
-    Label, Jump, JumpIfFalse
+    Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch,
+    IncVar, DecVar, StoreConst
 )
 
+# IR passes by name: each takes an instruction list and returns a new one
+PASSES = {}
+
+def register_pass(name):
+    """Decorator adding an IR -> IR function to PASSES under `name`."""
+    def decorator(fn):
+        PASSES[name] = fn
+        return fn
+    return decorator
+
+@register_pass('dce')
 def eliminate_dead_code(ir_list):
-    # 1) Collect all temps that are *used*
-    used = set()
-
-    def mark_usage(instr):
-        # Add operands of instructions with side-effects
-        if isinstance(instr, (Add, Sub, Mul, Div)):
-            used.add(instr.left)
-            used.add(instr.right)
-        elif isinstance(instr, Pow):
-            used.add(instr.base)
-            used.add(instr.exp)
-        elif isinstance(instr, LoadVar):
-            used.add(instr.target)
-        elif isinstance(instr, LoadConst):
-            used.add(instr.target)
-        elif isinstance(instr, StoreVar):
-            used.add(instr.source)
-        elif isinstance(instr, CallWrite):
-            used.add(instr.arg)
-        elif isinstance(instr, JumpIfFalse):
-            for t in re.findall(r'_t\d+', instr.cond):
-                used.add(t)
-        # Labels, Jumps, PrintNewline have no temps to mark here
-
-    # First pass: mark temps used *as operands* or by side‑effects
-    for instr in ir_list:
-        mark_usage(instr)
-
-    # 2) Scan backward and keep:
-    # - Side-effect instructions
-    # - Any instruction producing a temp in 'used'
-    keep = [False] * len(ir_list)
-    for i in range(len(ir_list) - 1, -1, -1):
-        instr = ir_list[i]
-        produces = getattr(instr, 'target', None)
-        is_side_effect = isinstance(instr, (
-            StoreVar, CallWrite, PrintNewline,
-            Label, Jump, JumpIfFalse
-        ))
-
-        if is_side_effect or (produces and produces in used):
-            keep[i] = True
-
-            # Propagate operand usage
-            if isinstance(instr, (Add, Sub, Mul, Div)):
-                used.add(instr.left)
-                used.add(instr.right)
-            elif isinstance(instr, Pow):
-                used.add(instr.base)
-                used.add(instr.exp)
-            elif isinstance(instr, StoreVar):
-                used.add(instr.source)
-            elif isinstance(instr, CallWrite):
-                used.add(instr.arg)
-            elif isinstance(instr, (LoadVar, LoadConst)):
-                used.add(instr.target)
-            elif isinstance(instr, JumpIfFalse):
-                for t in re.findall(r'_t\d+', instr.cond):
-                    used.add(t)
+    # 1) Every temp's defining instructions (Move targets can have several)
+    defs = {}
+    for i, instr in enumerate(ir_list):
+        if instr.target:
+            defs.setdefault(instr.target, []).append(i)
+
+    # 2) Mark side-effect instructions, then everything they transitively read
+    keep = [isinstance(instr, SIDE_EFFECTS) for instr in ir_list]
+    work = [i for i, k in enumerate(keep) if k]
+    while work:
+        for temp in uses(ir_list[work.pop()]):
+            for d in defs.get(temp, ()):
+                if not keep[d]:
+                    keep[d] = True
+                    work.append(d)
 
     # 3) Return pruned instructions
     return [instr for instr, keep_flag in zip(ir_list, keep) if keep_flag]
+
+
+# ---- sparse conditional constant propagation ----------------------------------
+#
+# Values form the usual three-level lattice: TOP (no value seen yet), a known
+# constant (a 1-tuple, so None/False/0 are ordinary constants) and BOTTOM
+# (varies at runtime). Temps and variables are tracked per block, since
+# variables are reassigned and short-circuit results are written by more
+# than one MOVE. Only edges out of reachable blocks whose branch can still go
+# that way are followed, so code behind a constant-false condition never
+# pollutes the values that reach a join.
+
+TOP    = 'TOP'
+BOTTOM = 'BOTTOM'
+
+FOLD = {
+    Add: operator.add, Sub: operator.sub, Mul: operator.mul,
+    Div: operator.truediv, Mod: operator.mod, Pow: operator.pow,
+    FloorDiv: operator.floordiv,
+    Lt: operator.lt, Gt: operator.gt, Le: operator.le,
+    Ge: operator.ge, Eq: operator.eq, Ne: operator.ne,
+}
+COMPARE_FNS = {'<': operator.lt, '>': operator.gt, '<=': operator.le,
+               '>=': operator.ge, '==': operator.eq, '!=': operator.ne}
+
+MAX_FOLD_BITS = 4096    # don't fold ints or strings bigger than this
+MAX_FOLD_LEN  = 4096
+# constants the bytecode can encode; (-8) ^ 0.5 is a complex, left to run time
+FOLD_TYPES    = (int, float, bool, str)
+
+@register_pass('sccp')
+def propagate_constants(ir_list):
+    """
+    Fold arithmetic and comparisons on known constants, turn LOAD_VARs of
+    variables with a known value into LOAD_CONSTs, replace branches with a
+    known outcome by a JUMP (or drop them) and delete unreachable blocks.
+    Anything that would raise at runtime is left alone. Run
+    eliminate_dead_code afterwards to remove the loads that fed folded
+    instructions.
+    """
+    blocks = build_cfg(ir_list)
+    if not blocks:
+        return []
+    block_of_label = {ir_list[b.start].name: b.index
+                      for b in blocks if isinstance(ir_list[b.start], Label)}
+
+    # every variable starts out as None, as in the VM
+    entry = {('var', instr.name): (None,) for instr in ir_list
+             if isinstance(instr, (LoadVar, StoreVar))}
+    state_in  = [None] * len(blocks)        # None: not reached (yet)
+    state_out = [None] * len(blocks)
+    executable = set()                      # (pred, succ) block indices
+
+    work = [0]
+    state_in[0] = entry
+    while work:
+        n = work.pop()
+        block = blocks[n]
+        state = dict(state_in[n])
+        for instr in ir_list[block.start:block.end]:
+            _transfer(instr, state)
+        state_out[n] = state
+
+        for succ in _successors(ir_list[block.end - 1], state, n, blocks, block_of_label):
+            executable.add((n, succ))
+            merged = dict(entry) if succ == 0 else {}
+            for pred in blocks[succ].preds:
+                if (pred.index, succ) in executable:
+                    merged = _meet_states(merged, state_out[pred.index])
+            if merged != state_in[succ]:
+                state_in[succ] = merged
+                if succ not in work:
+                    work.append(succ)
+
+    # Rewrite reachable blocks with the final states
+    out = []
+    for block in blocks:
+        if state_in[block.index] is None:
+            continue
+        state = dict(state_in[block.index])
+        for instr in ir_list[block.start:block.end]:
+            if isinstance(instr, (JumpIfFalse, JumpIfTrue, CompareAndBranch)):
+                taken = _branch_outcome(instr, state)
+                if taken is True:
+                    out.append(Jump(instr.label))
+                elif taken is not False:
+                    out.append(instr)
+                continue
+            _transfer(instr, state)
+            value = state.get(instr.target, TOP) if instr.target else TOP
+            if isinstance(value, tuple) and not isinstance(instr, LoadConst):
+                out.append(LoadConst(value[0], instr.target))
+            else:
+                out.append(instr)
+    return out
+
+
+def _transfer(instr, state):
+    """Update `state` with the effect of one instruction."""
+    if isinstance(instr, LoadConst):
+        state[instr.target] = (instr.value,)
+    elif isinstance(instr, LoadVar):
+        state[instr.target] = state.get(('var', instr.name), BOTTOM)
+    elif isinstance(instr, StoreVar):
+        state[('var', instr.name)] = state.get(instr.source, TOP)
+    elif isinstance(instr, Move):
+        state[instr.target] = state.get(instr.source, TOP)
+    elif isinstance(instr, Not):
+        v = state.get(instr.source, TOP)
+        state[instr.target] = (not v[0],) if isinstance(v, tuple) else v
+    elif isinstance(instr, IsInt):
+        v = state.get(instr.source, TOP)
+        state[instr.target] = (type(v[0]) is int,) if isinstance(v, tuple) else v
+    elif type(instr) in FOLD:
+        a, b = (state.get(t, TOP) for t in uses(instr))
+        if a is BOTTOM or b is BOTTOM:
+            state[instr.target] = BOTTOM
+        elif a is TOP or b is TOP:
+            state[instr.target] = TOP
+        else:
+            state[instr.target] = _fold(type(instr), a[0], b[0])
+    elif instr.target:
+        state[instr.target] = BOTTOM
+
+
+def _fold(cls, a, b):
+    """Constant result of `a <op> b`, or BOTTOM if it raises, is too big or
+    is not a constant the bytecode can hold."""
+    if cls is Pow and isinstance(a, int) and isinstance(b, int):
+        if abs(a) > 1 and b * a.bit_length() > MAX_FOLD_BITS:
+            return BOTTOM
+    if cls is Mul:
+        for s, k in ((a, b), (b, a)):
+            if isinstance(s, str) and isinstance(k, int) and len(s) * k > MAX_FOLD_LEN:
+                return BOTTOM
+    try:
+        value = FOLD[cls](a, b)
+    except Exception:
+        return BOTTOM
+    if not isinstance(value, FOLD_TYPES):
+        return BOTTOM
+    if isinstance(value, int) and value.bit_length() > MAX_FOLD_BITS:
+        return BOTTOM
+    if isinstance(value, str) and len(value) > MAX_FOLD_LEN:
+        return BOTTOM
+    return (value,)
+
+
+def _branch_outcome(instr, state):
+    """True/False if the branch is known to be taken / not taken, TOP if its
+    condition has no value yet, None if it depends on runtime values."""
+    if isinstance(instr, CompareAndBranch):
+        a, b = state.get(instr.left, TOP), state.get(instr.right, TOP)
+        if a is BOTTOM or b is BOTTOM:
+            return None
+        if a is TOP or b is TOP:
+            return TOP
+        try:
+            return not COMPARE_FNS[instr.op](a[0], b[0])
+        except Exception:
+            return None
+    v = state.get(instr.cond, TOP)
+    if v is TOP:
+        return TOP
+    if v is BOTTOM:
+        return None
+    return not v[0] if isinstance(instr, JumpIfFalse) else bool(v[0])
+
+
+def _successors(last, state, n, blocks, block_of_label):
+    """Indices of the blocks control can reach from block n."""
+    after = [n + 1] if n + 1 < len(blocks) else []
+    if isinstance(last, Jump):
+        return [block_of_label[last.label]]
+    if isinstance(last, (JumpIfFalse, JumpIfTrue, CompareAndBranch)):
+        taken = _branch_outcome(last, state)
+        if taken is TOP:
+            return []
+        if taken is True:
+            return [block_of_label[last.label]]
+        if taken is False:
+            return after
+        return [block_of_label[last.label]] + after
+    return after
+
+
+def _meet(a, b):
+    if a is TOP:
+        return b
+    if b is TOP or a is b:
+        return a
+    if a is BOTTOM or b is BOTTOM:
+        return BOTTOM
+    # 1 == True == 1.0 and 0.0 == -0.0, so compare type and repr too
+    x, y = a[0], b[0]
+    if type(x) is type(y) and repr(x) == repr(y):
+        return a
+    return BOTTOM
+
+
+def _meet_states(a, b):
+    merged = dict(a)
+    for key, value in b.items():
+        merged[key] = _meet(merged.get(key, TOP), value)
+    return merged
+
+
+# ---- value numbering ----------------------------------------------------------
+#
+# Temps other than short-circuit results are written exactly once, so an
+# expression over them means the same thing anywhere its defining block
+# dominates: those are numbered over the dominator tree. Variables can be
+# reassigned on any path, so what is known about them (the temp last loaded
+# from or stored to each) only flows from a block into a successor whose
+# single predecessor it is.
+
+COMMUTATIVE = (Mul, Eq, Ne)
+
+@register_pass('vn')
+def number_values(ir_list):
+    """
+    Drop LOAD_CONSTs, arithmetic, comparisons and NOTs that recompute a
+    value already held in a temp, and LOAD_VARs whose variable was just
+    loaded or stored; later reads are renamed to the earlier temp.
+    """
+    blocks = build_cfg(ir_list)
+    if not blocks:
+        return []
+    idom     = dominators(blocks)
+    children = [[] for _ in blocks]
+    for n, d in enumerate(idom):
+        if d is not None and d != n:
+            children[d].append(n)
+
+    n_defs   = Counter(instr.target for instr in ir_list if instr.target)
+    rename   = {}                       # dropped temp -> temp holding its value
+    out      = list(ir_list)            # None where an instruction is dropped
+    avail    = {}                       # value key -> temp
+    var_exit = [None] * len(blocks)     # variable -> temp at the end of a block
+
+    def visit(n, known):
+        added = []
+        for i in range(blocks[n].start, blocks[n].end):
+            instr = ir_list[i]
+            fields = [f for f in instr.operands if getattr(instr, f) in rename]
+            if fields:
+                instr = copy.copy(instr)
+                for f in fields:
+                    setattr(instr, f, rename[getattr(instr, f)])
+            target = instr.target
+            if isinstance(instr, StoreVar):
+                if n_defs[instr.source] == 1:
+                    known[instr.name] = instr.source
+                else:
+                    known.pop(instr.name, None)
+            elif isinstance(instr, LoadVar) and n_defs[target] == 1:
+                if instr.name in known:
+                    rename[target] = known[instr.name]
+                    out[i] = None
+                    continue
+                known[instr.name] = target
+            elif target and n_defs[target] == 1:
+                key = _value_key(instr, n_defs)
+                if key in avail:
+                    rename[target] = avail[key]
+                    out[i] = None
+                    continue
+                if key is not None:
+                    avail[key] = target
+                    added.append(key)
+            out[i] = instr
+        var_exit[n] = known
+        return added
+
+    # dominator tree walk; a block's values go out of scope after its subtree
+    stack = [(0, None)]
+    while stack:
+        n, added = stack.pop()
+        if added is not None:
+            for key in added:
+                del avail[key]
+            continue
+        preds = blocks[n].preds
+        inherit = n != 0 and len(preds) == 1 and preds[0].index == idom[n]
+        added = visit(n, dict(var_exit[idom[n]]) if inherit else {})
+        stack.append((n, added))
+        stack.extend((c, None) for c in reversed(children[n]))
+
+    # unreachable blocks only need their reads renamed
+    for n, d in enumerate(idom):
+        if d is None:
+            for key in visit(n, {}):
+                del avail[key]
+    return [instr for instr in out if instr is not None]
+
+
+def _value_key(instr, n_defs):
+    """Hashable description of the value an instruction computes, or None."""
+    if isinstance(instr, LoadConst):
+        # 1 == True == 1.0 and 0.0 == -0.0, so compare type and repr too
+        return ('const', type(instr.value), repr(instr.value))
+    if type(instr) in FOLD or isinstance(instr, (Not, IsInt)):
+        args = uses(instr)
+        if any(n_defs[t] != 1 for t in args):
+            return None
+        if isinstance(instr, COMMUTATIVE):
+            args = sorted(args)
+        return (type(instr),) + tuple(args)
+    return None
+
+
+# ---- loop-invariant code motion ----------------------------------------------
+#
+# Loops are the natural loops of back edges (in IRGenerator output, the JUMPs
+# back to FOR_START_/WHILE_START_ labels). A loop is entered by falling into
+# its header label, so a preheader is simply the code placed right before
+# that label. Hoisted code runs once even when the loop body never does, so
+# only instructions that cannot raise move: constants, loads of variables
+# the loop never stores, NOT/EQ/NE, and arithmetic whose constant operands
+# are known to evaluate cleanly.
+
+NEVER_RAISE = (Not, IsInt, Eq, Ne)
+
+@register_pass('licm')
+def hoist_loop_invariants(ir_list):
+    """Move loop-invariant instructions into loop preheaders, innermost loops
+    first so that outer loops can hoist them further."""
+    blocks = build_cfg(ir_list)
+    loops  = natural_loops(blocks)
+    headers = [ir_list[blocks[h].start].name
+               for h in sorted(loops, key=lambda h: len(loops[h]))
+               if isinstance(ir_list[blocks[h].start], Label)]
+    for label in headers:
+        ir_list = _hoist_loop(ir_list, label)
+    return ir_list
+
+
+def _hoist_loop(ir_list, label):
+    blocks = build_cfg(ir_list)
+    h = next(b.index for b in blocks
+             if isinstance(ir_list[b.start], Label) and ir_list[b.start].name == label)
+    body = natural_loops(blocks).get(h)
+    if body is None:
+        return ir_list
+
+    # the only way in must be falling through into the header
+    outside = [p for p in blocks[h].preds if p.index not in body]
+    if h == 0:
+        if outside:
+            return ir_list
+    else:
+        last = ir_list[blocks[h - 1].end - 1]
+        if outside != [blocks[h - 1]] or isinstance(last, (Jump,) + BRANCHES):
+            return ir_list
+
+    in_loop = sorted(i for n in body for i in range(blocks[n].start, blocks[n].end))
+    inside  = set(in_loop)
+    n_defs  = Counter(instr.target for instr in ir_list if instr.target)
+    stored  = {ir_list[i].name for i in in_loop if isinstance(ir_list[i], StoreVar)}
+    def_at  = {instr.target: i for i, instr in enumerate(ir_list)
+               if instr.target and n_defs[instr.target] == 1}
+    consts  = {instr.target: instr.value for instr in ir_list
+               if isinstance(instr, LoadConst) and n_defs[instr.target] == 1}
+
+    hoisted = set()
+    def invariant(temp):
+        return temp in def_at and (def_at[temp] not in inside or def_at[temp] in hoisted)
+
+    changed = True
+    while changed:
+        changed = False
+        for i in in_loop:
+            instr = ir_list[i]
+            if i in hoisted or not instr.target or n_defs[instr.target] != 1:
+                continue
+            args = uses(instr)
+            if isinstance(instr, LoadConst):
+                ok = True
+            elif isinstance(instr, LoadVar):
+                ok = instr.name not in stored
+            elif isinstance(instr, NEVER_RAISE):
+                ok = all(invariant(t) for t in args)
+            elif type(instr) in FOLD:
+                ok = (all(invariant(t) and t in consts for t in args)
+                      and isinstance(_fold(type(instr), *(consts[t] for t in args)), tuple))
+            else:
+                ok = False
+            if ok:
+                hoisted.add(i)
+                changed = True
+
+    if not hoisted:
+        return ir_list
+    start = blocks[h].start
+    return (ir_list[:start] + [ir_list[i] for i in sorted(hoisted)]
+            + [instr for i, instr in enumerate(ir_list[start:], start) if i not in hoisted])
+
+
+# ---- pass manager -------------------------------------------------------------
+
+# level: (passes in order, maximum rounds); a round that changes nothing ends
+# the run early
+OPT_LEVELS = {
+    0: ([], 0),
+    1: (['dce'], 1),
+    2: (['sccp', 'vn', 'licm', 'dce'], 1),
+    3: (['sccp', 'vn', 'licm', 'dce'], 8),
+}
+
+class PassManager:
+    """
+    Runs registered passes in rounds until the IR stops changing (or
+    max_rounds is reached), timing each pass. With verify=True the IR is
+    checked by verify_ir after every pass and a broken pass is named.
+    """
+    def __init__(self, level=2, passes=None, max_rounds=None, verify=False):
+        preset, rounds  = OPT_LEVELS[level]
+        self.level      = level
+        self.passes     = list(preset if passes is None else passes)
+        self.max_rounds = rounds if max_rounds is None else max_rounds
+        self.verify     = verify
+        self.stats      = []    # one dict per pass run: round, pass, ms, before, after
+        for name in self.passes:
+            if name not in PASSES:
+                raise ValueError(f"Unknown optimisation pass '{name}'")
+
+    def settings(self):
+        """Everything that affects the output, for compile cache keys."""
+        return {'level': self.level, 'passes': self.passes, 'rounds': self.max_rounds}
+
+    def run(self, ir_list):
+        if self.verify:
+            verify_ir(ir_list, 'input')
+        for round_no in range(1, self.max_rounds + 1):
+            changed = False
+            for name in self.passes:
+                start = time.perf_counter()
+                out = PASSES[name](ir_list)
+                elapsed = time.perf_counter() - start
+                self.stats.append({'round': round_no, 'pass': name, 'ms': elapsed * 1e3,
+                                   'before': len(ir_list), 'after': len(out)})
+                if self.verify:
+                    verify_ir(out, name)
+                if len(out) != len(ir_list) or any(a is not b for a, b in zip(out, ir_list)):
+                    changed = True
+                ir_list = out
+            if not changed:
+                break
+        return ir_list
+
+    def report(self):
+        """Per-pass timing table as text."""
+        lines = [f"{'round':>5}  {'pass':<8} {'ms':>9} {'before':>8} {'after':>8} {'delta':>7}"]
+        for s in self.stats:
+            lines.append(f"{s['round']:>5}  {s['pass']:<8} {s['ms']:>9.3f} {s['before']:>8} "
+                         f"{s['after']:>8} {s['after'] - s['before']:>+7}")
+        total = sum(s['ms'] for s in self.stats)
+        lines.append(f"{'':>5}  {'total':<8} {total:>9.3f}")
+        return "\n".join(lines)
+
+
+def verify_ir(ir_list, where='IR'):
+    """
+    Check IR invariants: labels are unique, every jump names a label, and
+    every temp is written on all paths before it is read. Raises ValueError.
+    """
+    labels = set()
+    for instr in ir_list:
+        if isinstance(instr, Label):
+            if instr.name in labels:
+                raise ValueError(f"after {where}: duplicate label {instr.name}")
+            labels.add(instr.name)
+    for instr in ir_list:
+        if isinstance(instr, (Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch)) \
+                and instr.label not in labels:
+            raise ValueError(f"after {where}: {instr!r} jumps to a missing label")
+    blocks = build_cfg(ir_list)
+    if blocks:
+        undefined = liveness(ir_list, blocks)[0][0]
+        if undefined:
+            raise ValueError(f"after {where}: temps read before they are written: "
+                             f"{', '.join(sorted(undefined))}")
@@ -1,23 +1,51 @@
 # parser.py
 
+from collections import deque
 from lexer       import Lexer
 from token_defs  import Token
 from layer_ast         import (
     Program, VarDecl, Assignment,
     WriteStmt, LoopFor, LoopWhile,
-    IfStmt, Block, Expr
+    IfStmt, Block, Literal, Name, UnaryOp, BinOp
 )
+from rules       import BINARY_PRECEDENCE, RIGHT_ASSOC, UNARY_PRECEDENCE
+
+# 'and', 'or' and 'not' lex as identifiers (the identifier rule comes first)
+WORD_OPERATORS = ('and', 'or', 'not')
 
 class Parser:
-    def __init__(self, source: str):
-        self.tokens = Lexer(source).tokenize()
-        self.pos    = 0
-        self.cur    = self.tokens[0]
+    """
+    Recursive-descent parser over a token stream.
+
+    `source` is Layer source text, a Lexer, or any iterable of tokens. Tokens
+    are pulled lazily; besides the current token only a one-token lookahead
+    window is kept, so streamed input is never held in memory as a whole.
+    """
+    def __init__(self, source):
+        if isinstance(source, str):
+            source = Lexer(source)
+        if isinstance(source, Lexer):
+            source = source.stream()
+        self._tokens = iter(source)
+        self._ahead  = deque()
+        self.pos     = 0
+        self.cur     = next(self._tokens)
 
     def advance(self):
         self.pos += 1
-        if self.pos < len(self.tokens):
-            self.cur = self.tokens[self.pos]
+        if self._ahead:
+            self.cur = self._ahead.popleft()
+        else:
+            # past EOF the cursor stays on the last token
+            self.cur = next(self._tokens, self.cur)
+
+    def peek(self):
+        if not self._ahead:
+            nxt = next(self._tokens, None)
+            if nxt is None:
+                return None
+            self._ahead.append(nxt)
+        return self._ahead[0]
 
     def eat(self, ttype, value=None):
         if self.cur.type != ttype or (value is not None and self.cur.value != value):
@@ -37,7 +65,7 @@ class Parser:
     def parse_stmt(self):
         # 0) Assignment: <identifier> = <expr>
         if self.cur.type == 'IDENTIFIER':
-            nxt = self.tokens[self.pos+1] if self.pos+1 < len(self.tokens) else None
+            nxt = self.peek()
             if nxt and nxt.type=='OPERATOR' and nxt.value=='=':
                 name = self.cur.value
                 self.advance()      # consume identifier
@@ -88,10 +116,7 @@ class Parser:
             self.eat('IDENTIFIER')
             self.eat('KEYWORD', 'for')
             count = self.parse_expr()
-            # strip any trailing " times" from the Expr value:
-            if isinstance(count, Expr) and count.value.endswith(' times'):
-                count = Expr(count.value[:-6].strip())
-            # also skip a standalone 'times' token if it's next
+            # skip the optional 'times' after the count
             if self.cur.type == 'IDENTIFIER' and self.cur.value == 'times':
                 self.advance()
             self.eat('OPERATOR', '->')
@@ -118,16 +143,53 @@ class Parser:
             break
         return args
 
-    def parse_expr(self):
-        tokens = []
-        stop_types = ('NEWLINE', 'EOF')
-        stop_punc  = (',', ')', '{', '}')
-        while self.cur.type not in stop_types \
-          and not (self.cur.type=='PUNCTUATION' and self.cur.value in stop_punc) \
-          and not (self.cur.type=='OPERATOR' and self.cur.value=='->'):
-            tokens.append(self.cur.value)
+    def parse_expr(self, min_prec=1):
+        # precedence climbing: loops over same-level operators, recursing
+        # only to bind tighter ones, so long chains don't deepen the stack
+        left = self.parse_unary()
+        while True:
+            op = self._binary_op()
+            if op is None or BINARY_PRECEDENCE[op] < min_prec:
+                return left
+            self.advance()
+            prec  = BINARY_PRECEDENCE[op]
+            right = self.parse_expr(prec if op in RIGHT_ASSOC else prec + 1)
+            left  = BinOp(op, left, right)
+
+    def parse_unary(self):
+        tok = self.cur
+        if tok.type in ('OPERATOR', 'IDENTIFIER') and tok.value in UNARY_PRECEDENCE:
+            self.advance()
+            return UnaryOp(tok.value, self.parse_expr(UNARY_PRECEDENCE[tok.value]))
+        return self.parse_primary()
+
+    def parse_primary(self):
+        tok = self.cur
+        if tok.type == 'NUMBER':
             self.advance()
-        return Expr(' '.join(tokens))
+            return Literal(float(tok.value) if '.' in tok.value else int(tok.value))
+        if tok.type == 'STRING':
+            self.advance()
+            return Literal(tok.value[1:-1])
+        if tok.type == 'BOOLEAN':
+            self.advance()
+            return Literal(tok.value == 'true')
+        if tok.type == 'IDENTIFIER' and tok.value not in WORD_OPERATORS:
+            self.advance()
+            return Name(tok.value)
+        if tok.type == 'PUNCTUATION' and tok.value == '(':
+            self.advance()
+            expr = self.parse_expr()
+            self.eat('PUNCTUATION', ')')
+            return expr
+        raise SyntaxError(f"Unexpected token in expression: {tok}")
+
+    def _binary_op(self):
+        tok = self.cur
+        if tok.type == 'OPERATOR' or (tok.type == 'IDENTIFIER' and tok.value in WORD_OPERATORS):
+            if tok.value in BINARY_PRECEDENCE:
+                return tok.value
+        return None
 
     def parse_block(self):
         # single-statement block without braces
@@ -0,0 +1,98 @@
+# peephole.py
+#
+# Superinstruction fusion: rewrite common short IR sequences into single
+# instructions so the VM dispatches once instead of two to four times.
+#
+#   LOAD_VAR x -> a; ADD a, k -> t; STORE_VAR t -> x    =>  INC_VAR x += k
+#   LOAD_VAR x -> a; SUB a, k -> t; STORE_VAR t -> x    =>  DEC_VAR x -= k
+#   LOAD_VAR x -> a; ADD a, k -> t                      =>  ADD_VAR_IMM x + k -> t
+#   LOAD_CONST v -> t; STORE_VAR t -> x                 =>  STORE_CONST v -> x
+#   LOAD_VAR x -> a; LOAD_VAR y -> b                    =>  LOAD_VAR_PAIR x -> a, y -> b
+#
+# k is any temp written once by a LOAD_CONST, wherever it lives (after LICM
+# the increment constant sits in the loop preheader). "a holds x" is tracked
+# through each block and into a successor whose only predecessor it is, so
+# the LOAD_VAR does not have to be adjacent. The LOAD_VARs and LOAD_CONSTs
+# left without readers are then removed.
+#
+# This runs after the optimisation passes (the passes don't know these
+# instructions) and before register allocation. Which sequences to fuse was
+# chosen with benchmarks/mine_superinstructions.py.
+
+from collections import Counter
+
+from cfg import build_cfg
+from ir import (
+    LoadConst, LoadVar, StoreVar, Add, Sub,
+    IncVar, DecVar, AddVarImm, StoreConst, LoadVarPair,
+    uses
+)
+from optim import eliminate_dead_code
+
+def fuse_superinstructions(ir_list):
+    ir_list = eliminate_dead_code(_fuse_updates(ir_list))
+    return _pair_loads(ir_list)
+
+
+def _fuse_updates(ir_list):
+    n_defs = Counter(instr.target for instr in ir_list if instr.target)
+    n_uses = Counter(t for instr in ir_list for t in uses(instr))
+    consts = {instr.target: instr.value for instr in ir_list
+              if isinstance(instr, LoadConst) and n_defs[instr.target] == 1}
+
+    def holds(known, temp):
+        """Variable whose current value `temp` is known to hold, if any."""
+        return next((name for name, t in known.items() if t == temp), None)
+
+    blocks   = build_cfg(ir_list)
+    var_exit = [None] * len(blocks)
+    out      = []
+    for block in blocks:
+        preds = block.preds
+        if len(preds) == 1 and preds[0].index < block.index:
+            known = dict(var_exit[preds[0].index])
+        else:
+            known = {}
+        i = block.start
+        while i < block.end:
+            instr = ir_list[i]
+            nxt   = ir_list[i + 1] if i + 1 < block.end else None
+            if isinstance(instr, LoadVar) and n_defs[instr.target] == 1:
+                known[instr.name] = instr.target
+            elif isinstance(instr, (Add, Sub)) and instr.right in consts:
+                if (isinstance(nxt, StoreVar) and nxt.source == instr.target
+                        and known.get(nxt.name) == instr.left
+                        and n_uses[instr.target] == 1):
+                    cls = IncVar if isinstance(instr, Add) else DecVar
+                    out.append(cls(nxt.name, consts[instr.right]))
+                    known.pop(nxt.name)
+                    i += 2
+                    continue
+                name = holds(known, instr.left)
+                if name is not None and isinstance(instr, Add) and n_uses[instr.left] == 1:
+                    instr = AddVarImm(name, consts[instr.right], instr.target)
+            elif isinstance(instr, StoreVar):
+                known.pop(instr.name, None)
+                if n_defs[instr.source] == 1:
+                    known[instr.name] = instr.source
+                if instr.source in consts:
+                    instr = StoreConst(consts[instr.source], instr.name)
+            out.append(instr)
+            i += 1
+        var_exit[block.index] = known
+    return out
+
+
+def _pair_loads(ir_list):
+    out = []
+    i = 0
+    while i < len(ir_list):
+        instr = ir_list[i]
+        nxt   = ir_list[i + 1] if i + 1 < len(ir_list) else None
+        if isinstance(instr, LoadVar) and isinstance(nxt, LoadVar):
+            out.append(LoadVarPair(instr.name, instr.target, nxt.name, nxt.target))
+            i += 2
+        else:
+            out.append(instr)
+            i += 1
+    return out
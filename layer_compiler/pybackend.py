@@ -0,0 +1,294 @@
+# pybackend.py
+#
+# Optimized IR -> Python source -> compile()/exec, so hot loops run as
+# native CPython bytecode instead of going through the VM's dispatch loop.
+#
+# The program becomes one function. Variables are locals (v_<name>, all
+# starting as None like the VM's variable slots) and temps are locals too
+# (t<name>). Control flow is rebuilt from the label/jump structure:
+#
+#   * a block with a back edge JUMP to it from a later block is a loop
+#     header; the blocks up to the last such JUMP become `while True:`, a
+#     branch to the block after them is `break` and one to the header is
+#     `continue`
+#   * a forward branch to a block inside the current region nests the
+#     blocks it skips under `if not <taken>:`
+#   * a forward branch past the end of the current region (the OR_TRUE_
+#     pattern of short-circuit conditions) sets a flag; the blocks it skips
+#     are then nested under `if not <flag>:` at each level until the
+#     target is reached
+#
+# Anything else (a backward jump that is not a loop back edge, a jump out of
+# a loop other than to its exit) makes the emitter give up and fall back to
+# a state machine over basic blocks, which is slower but always correct.
+# Operations map onto the same Python operators the VM uses, so output and
+# exceptions match the VM.
+
+import math
+
+from sinks import StdoutSink
+from cfg import build_cfg
+from ir import (
+    LoadConst, LoadVar, StoreVar, CallWrite, PrintNewline,
+    Add, Sub, Mul, Div, Mod, Pow, FloorDiv, Lt, Gt, Le, Ge, Eq, Ne, Not, IsInt, Move,
+    Label, Jump, JumpIfFalse, JumpIfTrue, CompareAndBranch,
+    IncVar, DecVar, AddVarImm, StoreConst, LoadVarPair
+)
+
+BINARY = {Add: '+', Sub: '-', Mul: '*', Div: '/', Mod: '%', Pow: '**', FloorDiv: '//',
+          Lt: '<', Gt: '>', Le: '<=', Ge: '>=', Eq: '==', Ne: '!='}
+BRANCHES = (JumpIfFalse, JumpIfTrue, CompareAndBranch)
+INDENT = '    '
+
+def negate(cond):
+    """`not cond`, without stacking a second `not` onto a negated condition."""
+    if cond.startswith("not (") and cond.endswith(")"):
+        return cond[5:-1]
+    if cond.startswith("not ") and " " not in cond[4:]:
+        return cond[4:]
+    return f"not ({cond})"
+
+
+class Unstructured(Exception):
+    """Control flow the structured emitter cannot express."""
+
+
+class PyProgram:
+    """
+    IR compiled to a Python function. run() executes it, writing to `sink`
+    like the VM, and leaves the final variables in `env`; `structured` says
+    whether loops and ifs were recovered or the state-machine fallback was
+    used.
+    """
+    def __init__(self, ir_list, structured=True, sink=None):
+        self.source, self.consts, self.structured = to_python(ir_list, structured)
+        try:
+            code = compile(self.source, '<layer>', 'exec')
+        except SyntaxError:
+            # nesting past what CPython allows (20 blocks, 100 indents): the
+            # state machine is flat whatever the loop depth
+            if not self.structured:
+                raise
+            self.source, self.consts, self.structured = to_python(ir_list, False)
+            code = compile(self.source, '<layer>', 'exec')
+        namespace = {}
+        exec(code, namespace)
+        self._main = namespace['layer_main']
+        self.env  = {}
+        self.sink = sink if sink is not None else StdoutSink()
+
+    def run(self):
+        try:
+            self.env = self._main(self.sink.write, self.consts)
+        finally:
+            self.sink.flush()
+
+
+def to_python(ir_list, structured=True):
+    """Python source for `ir_list`: (source, constant tuple, structured?)."""
+    emitter = _Emitter(ir_list)
+    if structured:
+        try:
+            return emitter.source(emitter.structured()), tuple(emitter.consts), True
+        except (Unstructured, RecursionError):
+            emitter = _Emitter(ir_list)
+    return emitter.source(emitter.state_machine()), tuple(emitter.consts), False
+
+
+class _Emitter:
+    def __init__(self, ir_list):
+        self.ir       = ir_list
+        self.blocks   = build_cfg(ir_list)
+        self.at_label = {ir_list[b.start].name: b.index for b in self.blocks
+                         if isinstance(ir_list[b.start], Label)}
+        self.consts   = []
+        self.names    = sorted({instr.name for instr in ir_list if hasattr(instr, 'name')
+                                and not isinstance(instr, Label)}
+                               | {instr.name2 for instr in ir_list
+                                  if isinstance(instr, LoadVarPair)})
+        # header block -> last block jumping back to it
+        self.latch = {}
+        for block in self.blocks:
+            last = ir_list[block.end - 1]
+            if isinstance(last, Jump) and self.at_label[last.label] <= block.index:
+                self.latch[self.at_label[last.label]] = block.index
+        self.flags = {None: set()}      # loop header (None: top level) -> flags used
+
+    def source(self, body):
+        lines = ["def layer_main(_write, K):"]
+        lines += [f"{INDENT}v_{name} = None" for name in self.names]
+        lines += body
+        env = ", ".join(f"{name!r}: v_{name}" for name in self.names)
+        lines.append(f"{INDENT}return {{{env}}}")
+        return "\n".join(lines) + "\n"
+
+    # ---- structured emission -------------------------------------------------
+
+    def structured(self):
+        body = self.region(0, len(self.blocks), None, 1)
+        flags = [f"{INDENT}f{t} = False" for t in sorted(self.flags[None])]
+        return flags + body
+
+    def region(self, b, end, loop, depth, escapes=None):
+        """Lines for blocks [b, end) at `depth`. Flags for branches past `end`
+        are added to `escapes` (targets beyond the region)."""
+        out = []
+        pad = INDENT * depth
+        pending = set()         # flag targets: blocks skipped until reached
+        while b < end:
+            pending.discard(b)
+            if pending:
+                # some flag may be set: skip up to the nearest target
+                target = min(min(pending), end)
+                taken = " or ".join(f"f{t}" for t in sorted(pending))
+                inner = self.region(b, target, loop, depth + 1, pending)
+                if inner:
+                    out.append(f"{pad}if {negate(taken)}:")
+                    out += inner
+                b = target
+                continue
+
+            if b in self.latch and not (loop is not None and loop[0] == b):
+                b = self.emit_loop(b, end, depth, out)
+                continue
+
+            block = self.blocks[b]
+            last  = self.ir[block.end - 1]
+            for instr in self.ir[block.start:block.end]:
+                out += [pad + line for line in self.statement(instr)]
+
+            if isinstance(last, Jump):
+                taken, target = "True", self.at_label[last.label]
+            elif isinstance(last, BRANCHES):
+                taken, target = self.condition(last), self.at_label[last.label]
+            else:
+                b += 1
+                continue
+
+            b += 1
+            if loop is not None and target == loop[1]:
+                out.append(f"{pad}break" if taken == "True" else f"{pad}if {taken}: break")
+            elif loop is not None and target == loop[0]:
+                out.append(f"{pad}continue" if taken == "True" else f"{pad}if {taken}: continue")
+            elif target < b:
+                raise Unstructured(f"backward jump to block {target}")
+            elif target == b:
+                # nothing to skip, but the comparison can still raise
+                if taken != "True":
+                    out.append(f"{pad}{taken}")
+            elif target <= end and taken != "True":
+                inner = self.region(b, target, loop, depth + 1, pending)
+                if inner:
+                    out.append(f"{pad}if {negate(taken)}:")
+                    out += inner
+                else:
+                    out.append(f"{pad}{taken}")
+                b = target
+            else:
+                if loop is not None and target > loop[1]:
+                    raise Unstructured(f"jump out of loop to block {target}")
+                self.flags[loop[0] if loop else None].add(target)
+                out.append(f"{pad}f{target} = True" if taken == "True"
+                           else f"{pad}if {taken}: f{target} = True")
+                pending.add(target)
+
+        # flags still set at the end of the region skip past it
+        if pending:
+            if escapes is None:
+                raise Unstructured("jump past the end of the program")
+            escapes.update(pending)
+        return out
+
+    def emit_loop(self, header, end, depth, out):
+        """Emit the loop headed by block `header`; returns the block after it."""
+        exit_ = self.latch[header] + 1
+        if exit_ > end:
+            raise Unstructured(f"loop at block {header} overlaps its region")
+        self.flags[header] = set()
+        body = self.region(header, exit_, (header, exit_), depth + 1)
+        pad = INDENT * (depth + 1)
+        if body and body[-1] == f"{pad}continue":
+            body.pop()
+        out.append(f"{INDENT * depth}while True:")
+        out += [f"{pad}f{t} = False" for t in sorted(self.flags[header])]
+        out += body or [f"{pad}pass"]
+        return exit_
+
+    # ---- fallback ------------------------------------------------------------
+
+    def state_machine(self):
+        """One `_pc == n` arm per basic block inside a dispatch loop."""
+        pad = INDENT * 3
+        out = [f"{INDENT}_pc = 0", f"{INDENT}while True:"]
+        for block in self.blocks:
+            n = block.index
+            out.append(f"{INDENT * 2}{'if' if n == 0 else 'elif'} _pc == {n}:")
+            last = self.ir[block.end - 1]
+            for instr in self.ir[block.start:block.end]:
+                out += [pad + line for line in self.statement(instr)]
+            if isinstance(last, Jump):
+                out.append(f"{pad}_pc = {self.at_label[last.label]}")
+            elif isinstance(last, BRANCHES):
+                out.append(f"{pad}_pc = {self.at_label[last.label]} "
+                           f"if {self.condition(last)} else {n + 1}")
+            else:
+                out.append(f"{pad}_pc = {n + 1}")
+        out.append(f"{INDENT * 2}else:")
+        out.append(f"{INDENT * 3}break")
+        return out
+
+    # ---- instructions --------------------------------------------------------
+
+    def const(self, value):
+        if value is None or isinstance(value, (bool, int, str)):
+            return repr(value)
+        if isinstance(value, float) and math.isfinite(value):
+            return repr(value)
+        self.consts.append(value)
+        return f"K[{len(self.consts) - 1}]"
+
+    def statement(self, instr):
+        """Python lines for a non-branch instruction."""
+        t = lambda name: f"t{name}"
+        if isinstance(instr, LoadConst):
+            return [f"{t(instr.target)} = {self.const(instr.value)}"]
+        if isinstance(instr, LoadVar):
+            return [f"{t(instr.target)} = v_{instr.name}"]
+        if isinstance(instr, StoreVar):
+            return [f"v_{instr.name} = {t(instr.source)}"]
+        if isinstance(instr, Pow):
+            return [f"{t(instr.target)} = {t(instr.base)} ** {t(instr.exp)}"]
+        if type(instr) in BINARY:
+            return [f"{t(instr.target)} = {t(instr.left)} {BINARY[type(instr)]} {t(instr.right)}"]
+        if isinstance(instr, Not):
+            return [f"{t(instr.target)} = not {t(instr.source)}"]
+        if isinstance(instr, Move):
+            return [f"{t(instr.target)} = {t(instr.source)}"]
+        if isinstance(instr, IsInt):
+            return [f"{t(instr.target)} = type({t(instr.source)}) is int"]
+        if isinstance(instr, CallWrite):
+            return [f"_write(f'{{{t(instr.arg)}}} ')"]
+        if isinstance(instr, PrintNewline):
+            return ["_write('\\n')"]
+        if isinstance(instr, IncVar):
+            return [f"v_{instr.name} = v_{instr.name} + {self.const(instr.value)}"]
+        if isinstance(instr, DecVar):
+            return [f"v_{instr.name} = v_{instr.name} - {self.const(instr.value)}"]
+        if isinstance(instr, AddVarImm):
+            return [f"{t(instr.target)} = v_{instr.name} + {self.const(instr.value)}"]
+        if isinstance(instr, StoreConst):
+            return [f"v_{instr.name} = {self.const(instr.value)}"]
+        if isinstance(instr, LoadVarPair):
+            return [f"{t(instr.target)} = v_{instr.name}",
+                    f"{t(instr.target2)} = v_{instr.name2}"]
+        if isinstance(instr, (Label, Jump) + BRANCHES):
+            return []
+        raise NotImplementedError(f"No Python translation for {instr!r}")
+
+    def condition(self, instr):
+        """Python expression that is true when the branch is taken."""
+        if isinstance(instr, CompareAndBranch):
+            return f"not (t{instr.left} {instr.op} t{instr.right})"
+        if isinstance(instr, JumpIfFalse):
+            return f"not t{instr.cond}"
+        return f"t{instr.cond}"
@@ -0,0 +1,81 @@
+# regalloc.py
+#
+# Linear-scan register allocation for IR temporaries.
+#
+# Codegen hands out a fresh temp (_t0, _t1, ...) for every value, so the
+# number of temps grows with program size. Liveness over the CFG gives each
+# temp a live interval over instruction positions; linear scan then renames
+# temps onto a small register file (_r0, _r1, ...), reusing a register as
+# soon as its previous value is dead.
+#
+# Positions: instruction i reads its operands at 2*i and writes its target
+# at 2*i + 1, so a value whose last use is at i can share a register with
+# the value i defines (every instruction reads before it writes). A temp
+# live out of a block stays live past the block's last write.
+
+import copy
+import heapq
+
+from cfg import build_cfg, liveness
+from ir import uses, defs
+
+def live_intervals(ir_list):
+    """{temp: [start, end]} over instruction positions (see module notes)."""
+    intervals = {}
+
+    def extend(temp, pos):
+        iv = intervals.get(temp)
+        if iv is None:
+            intervals[temp] = [pos, pos]
+        elif pos < iv[0]:
+            iv[0] = pos
+        elif pos > iv[1]:
+            iv[1] = pos
+
+    blocks = build_cfg(ir_list)
+    live_in, live_out = liveness(ir_list, blocks)
+    for block in blocks:
+        for temp in live_in[block.index]:
+            extend(temp, 2 * block.start)
+        for temp in live_out[block.index]:
+            extend(temp, 2 * block.end)
+        for i in range(block.start, block.end):
+            instr = ir_list[i]
+            for temp in uses(instr):
+                extend(temp, 2 * i)
+            for temp in defs(instr):
+                extend(temp, 2 * i + 1)
+    return intervals
+
+
+def allocate_registers(ir_list, prefix='_r'):
+    """
+    Rename temps onto reused registers.
+    Returns (new IR list, number of registers used); the input is not modified.
+    """
+    intervals = live_intervals(ir_list)
+    active    = []          # heap of (end, register) for live intervals
+    free      = []          # heap of released register numbers
+    assign    = {}
+    n_regs    = 0
+
+    for temp, (start, end) in sorted(intervals.items(), key=lambda kv: kv[1][0]):
+        while active and active[0][0] < start:
+            heapq.heappush(free, heapq.heappop(active)[1])
+        if free:
+            r = heapq.heappop(free)
+        else:
+            r = n_regs
+            n_regs += 1
+        assign[temp] = f"{prefix}{r}"
+        heapq.heappush(active, (end, r))
+
+    renamed = []
+    for instr in ir_list:
+        fields = [f for f in instr.operands + instr.outputs if getattr(instr, f) in assign]
+        if fields:
+            instr = copy.copy(instr)
+            for f in fields:
+                setattr(instr, f, assign[getattr(instr, f)])
+        renamed.append(instr)
+    return renamed, n_regs
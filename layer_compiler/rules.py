@@ -14,3 +14,18 @@ TOKEN_REGEX = [
     ('OPERATOR',    r'->|==|!=|<=|>=|and|or|not|\+|-|\*|/|%|\^|=|<|>'),
     ('PUNCTUATION', r'[.,:()\[\]{}]'),
 ]
+
+# Expression operators: precedence (higher binds tighter) and associativity
+BINARY_PRECEDENCE = {
+    'or':  1,
+    'and': 2,
+    '==':  4, '!=': 4, '<': 4, '>': 4, '<=': 4, '>=': 4,
+    '+':   5, '-':  5,
+    '*':   6, '/':  6, '%': 6,
+    '^':   8,
+}
+RIGHT_ASSOC = {'^'}
+UNARY_PRECEDENCE = {
+    'not': 3,
+    '-':   7,        # -2 ^ 2 == -(2 ^ 2)
+}
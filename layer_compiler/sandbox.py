@@ -0,0 +1,223 @@
+# sandbox.py
+#
+# Running programs away from the calling process (the Streamlit server).
+# A RunPool keeps `workers` processes started ahead of time, each with the
+# compiler modules already imported, and submit() hands an assembled
+# program to an idle one and returns a Run at once. The worker runs it on
+# a VM with an instruction budget (max_steps) and a time budget (timeout,
+# enforced with SIGALRM in the worker where the platform has it), and
+# streams its output back in chunks while it runs.
+#
+# On the calling side one watcher thread per run reads the worker's pipe
+# into the Run, so output and deadlines are handled even if nobody is
+# reading. A worker that has not finished `GRACE` seconds after its
+# timeout, or whose run is cancelled, is killed and replaced by a fresh
+# one: the pool never shrinks and no caller waits on a stuck program.
+
+import multiprocessing
+import queue
+import signal
+import threading
+import time
+
+from sinks import StreamingSink
+from vm    import VM, StepLimitExceeded
+
+DEFAULT_WORKERS = 2
+DEFAULT_STEPS   = 5 * 10 ** 7   # instructions
+DEFAULT_TIMEOUT = 10.0          # seconds
+GRACE           = 2.0           # extra seconds before the pool kills a worker
+POLL            = 0.05          # seconds between cancellation checks
+
+
+class RunTimeout(BaseException):
+    """Raised by the worker's SIGALRM handler. Not an Exception, so that the
+    VM's own `except Exception` fallbacks cannot swallow it."""
+
+
+def _serve(conn):
+    """Worker process: run one (program, max_steps, timeout) job at a time
+    until None arrives."""
+    while True:
+        job = conn.recv()
+        if job is None:
+            return
+        conn.send(('done',) + _execute(conn, *job))
+
+
+def _execute(conn, program, max_steps, timeout):
+    """(status, error, steps) of running `program`, sending its output on
+    `conn` as ('out', text) messages while it runs."""
+    # Only the sender thread touches the pipe: SIGALRM interrupts the main
+    # thread, and must not do so half-way through a send.
+    outbox = queue.SimpleQueue()
+    def send():
+        for text in iter(outbox.get, None):
+            conn.send(('out', text))
+    sender = threading.Thread(target=send, daemon=True)
+    sender.start()
+    sink = StreamingSink(outbox.put)
+    vm = VM.from_bytecode(program, sink=sink, max_steps=max_steps)
+
+    alarm = timeout and hasattr(signal, 'setitimer')
+    running = True
+    if alarm:
+        def expired(signum, frame):
+            if running:
+                raise RunTimeout(f"timed out after {timeout:g}s")
+        previous = signal.signal(signal.SIGALRM, expired)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        vm.run()
+        running = False
+        status, error = 'ok', None
+    except RunTimeout as e:
+        status, error = 'timeout', str(e)
+    except StepLimitExceeded as e:
+        status, error = 'budget', str(e)
+    except Exception as e:
+        status, error = 'error', str(e)
+    finally:
+        running = False
+        if alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous)
+    sink.close()
+    outbox.put(None)
+    sender.join()
+    return status, error, vm.steps
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_serve, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class Run:
+    """
+    One program's run on a pool worker. chunks() yields its output as it
+    arrives; `output` is everything received so far. When the run is over,
+    `status` is 'ok', 'error', 'budget' (max_steps used up), 'timeout' or
+    'cancelled', `error` its message and `steps` the instructions executed
+    (None if the worker was killed).
+    """
+    def __init__(self):
+        self.status = None
+        self.error  = None
+        self.steps  = None
+        self._parts = []
+        self._queue = queue.Queue()
+        self._cancel = threading.Event()
+
+    @property
+    def output(self):
+        return "".join(self._parts)
+
+    @property
+    def done(self):
+        return self.status is not None
+
+    def chunks(self):
+        """Output chunks not yet taken, as they arrive, until the run ends;
+        "" every POLL seconds while nothing arrives, so the caller gets to
+        act (a Streamlit script to notice a Cancel click). Safe to call
+        again later (e.g. after a Streamlit rerun)."""
+        while True:
+            try:
+                text = self._queue.get(timeout=POLL)
+            except queue.Empty:
+                yield ""
+                continue
+            if text is None:
+                self._queue.put(None)       # later calls end at once too
+                return
+            yield text
+
+    def wait(self):
+        for _ in self.chunks():
+            pass
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    def _emit(self, text):
+        self._parts.append(text)
+        self._queue.put(text)
+
+    def _finish(self, status, error=None, steps=None):
+        self.status, self.error, self.steps = status, error, steps
+        self._queue.put(None)
+
+
+class RunPool:
+    """
+    `workers` pre-started worker processes. submit() waits for an idle
+    worker, so at most `workers` programs run at once.
+    """
+    def __init__(self, workers=DEFAULT_WORKERS, max_steps=DEFAULT_STEPS,
+                 timeout=DEFAULT_TIMEOUT):
+        # spawn, not fork: the calling process may be running threads
+        self._ctx = multiprocessing.get_context('spawn')
+        self.max_steps = max_steps
+        self.timeout   = timeout
+        self._idle = queue.Queue()
+        for _ in range(workers):
+            self._idle.put(_Worker(self._ctx))
+
+    def submit(self, program, max_steps=None, timeout=None):
+        """Start running an assembled program (bytecode.Bytecode) and return
+        its Run; the budgets default to the pool's."""
+        max_steps = max_steps if max_steps is not None else self.max_steps
+        timeout   = timeout if timeout is not None else self.timeout
+        worker = self._idle.get()
+        run = Run()
+        worker.conn.send((program, max_steps, timeout))
+        threading.Thread(target=self._watch, args=(worker, run, timeout),
+                         daemon=True).start()
+        return run
+
+    def _watch(self, worker, run, timeout):
+        """Move the worker's messages into `run` until it finishes, is
+        cancelled or overruns; then give the pool a worker back."""
+        deadline = time.monotonic() + timeout + GRACE
+        while True:
+            if run._cancel.is_set():
+                ending = ('cancelled', "cancelled")
+                break
+            left = deadline - time.monotonic()
+            if left <= 0:
+                ending = ('timeout', f"timed out after {timeout:g}s")
+                break
+            try:
+                if not worker.conn.poll(min(left, POLL)):
+                    continue
+                message = worker.conn.recv()
+            except (EOFError, OSError):
+                ending = ('error', "worker process died")
+                break
+            if message[0] == 'out':
+                run._emit(message[1])
+            else:
+                run._finish(*message[1:])
+                self._idle.put(worker)
+                return
+        worker.kill()
+        self._idle.put(_Worker(self._ctx))
+        run._finish(*ending)
+
+    def close(self):
+        """Stop the idle workers (call once no runs are in progress)."""
+        while not self._idle.empty():
+            worker = self._idle.get()
+            worker.conn.send(None)
+            worker.process.join()
+            worker.conn.close()
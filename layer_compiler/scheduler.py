@@ -0,0 +1,170 @@
+# scheduler.py
+#
+# Many small programs in one process, without a thread each: a Scheduler
+# runs VMs a slice at a time (VM.resume) from a single asyncio task,
+# yielding to the event loop after every slice so other coroutines (a
+# server's request handlers, say) keep running.
+#
+# Submitted programs wait in a FIFO queue until one of `max_active` places
+# is free, then take turns round-robin, `quantum` instructions at a time,
+# so a long program cannot hold up the short ones behind it. Each program
+# has an instruction quota (VM max_steps). metrics() reports throughput
+# and queue latency (submit to first slice) and turnaround (submit to
+# finish) percentiles over the last LATENCY_WINDOW programs.
+
+import asyncio
+import time
+from collections import deque
+
+from bytecode import Bytecode
+from sinks    import CaptureSink
+from vm       import VM, StepLimitExceeded
+
+DEFAULT_QUANTUM = 10_000        # instructions per slice
+DEFAULT_QUOTA   = 10 ** 7       # instructions per program
+DEFAULT_ACTIVE  = 256           # programs taking turns at once
+LATENCY_WINDOW  = 10_000
+
+
+class Job:
+    """
+    One submitted program; await it for the finished Job. `status` is then
+    'ok', 'error' or 'quota' (instruction quota used up), `error` its
+    message, `steps` the instructions executed and `output` what it wrote
+    (when the default CaptureSink is used).
+    """
+    def __init__(self, vm, future):
+        self.vm        = vm
+        self.future    = future
+        self.status    = None
+        self.error     = None
+        self.submitted = time.perf_counter()
+        self.started   = None
+        self.finished  = None
+
+    @property
+    def steps(self):
+        return self.vm.steps
+
+    @property
+    def output(self):
+        return self.vm.sink.getvalue()
+
+    def __await__(self):
+        return self.future.__await__()
+
+
+class Scheduler:
+    """
+    `program` arguments are IR lists or assembled Bytecode. submit() must be
+    called from a running event loop; the scheduling task starts with the
+    first submission and ends when nothing is left to run.
+    """
+    def __init__(self, quantum=DEFAULT_QUANTUM, quota=DEFAULT_QUOTA,
+                 max_active=DEFAULT_ACTIVE, jit=True):
+        self.quantum    = quantum
+        self.quota      = quota
+        self.max_active = max_active
+        self.jit        = jit
+        self._waiting   = deque()       # submitted, not yet started
+        self._active    = deque()       # taking turns
+        self._task      = None
+        self._idle      = None          # set when nothing is left to run
+        # metrics
+        self.counts     = {'ok': 0, 'error': 0, 'quota': 0}
+        self.slices     = 0
+        self.steps      = 0
+        self.busy       = 0.0           # seconds spent running slices
+        self.began      = None
+        self.waits      = deque(maxlen=LATENCY_WINDOW)
+        self.turnaround = deque(maxlen=LATENCY_WINDOW)
+
+    def submit(self, program, quota=None, sink=None):
+        """Queue `program` and return its Job at once."""
+        loop = asyncio.get_running_loop()
+        quota = quota if quota is not None else self.quota
+        sink = sink if sink is not None else CaptureSink()
+        if isinstance(program, Bytecode):
+            vm = VM.from_bytecode(program, self.jit, sink, quota)
+        else:
+            vm = VM(program, jit=self.jit, sink=sink, max_steps=quota)
+        job = Job(vm, loop.create_future())
+        self._waiting.append(job)
+        if self._task is None:
+            self.began = self.began or job.submitted
+            self._idle = asyncio.Event()
+            self._task = loop.create_task(self._drive())
+        return job
+
+    async def run(self, program, quota=None, sink=None):
+        """Submit `program` and wait for it to finish."""
+        return await self.submit(program, quota, sink)
+
+    async def join(self):
+        """Wait until every submitted program has finished."""
+        if self._task is not None:
+            await self._idle.wait()
+
+    async def _drive(self):
+        waiting, active = self._waiting, self._active
+        quantum = self.quantum
+        clock = time.perf_counter
+        while waiting or active:
+            while waiting and len(active) < self.max_active:
+                job = waiting.popleft()
+                job.started = clock()
+                self.waits.append(job.started - job.submitted)
+                active.append(job)
+            job = active.popleft()
+            start = clock()
+            before = job.vm.steps
+            try:
+                done = job.vm.resume(quantum)
+            except StepLimitExceeded as e:
+                self._finish(job, 'quota', str(e))
+            except Exception as e:
+                self._finish(job, 'error', str(e))
+            else:
+                if done:
+                    self._finish(job, 'ok')
+                else:
+                    active.append(job)
+            self.busy += clock() - start
+            self.steps += job.vm.steps - before
+            self.slices += 1
+            await asyncio.sleep(0)
+        self._task = None
+        self._idle.set()
+
+    def _finish(self, job, status, error=None):
+        job.status, job.error = status, error
+        job.finished = time.perf_counter()
+        self.turnaround.append(job.finished - job.submitted)
+        self.counts[status] += 1
+        if not job.future.done():
+            job.future.set_result(job)
+
+    def metrics(self):
+        """Counters, throughput and latency percentiles (in milliseconds)."""
+        finished = sum(self.counts.values())
+        elapsed = time.perf_counter() - self.began if self.began else 0.0
+        return {
+            'finished':        finished,
+            'counts':          dict(self.counts),
+            'waiting':         len(self._waiting),
+            'active':          len(self._active),
+            'slices':          self.slices,
+            'instructions':    self.steps,
+            'programs_per_s':  finished / elapsed if elapsed else 0.0,
+            'instr_per_s':     self.steps / self.busy if self.busy else 0.0,
+            'queue_ms':        percentiles(self.waits),
+            'turnaround_ms':   percentiles(self.turnaround),
+        }
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    pick = lambda q: round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1e3, 3)
+    return {'p50': pick(0.5), 'p90': pick(0.9), 'p99': pick(0.99), 'max': pick(1.0)}
@@ -1,8 +1,7 @@
-import re
 from layer_ast import (
     Program, VarDecl, Assignment,
     WriteStmt, LoopFor, LoopWhile,
-    IfStmt, Block, Expr
+    IfStmt, Block, Expr, Name, postorder
 )
 from symbol_table import SymbolTable
 
@@ -28,7 +27,7 @@ class SemanticAnalyzer:
             initialized = stmt.expr is not None
             if stmt.kind == 'ivar' and not initialized:
                 raise Exception(f"ivar '{stmt.name}' must be initialized")
-            value = stmt.expr.value if stmt.expr else None
+            value = str(stmt.expr) if stmt.expr else None
             table.define(stmt.name, stmt.kind, initialized, value)
 
         # Assignment
@@ -38,7 +37,7 @@ class SemanticAnalyzer:
                 raise Exception(f"Undeclared identifier '{stmt.name}' in assignment")
             self._check_expr(stmt.expr, table)
             sym.initialized = True
-            sym.value = stmt.expr.value
+            sym.value = str(stmt.expr)
 
         # Write/FWrite
         elif isinstance(stmt, WriteStmt):
@@ -66,18 +65,6 @@ class SemanticAnalyzer:
             raise Exception(f"Unknown AST node in semantic analyzer: {stmt}")
 
     def _check_expr(self, expr: Expr, table):
-        # Remove string literals
-        cleaned = re.sub(r'"[^"]*"', '', expr.value)
-
-        for token in cleaned.split():
-            if token.isdigit() or token.replace('.', '', 1).isdigit():
-                continue  # numeric
-            if token in ('true', 'false'):
-                continue  # boolean
-            if token in {'+', '-', '*', '/', '%', '^',
-                         '==', '!=', '<', '>', '<=', '>=',
-                         'and', 'or', 'not'}:
-                continue  # operator
-            sym = table.lookup(token)
-            if not sym:
-                raise Exception(f"Undeclared identifier '{token}' in expression '{expr.value}'")
+        for node in postorder(expr):
+            if isinstance(node, Name) and not table.lookup(node.name):
+                raise Exception(f"Undeclared identifier '{node.name}' in expression '{expr}'")
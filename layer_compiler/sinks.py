@@ -0,0 +1,135 @@
+# sinks.py
+#
+# Where a running program's write() output goes. Every engine (VM, JIT
+# traces, PyProgram, Interpreter) takes a `sink` and calls sink.write(text)
+# once per value written and once per newline, then sink.flush() when the
+# run ends, also when it ends with an error. Sinks join small writes in
+# memory and hand them on in chunks of about `buffer_size` characters, so
+# output-heavy programs do a few large writes instead of one per value.
+#
+# Each run writes only to its own sink, never to process-wide state, so
+# concurrent runs (e.g. several Streamlit sessions) stay apart. StdoutSink
+# looks sys.stdout up when it writes, so contextlib.redirect_stdout still
+# works around a run that uses it.
+
+import sys
+import threading
+
+DEFAULT_BUFFER = 1 << 16    # characters
+
+
+class Sink:
+    """Base class: buffers writes and passes them to emit() in chunks."""
+    def __init__(self, buffer_size=DEFAULT_BUFFER):
+        self.buffer_size = buffer_size
+        self._parts = []
+        self._size  = 0
+
+    def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self._drain()
+
+    def _drain(self):
+        if self._parts:
+            text = "".join(self._parts)
+            self._parts, self._size = [], 0
+            self.emit(text)
+
+    def emit(self, text):
+        raise NotImplementedError
+
+    def flush(self):
+        self._drain()
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class StdoutSink(Sink):
+    """Buffered writes to `stream`, or to whatever sys.stdout is at the time."""
+    def __init__(self, stream=None, buffer_size=DEFAULT_BUFFER):
+        super().__init__(buffer_size)
+        self.stream = stream
+
+    def emit(self, text):
+        (self.stream or sys.stdout).write(text)
+
+    def flush(self):
+        self._drain()
+        (self.stream or sys.stdout).flush()
+
+
+class FileSink(StdoutSink):
+    """Buffered writes to a file, opened here and closed by close()."""
+    def __init__(self, path, buffer_size=DEFAULT_BUFFER, mode='w'):
+        super().__init__(open(path, mode, encoding='utf-8'), buffer_size)
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+
+
+class CaptureSink(Sink):
+    """Keeps everything in memory; getvalue() returns it."""
+    def __init__(self):
+        super().__init__(float('inf'))
+
+    def write(self, text):
+        self._parts.append(text)
+
+    def flush(self):
+        pass
+
+    def getvalue(self):
+        text = "".join(self._parts)
+        self._parts = [text]
+        return text
+
+
+class CallbackSink(Sink):
+    """Calls fn(text) with each chunk; with the default buffer_size of 0,
+    once per write."""
+    def __init__(self, fn, buffer_size=0):
+        super().__init__(buffer_size)
+        self.fn = fn
+
+    def emit(self, text):
+        self.fn(text)
+
+
+class StreamingSink(CallbackSink):
+    """CallbackSink that also hands on whatever is buffered every `interval`
+    seconds, from a background thread, so output written just before a long
+    silent stretch still arrives promptly. close() stops the thread."""
+    def __init__(self, fn, buffer_size=DEFAULT_BUFFER // 16, interval=0.1):
+        super().__init__(fn, buffer_size)
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._tick, daemon=True)
+        self._thread.start()
+
+    def write(self, text):
+        with self._lock:
+            super().write(text)
+
+    def flush(self):
+        with self._lock:
+            self._drain()
+
+    def _tick(self):
+        while not self._done.wait(self.interval):
+            self.flush()
+
+    def close(self):
+        self._done.set()
+        self._thread.join()
+        self.flush()
@@ -1,3 +1,6 @@
+from itertools import islice
+
+
 class Symbol:
     def __init__(self, name, kind, initialized=False, value=None):
         self.name        = name            # variable name
@@ -35,12 +38,13 @@ class SymbolTable:
     def exit_scope(self):
         return self.parent
 
-    def as_list(self):
+    def as_list(self, start=0, stop=None):
         """
-        Convert symbol table into a list of dictionaries for DataFrame display.
+        Convert symbol table into a list of dictionaries for DataFrame display
+        (only symbols start..stop, in declaration order, if given).
         """
         entries = []
-        for name, sym in self.symbols.items():
+        for sym in islice(self.symbols.values(), start, stop):
             entries.append({
                 "Name": sym.name,
                 "Type": sym.kind,
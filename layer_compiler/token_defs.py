@@ -1,5 +1,8 @@
 # token_defs.py
 
+from array import array
+from token_types import TOKEN_NAMES, TOKEN_CODES
+
 class Token:
     def __init__(self, type_, value, line, column):
         self.type  = type_
@@ -9,3 +12,68 @@ class Token:
 
     def __repr__(self):
         return f"Token({self.type}, {self.value!r}, {self.line}:{self.col})"
+
+
+NEWLINE_CODE = TOKEN_CODES['NEWLINE']
+
+class TokenBuffer:
+    """
+    Compact struct-of-arrays token storage.
+
+    Each token is an integer type code plus start/end offsets into `source`
+    and its line/column, all kept in typed arrays (~25 bytes per token).
+    Values are sliced from the source only when asked for. Indexing or
+    iterating yields ordinary Token objects, built on demand.
+    """
+    __slots__ = ('source', 'types', 'starts', 'ends', 'lines', 'cols')
+
+    def __init__(self, source):
+        self.source = source          # str or bytes-like
+        self.types  = array('B')
+        self.starts = array('q')
+        self.ends   = array('q')
+        self.lines  = array('I')
+        self.cols   = array('I')
+
+    def append(self, type_, start, end, line, col):
+        self.types.append(TOKEN_CODES[type_])
+        self.starts.append(start)
+        self.ends.append(end)
+        self.lines.append(line)
+        self.cols.append(col)
+
+    def __len__(self):
+        return len(self.types)
+
+    def type(self, i):
+        return TOKEN_NAMES[self.types[i]]
+
+    def value(self, i):
+        if self.types[i] == NEWLINE_CODE:
+            return '\\n'
+        text = self.source[self.starts[i]:self.ends[i]]
+        if not isinstance(text, str):
+            text = str(text, 'utf-8')
+        return text
+
+    # column views; start/stop pick a slice (e.g. one page of a table)
+    def type_names(self, start=0, stop=None):
+        return [TOKEN_NAMES[code] for code in self.types[start:stop]]
+
+    def values(self, start=0, stop=None):
+        return [self.value(i) for i in range(*slice(start, stop).indices(len(self)))]
+
+    def positions(self, start=0, stop=None):
+        return [f"{line}:{col}" for line, col in zip(self.lines[start:stop], self.cols[start:stop])]
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        return Token(self.type(i), self.value(i), self.lines[i], self.cols[i])
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __repr__(self):
+        return f"TokenBuffer({len(self)} tokens)"
@@ -15,3 +15,21 @@ TOKEN_TYPES = {
     'BOOLEAN',
     'EOF'
 }
+
+# Stable integer codes for compact token storage (see token_defs.TokenBuffer)
+TOKEN_NAMES = (
+    'COMMENT',
+    'WHITESPACE',
+    'NEWLINE',
+    'INDENT',
+    'DEDENT',
+    'KEYWORD',
+    'IDENTIFIER',
+    'NUMBER',
+    'STRING',
+    'OPERATOR',
+    'PUNCTUATION',
+    'BOOLEAN',
+    'EOF'
+)
+TOKEN_CODES = {name: code for code, name in enumerate(TOKEN_NAMES)}
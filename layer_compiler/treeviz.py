@@ -1,73 +1,131 @@
-from graphviz import Digraph
+# treeviz.py
+#
+# Graphviz drawing of an AST, with level of detail for large programs.
+# The tree is walked breadth-first with a queue (no recursion, so deep
+# expression spines are fine), and two limits bound the work and the graph
+# Graphviz has to lay out, whatever the program size:
+#
+#   max_depth   levels drawn below the root (or below an expanded node)
+#   max_nodes   nodes drawn in total
+#
+# A node whose children are cut off is drawn collapsed, with a summary such
+# as "Block (412 stmts)"; a node that runs out of room part-way through its
+# children gets a "+ N more" node. Every node is named by its path of child
+# indices from the root ("0.3.1"). Paths listed in `expand` are drawn as if
+# each were a root of its own, with its own max_depth and max_nodes, so a
+# front end can open chosen subtrees on demand and the total stays within
+# max_nodes * (1 + len(expand)).
+
+from collections import deque
 
-def visualize_ast(root):
+from graphviz import Digraph
+from layer_ast import Expr
+
+DEFAULT_DEPTH = 6
+DEFAULT_NODES = 300
+
+
+def label(node):
+    if node is None:
+        return "None"
+    if isinstance(node, str):
+        return f"Var: {node}"
+    text = type(node).__name__
+    if hasattr(node, 'name'):
+        text += f"\\n{node.name}"
+    elif hasattr(node, 'expr'):
+        text += f"\\n{node.expr}"
+    elif hasattr(node, 'value'):
+        text += f"\\n{node.value}"
+    elif hasattr(node, 'op'):
+        text += f"\\n{node.op}"
+    return text
+
+
+def children(node):
+    """The nodes drawn under `node`, in order; a loop variable is a str."""
+    if node is None or isinstance(node, str):
+        return []
+    kids = []
+    if hasattr(node, 'statements'):
+        kids.extend(node.statements)
+    if hasattr(node, 'block'):
+        kids.append(node.block)
+    if hasattr(node, 'blk'):
+        kids.append(node.blk)
+    if hasattr(node, 'args'):
+        kids.extend(node.args)
+    if hasattr(node, 'expr') and isinstance(node.expr, list):
+        kids.extend(node.expr)
+    elif hasattr(node, 'expr') and hasattr(node.expr, '__dict__'):
+        kids.append(node.expr)
+    if hasattr(node, 'condition'):
+        kids.append(node.condition)
+    if hasattr(node, 'count'):
+        kids.append(node.count)
+    if isinstance(node, Expr):
+        kids.extend(node.children())
+    if hasattr(node, 'var') and isinstance(node.var, str):
+        kids.append(node.var)
+    return kids
+
+
+def summary(node, n):
+    if hasattr(node, 'statements'):
+        return f"{n} stmts"
+    return f"{n} children"
+
+
+def visualize_ast(root, max_depth=None, max_nodes=None, expand=(), collapsed=None):
+    """
+    Digraph of the tree under `root`; with no limits, the whole tree. The
+    nodes on the way to an expanded path are always drawn. If `collapsed`
+    is a dict, it is filled with path -> label for every node drawn
+    collapsed or cut short (the paths worth offering for `expand`).
+    """
     dot = Digraph()
-    counter = [0]
-
-    def next_id():
-        counter[0] += 1
-        return f"n{counter[0]}"
-
-    def add_node(label):
-        nid = next_id()
-        dot.node(nid, label)
-        return nid
-
-    def walk(node):
-        if node is None:
-            return add_node("None")
-
-        label = type(node).__name__
-
-        if hasattr(node, 'name'):
-            label += f"\\n{node.name}"
-        elif hasattr(node, 'expr'):
-            label += f"\\n{node.expr}"
-        elif hasattr(node, 'value'):
-            label += f"\\n{node.value}"
-
-        parent_id = add_node(label)
-
-        # Handle different node types
-        if hasattr(node, 'statements'):
-            for stmt in node.statements:
-                child_id = walk(stmt)
-                dot.edge(parent_id, child_id)
-
-        if hasattr(node, 'block'):
-            block_id = walk(node.block)
-            dot.edge(parent_id, block_id)
-
-        if hasattr(node, 'blk'):
-            blk_id = walk(node.blk)
-            dot.edge(parent_id, blk_id)
-
-        if hasattr(node, 'args'):
-            for arg in node.args:
-                child_id = walk(arg)
-                dot.edge(parent_id, child_id)
-
-        if hasattr(node, 'expr') and isinstance(node.expr, list):
-            for e in node.expr:
-                child_id = walk(e)
-                dot.edge(parent_id, child_id)
-        elif hasattr(node, 'expr') and hasattr(node.expr, '__dict__'):
-            child_id = walk(node.expr)
-            dot.edge(parent_id, child_id)
-
-        if hasattr(node, 'condition'):
-            cond_id = walk(node.condition)
-            dot.edge(parent_id, cond_id)
-
-        if hasattr(node, 'count'):
-            count_id = walk(node.count)
-            dot.edge(parent_id, count_id)
-
-        if hasattr(node, 'var') and isinstance(node.var, str):
-            var_id = add_node(f"Var: {node.var}")
-            dot.edge(parent_id, var_id)
-
-        return parent_id
-
-    walk(root)
+    expand = set(expand)
+    budget = max_nodes if max_nodes is not None else float('inf')
+
+    def nid(path):
+        return "n" + path.replace(".", "_")
+
+    def cut(path, text):
+        if collapsed is not None:
+            collapsed[path] = text.replace("\\n", " ")
+
+    dot.node(nid("0"), label(root))
+    drawn = {"0": 1}                    # nodes drawn per root / expansion
+    # (node, path, depth below `zone`, the nearest expanded ancestor or root)
+    queue = deque([(root, "0", 0, "0")])
+    while queue:
+        node, path, depth, zone = queue.popleft()
+        kids = children(node)
+        if not kids:
+            continue
+        if path in expand:
+            depth, zone = 0, path
+            drawn.setdefault(zone, 1)
+        # children leading to an expanded node are drawn whatever the limits
+        prefix = path + "."
+        needed = {int(p[len(prefix):].split(".")[0]) for p in expand if p.startswith(prefix)}
+        room = int(max(0, min(len(kids), budget - drawn[zone])))
+        if not needed and (not room or (max_depth is not None and depth >= max_depth)):
+            text = f"{label(node)}\\n({summary(node, len(kids))})"
+            dot.node(nid(path), text, style='filled,dashed', fillcolor='lightgrey',
+                     tooltip=f"collapsed: {path}")
+            cut(path, text)
+            continue
+        shown = sorted(set(range(room)) | {i for i in needed if i < len(kids)})
+        for i in shown:
+            kid_path = prefix + str(i)
+            dot.node(nid(kid_path), label(kids[i]))
+            dot.edge(nid(path), nid(kid_path))
+            queue.append((kids[i], kid_path, depth + 1, zone))
+        drawn[zone] += len(shown)
+        if len(shown) < len(kids):
+            more = nid(path) + "_more"
+            dot.node(more, f"+ {len(kids) - len(shown)} more", shape='plaintext')
+            dot.edge(nid(path), more, style='dashed')
+            cut(path, f"{label(node)} (+ {len(kids) - len(shown)} more)")
     return dot
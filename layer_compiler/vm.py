@@ -1,65 +1,265 @@
 # vm.py
 
-from ir import Label, Jump, JumpIfFalse
+import operator
+import sys
+import bytecode
+from bytecode import OP, OPCODES, WIDTH
+from jit import TraceJIT, HOT_LOOP
+from sinks import StdoutSink
+
+class StepLimitExceeded(RuntimeError):
+    """run() went over the VM's max_steps instruction budget."""
 
 class VM:
-    def __init__(self, instructions):
+    """
+    Register VM over assembled bytecode.
+
+    IR is assembled once at load time (see bytecode.assemble): opcodes are
+    small ints, temps and variables are indices into preallocated lists and
+    jump targets are instruction indices, so the run loop does no name or
+    label lookups. Every opcode has a handler in the dispatch table built by
+    _handlers(); the hottest ones are also inlined in run(), which in
+    CPython is about twice as fast as calling a handler per instruction.
+    Loops that get hot are traced and compiled to Python (see jit.py)
+    unless `jit` is False. write() output goes to `sink` (see sinks.py;
+    default: buffered stdout), which is flushed when run() returns.
+    With `max_steps`, run() raises StepLimitExceeded once it has executed
+    more than that many instructions (checked on backward jumps, and in
+    JIT traces once per iteration). resume() runs the program a slice at
+    a time instead (see scheduler.py).
+    """
+    def __init__(self, instructions=None, program=None, jit=True, sink=None,
+                 max_steps=None):
         self.instructions = instructions
-        self.regs         = {}  # temp registers
-        self.env          = {}  # variables
-        # map label names to instruction indices
-        self.labels = {
-            instr.name: idx
-            for idx, instr in enumerate(self.instructions)
-            if instr.__class__.__name__ == 'Label'
-        }
+        self.program      = program if program is not None else bytecode.assemble(instructions)
+        self.code         = decode(self.program.code)
+        self.consts       = self.program.consts
+        self.regs         = [None] * self.program.n_regs      # temp registers
+        self.vars         = [None] * len(self.program.var_names)
+        self.steps        = 0     # instructions executed by run()
+        self.sink         = sink if sink is not None else StdoutSink()
+        self.max_steps    = max_steps
+        self.pc           = 0     # where a paused run goes on
+        self.paused       = False
+        self.started      = 0     # self.steps when the current run began
+        self.sliced       = False # resume() used: traces must stop for pauses
+        self.jit          = TraceJIT(self) if jit else None
+
+    @classmethod
+    def from_bytecode(cls, program, jit=True, sink=None, max_steps=None):
+        return cls(program=program, jit=jit, sink=sink, max_steps=max_steps)
+
+    @classmethod
+    def load(cls, path, jit=True, sink=None, max_steps=None):
+        """VM for a precompiled .layerc file (memory-mapped, not parsed)."""
+        return cls.from_bytecode(bytecode.load(path), jit, sink, max_steps)
+
+    @property
+    def env(self):
+        """Variables by name."""
+        return dict(zip(self.program.var_names, self.vars))
 
     def run(self):
-        pc = 0
-        while pc < len(self.instructions):
-            instr = self.instructions[pc]
-            cls   = instr.__class__.__name__
-
-            if cls == 'LoadConst':
-                self.regs[instr.target] = instr.value
-
-            elif cls == 'LoadVar':
-                self.regs[instr.target] = self.env.get(instr.name)
-
-            elif cls == 'StoreVar':
-                self.env[instr.name] = self.regs.get(instr.source)
-
-            elif cls == 'Add':
-                self.regs[instr.target] = self.regs[instr.left] + self.regs[instr.right]
-            elif cls == 'Sub':
-                self.regs[instr.target] = self.regs[instr.left] - self.regs[instr.right]
-            elif cls == 'Mul':
-                self.regs[instr.target] = self.regs[instr.left] * self.regs[instr.right]
-            elif cls == 'Div':
-                self.regs[instr.target] = self.regs[instr.left] / self.regs[instr.right]
-            elif cls == 'Pow':
-                self.regs[instr.target] = self.regs[instr.base] ** self.regs[instr.exp]
-
-            elif cls == 'CallWrite':
-                # space‑separated, no newline
-                print(self.regs[instr.arg], end=' ')
-
-            elif cls == 'PrintNewline':
-                print()
-
-            elif cls == 'Jump':
-                pc = self.labels[instr.label]
-                continue
-
-            elif cls == 'JumpIfFalse':
-                cond = instr.cond
-                if any(op in cond for op in ('<','>','==','!=','<=','>=')):
-                    cond_eval = eval(cond, {}, self.regs)
-                else:
-                    cond_eval = bool(self.regs.get(cond))
-                if not cond_eval:
-                    pc = self.labels[instr.label]
+        """Run the program to the end (on from where resume() paused, if it did)."""
+        try:
+            self._run(None)
+        finally:
+            self.sink.flush()
+
+    def resume(self, quantum):
+        """
+        Run on for about `quantum` instructions: the VM pauses at the first
+        backward jump after that many, so a slice overshoots by less than
+        one loop iteration. Returns True once the program has finished; the
+        sink is flushed then, or when an error ends the run.
+        """
+        self.sliced = True
+        try:
+            done = self._run(quantum)
+        except BaseException:
+            self.sink.flush()
+            raise
+        if done:
+            self.sink.flush()
+        return done
+
+    def _run(self, quantum):
+        """Returns True when the program finished, False when it paused."""
+        code, consts = self.code, self.consts
+        regs, env    = self.regs, self.vars
+        handlers     = self._handlers()
+        end          = len(code)
+        jit          = self.jit
+        hot          = jit.counters if jit else None
+        if not self.paused:
+            self.pc, self.started = 0, self.steps
+        if self.max_steps is not None:
+            limit    = self.max_steps - (self.steps - self.started)
+        else:
+            limit    = sys.maxsize
+        stop         = limit if quantum is None else min(quantum, limit)
+        pc, steps    = self.pc, 0
+        self.paused  = False
+        try:
+            while pc < end:
+                op, a, b, c = code[pc]
+                steps += 1
+                if op == LOAD_VAR:
+                    regs[b] = env[a]
+                elif op == LOAD_CONST:
+                    regs[b] = consts[a]
+                elif op == STORE_VAR:
+                    env[b] = regs[a]
+                elif op == INC_VAR:
+                    env[a] = env[a] + consts[b]
+                elif op == DEC_VAR:
+                    env[a] = env[a] - consts[b]
+                elif op == ADD:
+                    regs[c] = regs[a] + regs[b]
+                elif op == SUB:
+                    regs[c] = regs[a] - regs[b]
+                elif op == JUMP:
+                    if a < pc:
+                        # every loop iteration passes a backward jump
+                        if steps > stop:
+                            if steps > limit:
+                                self._out_of_steps()
+                            self.pc, self.paused = a, True
+                            return False
+                        if jit:
+                            hot[a] += 1
+                            if hot[a] >= HOT_LOOP:
+                                pc, n = jit.enter(a, pc, stop - steps)
+                                steps += n
+                                continue
+                    pc = a
                     continue
+                elif op == JUMP_IF_NOT_LT:
+                    if not regs[a] < regs[b]:
+                        pc = c
+                        continue
+                elif op == JUMP_IF_NOT_GT:
+                    if not regs[a] > regs[b]:
+                        pc = c
+                        continue
+                else:
+                    target = handlers[op](a, b, c)
+                    if target is not None:
+                        if target < pc and steps > stop:
+                            if steps > limit:
+                                self._out_of_steps()
+                            self.pc, self.paused = target, True
+                            return False
+                        pc = target
+                        continue
+                pc += 1
+        finally:
+            self.steps += steps
+        return True
+
+    def _out_of_steps(self):
+        raise StepLimitExceeded(f"instruction budget of {self.max_steps:,} exceeded")
+
+    def _handlers(self):
+        """Dispatch table: handlers[opcode](a, b, c) -> jump target or None."""
+        regs, env, consts = self.regs, self.vars, self.consts
+        write = self.sink.write
+
+        def load_const(a, b, c):
+            regs[b] = consts[a]
+        def load_var(a, b, c):
+            regs[b] = env[a]
+        def store_var(a, b, c):
+            env[b] = regs[a]
+        def call_write(a, b, c):
+            # space-separated, no newline
+            write(f"{regs[a]} ")
+        def print_newline(a, b, c):
+            write("\n")
+        def jump(a, b, c):
+            return a
+        def jump_if_false(a, b, c):
+            if not regs[a]:
+                return b
+        def jump_if_true(a, b, c):
+            if regs[a]:
+                return b
+        def not_(a, b, c):
+            regs[b] = not regs[a]
+        def move(a, b, c):
+            regs[b] = regs[a]
+        def is_int(a, b, c):
+            regs[b] = type(regs[a]) is int
+        def nop(a, b, c):
+            pass
+        def inc_var(a, b, c):
+            env[a] = env[a] + consts[b]
+        def dec_var(a, b, c):
+            env[a] = env[a] - consts[b]
+        def add_var_imm(a, b, c):
+            regs[c] = env[a] + consts[b]
+        def store_const(a, b, c):
+            env[b] = consts[a]
+        def load_var_pair(a, b, c):
+            regs[c & 0xFFFF] = env[a]
+            regs[c >> 16]    = env[b]
+
+        def binary(fn):
+            def handler(a, b, c):
+                regs[c] = fn(regs[a], regs[b])
+            return handler
+
+        def branch_unless(fn):
+            def handler(a, b, c):
+                if not fn(regs[a], regs[b]):
+                    return c
+            return handler
+
+        table = [None] * len(OPCODES)
+        table[OP['NOP']]           = nop
+        table[OP['LOAD_CONST']]    = load_const
+        table[OP['LOAD_VAR']]      = load_var
+        table[OP['STORE_VAR']]     = store_var
+        table[OP['CALL_WRITE']]    = call_write
+        table[OP['PRINT_NEWLINE']] = print_newline
+        table[OP['JUMP']]          = jump
+        table[OP['JUMP_IF_FALSE']] = jump_if_false
+        table[OP['JUMP_IF_TRUE']]  = jump_if_true
+        table[OP['NOT']]           = not_
+        table[OP['MOVE']]          = move
+        table[OP['INC_VAR']]       = inc_var
+        table[OP['DEC_VAR']]       = dec_var
+        table[OP['ADD_VAR_IMM']]   = add_var_imm
+        table[OP['STORE_CONST']]   = store_const
+        table[OP['LOAD_VAR_PAIR']] = load_var_pair
+        table[OP['IS_INT']]        = is_int
+        for name, fn in BINARY_OPS.items():
+            table[OP[name]] = binary(fn)
+        for name, fn in BRANCH_UNLESS.items():
+            table[OP[name]] = branch_unless(fn)
+        return table
+
+
+def decode(code):
+    """Split flat int32 words into (op, a, b, c) tuples."""
+    words = iter(code)
+    return list(zip(*[words] * WIDTH))
+
+
+LOAD_CONST, LOAD_VAR, STORE_VAR = OP['LOAD_CONST'], OP['LOAD_VAR'], OP['STORE_VAR']
+ADD, SUB, JUMP                  = OP['ADD'], OP['SUB'], OP['JUMP']
+JUMP_IF_NOT_LT, JUMP_IF_NOT_GT  = OP['JUMP_IF_NOT_LT'], OP['JUMP_IF_NOT_GT']
+INC_VAR, DEC_VAR                = OP['INC_VAR'], OP['DEC_VAR']
 
-            # LABEL is a no‑op; anything else we ignore it
-            pc += 1
+BINARY_OPS = {
+    'ADD': operator.add, 'SUB': operator.sub, 'MUL': operator.mul,
+    'DIV': operator.truediv, 'MOD': operator.mod, 'POW': operator.pow,
+    'FLOOR_DIV': operator.floordiv,
+    'LT': operator.lt, 'GT': operator.gt, 'LE': operator.le,
+    'GE': operator.ge, 'EQ': operator.eq, 'NE': operator.ne,
+}
+BRANCH_UNLESS = {
+    'JUMP_IF_NOT_LT': operator.lt, 'JUMP_IF_NOT_GT': operator.gt,
+    'JUMP_IF_NOT_LE': operator.le, 'JUMP_IF_NOT_GE': operator.ge,
+    'JUMP_IF_NOT_EQ': operator.eq, 'JUMP_IF_NOT_NE': operator.ne,
+}
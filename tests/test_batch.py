@@ -0,0 +1,65 @@
+# test_batch.py
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from batch import compile_batch
+from compilation import Compilation
+from sinks import CaptureSink
+
+# b grows past the int -> str digit limit only when a != 0
+HUGE_WRITE = ("cvar a = 0\n"
+              "cvar b = a\n"
+              "loop i for 5000 times -> {\n"
+              "    b = b * 10\n"
+              "}\n"
+              "write(b)\n"
+              "write(\"end\")\n")
+
+
+def run_vm(source, a):
+    sink = CaptureSink()
+    try:
+        Compilation(source.replace("cvar a = 0", f"cvar a = {a}", 1)).run(sink=sink)
+        error = None
+    except Exception as e:
+        error = e
+    return sink.getvalue(), error
+
+
+def test_failing_write_stops_only_its_lane():
+    result = compile_batch(HUGE_WRITE, ['a']).run({'a': [0, 1]})
+    for lane, a in enumerate([0, 1]):
+        output, error = run_vm(HUGE_WRITE, a)
+        assert result.output(lane) == output
+        assert type(result.error(lane)) is type(error)
+    assert result.output(0) == "0 \nend \n"
+    assert isinstance(result.error(1), ValueError)
+
+
+def test_failing_write_before_any_arithmetic():
+    source = "cvar a = 0\nwrite(a)\nwrite(\"end\")\n"
+    result = compile_batch(source, ['a']).run({'a': [10 ** 5000, 1]})
+    assert isinstance(result.error(0), ValueError)
+    assert result.output(1) == "1 \nend \n"
+
+
+def test_failing_write_after_a_branch_split():
+    source = ("cvar a = 0\n"
+              "cvar b = a\n"
+              "if a > 0 -> {\n"
+              "    loop i for 5000 times -> {\n"
+              "        b = b * 10\n"
+              "    }\n"
+              "}\n"
+              "write(b)\n")
+    values = [0, 1, 2, 0]
+    result = compile_batch(source, ['a']).run({'a': values})
+    for lane, a in enumerate(values):
+        output, error = run_vm(source, a)
+        assert result.output(lane) == output
+        assert type(result.error(lane)) is type(error)
+    assert result.output(0) == "0 \n"
+    assert isinstance(result.error(1), ValueError)
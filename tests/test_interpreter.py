@@ -0,0 +1,56 @@
+# test_interpreter.py
+
+import glob
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, "..", "layer_compiler"))
+
+from compilation import Compilation
+from interpreter import Interpreter
+from sinks import CaptureSink
+
+
+def interpret(source):
+    sink = CaptureSink()
+    interpreter = Interpreter(Compilation(source).ast, sink)
+    interpreter.run()
+    return sink.getvalue(), interpreter.env
+
+
+def run_vm(source):
+    sink = CaptureSink()
+    Compilation(source).run(sink=sink)
+    return sink.getvalue()
+
+
+def test_and_or_short_circuit():
+    out, env = interpret("cvar x = 0\n"
+                         "cvar a = x != 0 and 10 / x > 1\n"
+                         "cvar b = x == 0 or 10 / x > 1\n"
+                         "write(a, b)\n")
+    assert (env['a'], env['b']) == (False, True)
+    assert out == "False True\n"
+
+
+def test_and_or_values():
+    out, env = interpret("cvar a = 0 and 5\n"
+                         "cvar b = 3 and 5\n"
+                         "cvar c = 0 or 5\n"
+                         "cvar d = 3 or 5\n")
+    assert [env[k] for k in "abcd"] == [0, 5, 5, 3]
+
+
+def test_examples_match_vm():
+    for path in glob.glob(os.path.join(HERE, "..", "examples", "*.layer")):
+        with open(path) as f:
+            source = f.read()
+        out, _ = interpret(source)
+        # the interpreter writes space-joined lines, the VM a space after each value
+        assert out.split() == run_vm(source).split(), path
+
+
+def test_deep_expression():
+    out, env = interpret("cvar s = " + " + ".join(["1"] * 10000) + "\n")
+    assert env['s'] == 10000
@@ -0,0 +1,37 @@
+# test_pybackend.py
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "layer_compiler"))
+
+from compilation import Compilation
+from sinks import CaptureSink
+
+
+def nested_loops(depth):
+    """`depth` one-iteration loops around a write, which keeps closed
+    forms from replacing them."""
+    lines = ["cvar n = 0"]
+    for d in range(depth):
+        lines.append("    " * d + f"loop i{d} for 1 times -> {{")
+    lines.append("    " * depth + "n = n + 1")
+    lines.append("    " * depth + "write(n)")
+    for d in reversed(range(depth)):
+        lines.append("    " * d + "}")
+    return "\n".join(lines) + "\n"
+
+
+def output(source, engine):
+    # -O0 keeps every loop, and compiles deep nests quickly
+    sink = CaptureSink()
+    Compilation(source, 0).run(engine, sink=sink)
+    return sink.getvalue()
+
+
+@pytest.mark.parametrize("depth", [5, 30, 101])
+def test_deep_nesting_matches_vm(depth):
+    source = nested_loops(depth)
+    assert output(source, 'pyc') == output(source, 'vm') == "1 \n"